@@ -9,14 +9,16 @@ class CompilationEngine():
     構文解析された構造を出力ファイル/ストリームへ出力する。
     """
 
-    def __init__(self, file: io.TextIOWrapper):
+    def __init__(self, file: io.TextIOWrapper, indent: str = ""):
         """
         与えられた入力と出力に対して新しいコンパイルエンジンを生成する。
-        次に呼ぶルーチンはcompileClass()でなければならない
+        次に呼ぶルーチンはcompileClass()でなければならない。
+        XMLの要素は、入れ子の深さごとにindentで字下げする
         """
         self.tokenizer: JackTokenizer = JackTokenizer(file)
-        self.result: list = []
         self.output: str = re.sub(r".jack$", "", file.name)
+        self.indent = indent
+        self.depth = 0
         self.statement_terms = ("let", "if", "while", "do", "return")
 
     def compileClass(self) -> None:
@@ -24,8 +26,14 @@ class CompilationEngine():
         クラスをコンパイルする
         """
         tokenizer: JackTokenizer = self.tokenizer
-        tokenizer.tokenize()
-        self.result.append("<class>")
+        # XMLは行を溜めず、できた順にファイルへ書き出す
+        with open(f"./{self.output}.xml", "w") as output:
+            self.write = output.write
+            self.compileClassBody()
+
+    def compileClassBody(self) -> None:
+        tokenizer: JackTokenizer = self.tokenizer
+        self.open_tag("class")
         # 'class'
         self.append_elm()
         # className
@@ -40,10 +48,18 @@ class CompilationEngine():
             self.compileSubroutine()
         # '}'
         self.append_elm()
-        self.result.append("</class>")
+        self.close_tag("class")
 
-        with open(f"./{self.output}.xml", "w") as output:
-            output.write("\n".join(self.result))
+    def write_line(self, text: str) -> None:
+        self.write(f"{self.indent * self.depth}{text}\n")
+
+    def open_tag(self, tag: str) -> None:
+        self.write_line(f"<{tag}>")
+        self.depth += 1
+
+    def close_tag(self, tag: str) -> None:
+        self.depth -= 1
+        self.write_line(f"</{tag}>")
 
     def create_xml_elm(self) -> str:
         """
@@ -54,14 +70,14 @@ class CompilationEngine():
 
     def append_elm(self) -> None:
         self.tokenizer.advance()
-        self.result.append(self.create_xml_elm())
+        self.write_line(self.create_xml_elm())
 
     def compileClassVarDec(self) -> None:
         """
         スタティック宣言またはフィールド宣言をコンパイルする
         """
         if self.tokenizer.look_ahead() in ("static", "field"):
-            self.result.append("<classVarDec>")
+            self.open_tag("classVarDec")
             # varType
             self.append_elm()
             # type
@@ -71,7 +87,7 @@ class CompilationEngine():
             self.compileVarList()
             # ;
             self.append_elm()
-            self.result.append("</classVarDec>")
+            self.close_tag("classVarDec")
 
     def compileVarList(self):
         # 雑 HACK
@@ -83,7 +99,7 @@ class CompilationEngine():
         """
         メソッド、ファンクション、コンストラクタをコンパイルする
         """
-        self.result.append("<subroutineDec>")
+        self.open_tag("subroutineDec")
         # subroutineKind
         self.append_elm()
         # returnType
@@ -98,10 +114,10 @@ class CompilationEngine():
         self.append_elm()
         # subroutineBody
         self.compileSubroutineBody()
-        self.result.append("</subroutineDec>")
+        self.close_tag("subroutineDec")
 
     def compileSubroutineBody(self) -> None:
-        self.result.append("<subroutineBody>")
+        self.open_tag("subroutineBody")
         # {
         self.append_elm()
         # varDec*
@@ -111,23 +127,23 @@ class CompilationEngine():
         self.compileStatements()
         # }
         self.append_elm()
-        self.result.append("</subroutineBody>")
+        self.close_tag("subroutineBody")
 
     def compileParameterList(self) -> None:
         """
         パラメータのリスト(空の可能性もある)をコンパイルする。
         カッコ"()"は含まない
         """
-        self.result.append("<parameterList>")
+        self.open_tag("parameterList")
         while self.tokenizer.look_ahead() != ")":
             self.append_elm()
-        self.result.append("</parameterList>")
+        self.close_tag("parameterList")
 
     def compileVarDec(self) -> None:
         """
         var宣言をコンパイルする
         """
-        self.result.append("<varDec>")
+        self.open_tag("varDec")
         # 'var'
         self.append_elm()
         # type
@@ -136,14 +152,14 @@ class CompilationEngine():
         self.compileVarList()
         # ';'
         self.append_elm()
-        self.result.append("</varDec>")
+        self.close_tag("varDec")
 
     def compileStatements(self) -> None:
         """
         一連の文をコンパイルする。
         波カッコ"{}"は含まない
         """
-        self.result.append("<statements>")
+        self.open_tag("statements")
         while self.tokenizer.look_ahead() in self.statement_terms:
             if self.tokenizer.look_ahead() == "let":
                 self.compileLet()
@@ -155,20 +171,20 @@ class CompilationEngine():
                 self.compileDo()
             elif self.tokenizer.look_ahead() == "return":
                 self.compileReturn()
-        self.result.append("</statements>")
+        self.close_tag("statements")
 
     def compileDo(self) -> None:
         """
         do文をコンパイルする
         """
-        self.result.append("<doStatement>")
+        self.open_tag("doStatement")
         # 'do'
         self.append_elm()
         # subroutineCall
         self.compileSubroutineCall()
         # ';'
         self.append_elm()
-        self.result.append("</doStatement>")
+        self.close_tag("doStatement")
 
     def compileSubroutineCall(self) -> None:
         # qualifier
@@ -189,7 +205,7 @@ class CompilationEngine():
         """
         let文をコンパイルする
         """
-        self.result.append("<letStatement>")
+        self.open_tag("letStatement")
         # 'let'
         self.append_elm()
         # varName
@@ -203,7 +219,7 @@ class CompilationEngine():
         self.compileExpression()
         # ';'
         self.append_elm()
-        self.result.append("</letStatement>")
+        self.close_tag("letStatement")
 
     def compileArrayIndexing(self) -> None:
         # '['
@@ -217,7 +233,7 @@ class CompilationEngine():
         """
         while文をコンパイルする
         """
-        self.result.append("<whileStatement>")
+        self.open_tag("whileStatement")
         # 'while'
         self.append_elm()
         # '('
@@ -232,13 +248,13 @@ class CompilationEngine():
         self.compileStatements()
         # '}'
         self.append_elm()
-        self.result.append("</whileStatement>")
+        self.close_tag("whileStatement")
 
     def compileReturn(self) -> None:
         """
         return文をコンパイルする
         """
-        self.result.append("<returnStatement>")
+        self.open_tag("returnStatement")
         # 'return'
         self.append_elm()
         # expression?
@@ -246,14 +262,14 @@ class CompilationEngine():
             self.compileExpression()
         # ';'
         self.append_elm()
-        self.result.append("</returnStatement>")
+        self.close_tag("returnStatement")
 
     def compileIf(self) -> None:
         """
         if文をコンパイルする。
         else文を伴う可能性がある
         """
-        self.result.append("<ifStatement>")
+        self.open_tag("ifStatement")
         # 'if'
         self.append_elm()
         # '('
@@ -278,13 +294,13 @@ class CompilationEngine():
             self.compileStatements()
             # '}'
             self.append_elm()
-        self.result.append("</ifStatement>")
+        self.close_tag("ifStatement")
 
     def compileExpression(self) -> None:
         """
         式をコンパイルする
         """
-        self.result.append("<expression>")
+        self.open_tag("expression")
         # term
         self.compileTerm()
         # (op term)*
@@ -293,7 +309,7 @@ class CompilationEngine():
         ):
             self.append_elm()
             self.compileTerm()
-        self.result.append("</expression>")
+        self.close_tag("expression")
 
     def compileTerm(self) -> None:
         """
@@ -305,12 +321,13 @@ class CompilationEngine():
         そのトークンが"["か"("か"."のどれに該当するのかを調べれば、現トークンの種類を決定することができる。
         他のトークンの場合は現トークンに含まないので、先読みを行う必要はない
         """
-        self.result.append("<term>")
+        self.open_tag("term")
+        mark = self.tokenizer.mark()
         self.tokenizer.advance()
         if self.tokenizer.tokenType() == "identifier":
             if self.tokenizer.look_ahead() == "[":
                 # varName
-                self.result.append(self.create_xml_elm())
+                self.write_line(self.create_xml_elm())
                 # '['
                 self.append_elm()
                 # expression
@@ -318,31 +335,31 @@ class CompilationEngine():
                 # ']'
                 self.append_elm()
             elif self.tokenizer.look_ahead() in ("(", "."):
-                self.tokenizer.go_back()
+                self.tokenizer.reset(mark)
                 self.compileSubroutineCall()
             else:
-                self.result.append(self.create_xml_elm())
+                self.write_line(self.create_xml_elm())
         elif self.tokenizer.token in ("-", "~"):
-            self.result.append(self.create_xml_elm())
+            self.write_line(self.create_xml_elm())
             self.compileTerm()
         elif self.tokenizer.token == "(":
             # '('
-            self.result.append(self.create_xml_elm())
+            self.write_line(self.create_xml_elm())
             # expression
             self.compileExpression()
             # ')'
             self.append_elm()
         else:
-            self.result.append(self.create_xml_elm())
-        self.result.append("</term>")
+            self.write_line(self.create_xml_elm())
+        self.close_tag("term")
 
     def compileExpressionList(self) -> None:
         """
         コンマで分離された式のリスト(空の可能性もある)をコンパイルする
         """
-        self.result.append("<expressionList>")
+        self.open_tag("expressionList")
         while self.tokenizer.look_ahead() != ")":
             if self.tokenizer.look_ahead() == ",":
                 self.append_elm()
             self.compileExpression()
-        self.result.append("</expressionList>")
+        self.close_tag("expressionList")
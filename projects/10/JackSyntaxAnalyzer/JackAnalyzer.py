@@ -1,17 +1,58 @@
-from pathlib import Path
+import argparse
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 from CompilationEngine import CompilationEngine
 
+
+def analyze(path: Path, indent: str = "") -> str or None:
+    """
+    1ファイルを構文解析して.xmlを書き出し、失敗したときはエラー文字列を返す。
+    子プロセスからも呼べるようにモジュールの関数にしている
+    """
+    try:
+        with path.open() as f:
+            c = CompilationEngine(f, indent)
+            c.compileClass()
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
 if __name__ == "__main__":
-    path = Path(sys.argv[1])
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", type=Path)
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=1,
+        help="並列に構文解析するプロセス数",
+    )
+    parser.add_argument(
+        "--indent", type=int, default=0, metavar="N",
+        help=".xmlの要素を入れ子の深さごとにN文字ずつ字下げする",
+    )
+    args = parser.parse_args()
+    path = args.path
     if path.is_dir():
-        for jack in list(path.glob("*.jack")):
-            with jack.open() as f:
-                c = CompilationEngine(f)
-                c.compileClass()
+        paths = sorted(path.glob("*.jack"))
     elif path.is_file():
-        with open(path) as f:
-            c = CompilationEngine(f)
-            c.compileClass()
+        paths = [path]
     else:
         print("jackファイルかjackファイルの存在するフォルダを指定して下さい")
+        sys.exit(1)
+    indents = [" " * args.indent] * len(paths)
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            chunksize = max(1, len(paths) // (args.jobs * 8))
+            results = list(executor.map(
+                analyze, paths, indents, chunksize=chunksize,
+            ))
+    else:
+        results = list(map(analyze, paths, indents))
+    errors = [error for error in results if error]
+    if args.jobs > 1 or errors:
+        for jack, error in zip(paths, results):
+            print(f"{'NG' if error else 'OK'} {jack}" +
+                  (f": {error}" if error else ""))
+        print(f"{len(paths)} files, {len(errors)} errors")
+    if errors:
+        sys.exit(1)
@@ -19,7 +19,8 @@ class JackTokenizer():
         """
         self.filename = re.sub(r".jack$", "", file.name)
         self.file = file.read()
-        self.tokens = []
+        self.tokens: tuple = ()
+        self.pos: int = 0
         self.token: str = None
         self.tokenize()
 
@@ -27,7 +28,7 @@ class JackTokenizer():
         """
             入力にまだトークンは存在するか？
         """
-        return len(self.tokens) > 0
+        return self.pos < len(self.tokens)
 
     def advance(self) -> None:
         """
@@ -35,16 +36,39 @@ class JackTokenizer():
             このルーチンは、hasMoreTokens()がtrueの場合のみ呼び出すことができる。
             また、最初は現トークンは設定されていない。
         """
-        self.token = self.tokens.pop(0)
+        self.token = self.tokens[self.pos]
+        self.pos += 1
 
     def go_back(self) -> None:
-        self.tokens.insert(0, self.token)
+        """
+        現トークンを入力に戻す(次のadvance()で再び現トークンになる)
+        """
+        self.pos -= 1
+
+    def peek(self, k: int = 0) -> str:
+        """
+        現トークンからk+1個先のトークンを、読み進めずに返す
+        """
+        return self.tokens[self.pos + k]
 
     def look_ahead(self) -> str:
         """
         先読みをする
         """
-        return self.tokens[0]
+        return self.tokens[self.pos]
+
+    def mark(self) -> int:
+        """
+        現在の読み取り位置を返す。reset()に渡すとこの位置まで戻る
+        """
+        return self.pos
+
+    def reset(self, mark: int) -> None:
+        """
+        mark()で記録した読み取り位置へ戻る
+        """
+        self.pos = mark
+        self.token = self.tokens[mark - 1] if mark > 0 else None
 
     def tokenType(self) -> "keyword" or "symbol" or "identifier" \
                            or "integerrConstant" or "stringConstant":
@@ -144,6 +168,7 @@ class JackTokenizer():
     def tokenize(self) -> None:
         file = self.file
         symbols = SYMBOLS
+        tokens = []
         tmp_str = ""
         i = 0
         while i < len(file):
@@ -155,7 +180,7 @@ class JackTokenizer():
                     tmp_str += file[i]
                     i += 1
                 tmp_str += '"'
-                self.tokens.append(tmp_str)
+                tokens.append(tmp_str)
                 tmp_str = ""
             # //コメント判定
             elif file[i] == "/" and file[i+1] == "/":
@@ -169,7 +194,7 @@ class JackTokenizer():
                 i += 1
             # シンボル判定
             elif file[i] in symbols:
-                self.tokens.append(file[i])
+                tokens.append(file[i])
             # 空白文字判定
             elif re.match(r"\s", file[i]):
                 pass
@@ -178,7 +203,9 @@ class JackTokenizer():
                        (not re.match(r"\s", file[i]))):
                     tmp_str += file[i]
                     i += 1
-                self.tokens.append(tmp_str)
+                tokens.append(tmp_str)
                 tmp_str = ""
                 i -= 1
             i += 1
+        self.tokens = tuple(tokens)
+        self.pos = 0
@@ -0,0 +1,120 @@
+import hashlib
+import json
+from pathlib import Path
+from CompilePipeline import CompilePipeline
+
+MANIFEST_NAME = ".jackbuild.json"
+
+
+def file_hash(path: Path) -> str:
+    return hashlib.blake2b(path.read_bytes(), digest_size=16).hexdigest()
+
+
+def changed_signatures(old: dict, new: dict) -> set:
+    """
+    追加・削除・種類や引数の数が変わったサブルーチン名を返す
+    """
+    return {
+        name for name in old.keys() | new.keys()
+        if old.get(name) != new.get(name)
+    }
+
+
+class BuildManifest():
+    """
+    出力ファイルの隣に置くビルド情報(.jackbuild.json)。
+    ソースごとに内容のハッシュ、出力ファイル、公開インタフェース(サブルーチン名・種類・引数の数)、
+    呼び出している他クラスのサブルーチンを記録し、再コンパイルが必要なファイルだけをコンパイルする
+    """
+
+    def __init__(self, directory: Path, options: dict):
+        """
+        directoryのビルド情報を読み込む。
+        前回とオプションが違うときは、すべてのソースを未ビルドとして扱う
+        """
+        self.directory = directory
+        self.path = directory / MANIFEST_NAME
+        self.options = options
+        data = {}
+        if self.path.exists():
+            data = json.loads(self.path.read_text())
+        if data.get("options") != options:
+            data = {}
+        self.sources: dict = data.get("sources", {})
+
+    def is_fresh(self, path: Path) -> bool:
+        """
+        pathの前回のビルド結果がそのまま使えるか？
+        サイズと更新時刻が前回と同じならハッシュの計算を省く
+        """
+        entry = self.sources.get(path.name)
+        if entry is None:
+            return False
+        if not all((self.directory / o).exists() for o in entry["outputs"]):
+            return False
+        stat = path.stat()
+        if (entry["mtime_ns"], entry["size"]) == (stat.st_mtime_ns,
+                                                  stat.st_size):
+            return True
+        if entry["hash"] != file_hash(path):
+            return False
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+
+    def record(self, path: Path, outputs: list, info: dict) -> None:
+        stat = path.stat()
+        self.sources[path.name] = {
+            "hash": file_hash(path),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "outputs": [output.name for output in outputs],
+            "interface": info["interface"],
+            "calls": info["calls"],
+        }
+
+    def build(self, pipeline: CompilePipeline, paths: list,
+              jobs: int = 1) -> list:
+        """
+        pathsのうち、変更されたファイルと、インタフェースが変わったサブルーチンを
+        呼び出しているファイルだけをコンパイルし、(path, エラー文字列 or None)を返す
+        """
+        stale = [path for path in paths if not self.is_fresh(path)]
+        statuses = pipeline.run_all(stale, jobs)
+        changed = self.update(pipeline, statuses)
+        # 削除されたソースのインタフェースもすべて変わったものとみなす
+        for name in list(self.sources):
+            if not (self.directory / name).exists():
+                changed |= set(self.sources.pop(name)["interface"])
+        if changed:
+            compiled = set(stale)
+            dependents = [
+                path for path in paths
+                if path not in compiled and path.name in self.sources and
+                not changed.isdisjoint(self.sources[path.name]["calls"])
+            ]
+            dependent_statuses = pipeline.run_all(dependents, jobs)
+            self.update(pipeline, dependent_statuses)
+            statuses += dependent_statuses
+        self.save()
+        order = {path: i for i, path in enumerate(paths)}
+        return sorted(statuses, key=lambda status: order[status[0]])
+
+    def update(self, pipeline: CompilePipeline, statuses: list) -> set:
+        """
+        コンパイル結果をビルド情報に反映し、インタフェースが変わったサブルーチン名を返す
+        """
+        changed = set()
+        for path, error in statuses:
+            old = self.sources.pop(path.name, {}).get("interface", {})
+            if error:
+                changed |= set(old)
+                continue
+            info = pipeline.infos[path]
+            changed |= changed_signatures(old, info["interface"])
+            self.record(path, pipeline.outputs(path), info)
+        return changed
+
+    def save(self) -> None:
+        self.path.write_text(json.dumps(
+            {"options": self.options, "sources": self.sources}, indent=1,
+        ))
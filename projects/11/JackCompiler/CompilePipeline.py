@@ -0,0 +1,412 @@
+import io
+import json
+import os
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+from CompilationEngine import CompilationEngine
+from ConstantFolder import ConstantFolder
+from Inliner import find_inlines, inline_candidates
+from JackTokenizer import JackTokenizer
+from PeepholeOptimizer import PeepholeOptimizer
+from SignatureIndex import SignatureIndex, tree_headers
+from VMBackend import VMBackend
+from VMWriter import VMWriter
+from XMLBackend import XMLBackend
+import JackAST as ast
+
+STAGES = ("read", "tokenize", "parse", "optimize", "emit", "write")
+
+
+class CompilePipeline():
+    """
+    1つの.jackファイルを read → tokenize → parse → optimize → emit → write の
+    各ステージに分け、どのステージもファイルごとにちょうど1回だけ実行する。
+    parseはASTを構築し、emitはASTからVMコード(とXML)を生成する。
+    optimize=Trueのときだけ、optimizeでVMコード用のASTの定数を畳み込み、
+    emitで定数との乗算を加算に展開する(XMLは元のASTから生成する)。
+    peepholeに規則名を与えると、emitで生成したVMコマンド列をPeepholeOptimizerに通す。
+    inlineに項の数の上限を与えると、find_inlines()で集めた小さなサブルーチンの呼び出しを展開する。
+    signaturesにSignatureIndexの見出しを与えると、他のクラスの呼び出しを見出しで確かめる。
+    branches=Trueのときは、whileを条件が末尾のループにし、notを省いた反転した分岐を生成する。
+    pool_strings=Trueのときは、クラスの中で何度も評価されうる文字列定数を1回だけ作って
+    staticに置き、使い回す。
+    VMコードとXMLはemitの間に同じディレクトリの一時ファイルへ直接書き出され、
+    writeで書き切ってから.vm/.xmlへ置き換える(途中で失敗したときは元のファイルが残る)。
+    output=Falseのときはparseまでで止め、何も書き出さない(構文解析の速度を測るため)。
+    treesに辞書を与えると、構文解析したASTをソースの絶対パスごとに記録し、
+    次のrun()ではソースのサイズと更新時刻が同じならreadからparseまでを省く(--serveのため)。
+    measure=Trueのときは、ステージごとの実行時間・トークン数・ピークメモリを記録する
+    """
+
+    def __init__(self, measure: bool = False, xml: bool = False,
+                 xml_indent: int = 0, output: bool = True,
+                 optimize: bool = False, peephole: list = (),
+                 inline: int = 0, branches: bool = False,
+                 pool_strings: bool = False):
+        self.measure = measure
+        self.xml = xml
+        self.xml_indent = xml_indent
+        self.output = output
+        self.optimize = optimize
+        self.peephole = list(peephole)
+        self.inline = inline
+        self.branches = branches
+        self.pool_strings = pool_strings
+        self.inlines: dict = {}
+        self.signatures: dict = {}
+        self.trees: dict or None = None
+        self.timings: list = []
+        self.infos: dict = {}
+        self.peephole_hits: Counter = Counter()
+        self.inlined: Counter = Counter()
+
+    def options(self) -> dict:
+        """
+        出力の内容を左右するオプションを返す
+        """
+        return {
+            "xml": self.xml, "xml_indent": self.xml_indent,
+            "output": self.output, "optimize": self.optimize,
+            "peephole": self.peephole, "inline": self.inline,
+            "branches": self.branches, "pool_strings": self.pool_strings,
+        }
+
+    def outputs(self, path: Path) -> list:
+        """
+        path(.jack)をコンパイルしたときに書き出されるファイルを返す
+        """
+        outputs = [path.with_suffix(".vm")]
+        if self.xml:
+            outputs.append(path.with_suffix(".xml"))
+        return outputs
+
+    def run(self, path: Path) -> dict or None:
+        """
+        path(.jack)をコンパイルし、同じディレクトリに.vmを書き出す。
+        xml=Trueのときは、構文解析の結果を.xmlにも書き出す。
+        クラスの公開インタフェースと、呼び出している他クラスのサブルーチンを返す
+        (output=FalseのときはNone)
+        """
+        info = None
+        records = []
+        if self.measure:
+            tracemalloc.start()
+        try:
+            tree, n_tokens = self.parse(records, path)
+            vm_tree = tree
+            if self.optimize:
+                vm_tree = self.stage(
+                    records, "optimize", ConstantFolder().visit, tree,
+                )
+            if self.output:
+                targets = self.outputs(path)
+                temps = [temporary_path(target) for target in targets]
+                try:
+                    with ExitStack() as files:
+                        outputs = [
+                            files.enter_context(temp.open("w"))
+                            for temp in temps
+                        ]
+                        backend = self.backend(outputs[0])
+                        self.stage(records, "emit", self.emit, tree, vm_tree,
+                                   backend, outputs[1] if self.xml else None)
+                        self.stage(records, "write", self.write, outputs)
+                    for temp, target in zip(temps, targets):
+                        os.replace(temp, target)
+                except BaseException:
+                    for temp in temps:
+                        temp.unlink(missing_ok=True)
+                    raise
+                info = {
+                    "interface": backend.subroutines,
+                    "calls": sorted(backend.calls),
+                    "peephole": dict(getattr(backend.vm_writer, "hits", {})),
+                    "inlined": dict(backend.inlined),
+                }
+        finally:
+            if self.measure:
+                tracemalloc.stop()
+        for record in records:
+            record["file"] = str(path)
+            record["tokens"] = n_tokens
+        self.timings.extend(records)
+        return info
+
+    def parse(self, records: list, path: Path) -> (ast.Class, int):
+        """
+        read → tokenize → parse を実行し、(AST, トークン数)を返す。
+        treesに同じサイズと更新時刻で記録したASTがあれば、それを返す
+        """
+        if self.trees is not None:
+            stat = path.stat()
+            key = str(path.resolve())
+            version = (stat.st_mtime_ns, stat.st_size)
+            entry = self.trees.get(key)
+            if entry is not None and entry[0] == version:
+                return entry[1], entry[2]
+        source = self.stage(records, "read", path.read_text)
+        tokenizer = self.stage(
+            records, "tokenize", JackTokenizer, source, path.name,
+        )
+        engine = CompilationEngine(tokenizer)
+        tree = self.stage(records, "parse", engine.compileClass)
+        if self.trees is not None:
+            self.trees[key] = (version, tree, len(tokenizer.tokens))
+        return tree, len(tokenizer.tokens)
+
+    def backend(self, output: io.TextIOBase) -> VMBackend:
+        """
+        outputへVMコードを書き出すVMBackendを作る
+        (peepholeのときはPeepholeOptimizerを間に挟む)
+        """
+        vm_writer = VMWriter(output)
+        if self.peephole:
+            vm_writer = PeepholeOptimizer(vm_writer, self.peephole)
+        return VMBackend(
+            vm_writer, strength_reduction=self.optimize,
+            inlines=self.inlines, signatures=self.signatures,
+            branches=self.branches, pool_strings=self.pool_strings,
+        )
+
+    def compile_tree(self, tree: ast.Class) -> (str, str or None):
+        """
+        ファイルを書き出さずにASTをコンパイルし、(VMコード, XML or None)を返す。
+        XMLはxml=Trueのときだけ生成する
+        """
+        vm_tree = ConstantFolder().visit(tree) if self.optimize else tree
+        vm = io.StringIO()
+        xml = io.StringIO() if self.xml else None
+        self.emit(tree, vm_tree, self.backend(vm), xml)
+        return vm.getvalue(), xml.getvalue() if xml is not None else None
+
+    def find_inlines(self, paths: list,
+                     index: SignatureIndex = None) -> None:
+        """
+        pathsのすべてのクラスから展開できるサブルーチンを集め、inlinesに記録する。
+        indexを与えると、そこに記録した候補を使い、変わったファイルだけを構文解析する。
+        構文エラーのあるファイルは飛ばす(エラーはコンパイルのときに報告される)
+        """
+        for path in paths:
+            candidates = None
+            if index is not None:
+                candidates = index.inline_candidates(path)
+            if candidates is None:
+                try:
+                    tree, _ = self.parse([], path)
+                except ValueError:
+                    continue
+                candidates = inline_candidates(tree)
+                if index is not None:
+                    index.set_inline_candidates(path, candidates)
+            self.inlines.update(find_inlines(candidates, self.inline))
+
+    def run_all(self, paths: list, jobs: int = 1) -> list:
+        """
+        pathsの各ファイルをコンパイルし、pathsと同じ順に(path, エラー文字列 or None)を返す。
+        jobs > 1のときはjobs個のプロセスに振り分けて並列にコンパイルする。
+        成功したファイルのrun()の結果はinfosに、最適化規則の適用回数はpeephole_hitsに、
+        展開した呼び出しの数はinlinedに記録する
+        """
+        args = [
+            (path, self.measure, self.options(), self.inlines,
+             self.signatures)
+            for path in paths
+        ]
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                chunksize = max(1, len(args) // (jobs * 8))
+                results = list(executor.map(
+                    compile_file, *zip(*args), chunksize=chunksize,
+                ))
+        else:
+            results = [compile_file(*arg, trees=self.trees) for arg in args]
+        statuses = []
+        for path, (error, timings, info) in zip(paths, results):
+            statuses.append((path, error))
+            self.timings.extend(timings)
+            if info is not None:
+                self.infos[path] = info
+                self.peephole_hits.update(info["peephole"])
+                self.inlined.update(info["inlined"])
+        return statuses
+
+    def emit(self, tree, vm_tree, backend: VMBackend,
+             xml: io.TextIOBase or None) -> None:
+        """
+        vm_treeからVMコードを書き出し、xmlが与えられればtreeからXMLも書き出す
+        """
+        backend.visit(vm_tree)
+        if self.peephole:
+            backend.vm_writer.flush()
+        if xml is not None:
+            XMLBackend(xml, indent=" " * self.xml_indent).visit(tree)
+
+    def write(self, outputs: list) -> None:
+        for output in outputs:
+            output.flush()
+
+    def stage(self, records: list, name: str, func, *args):
+        """
+        ステージnameとしてfunc(*args)を実行し、その結果を返す
+        """
+        if not self.measure:
+            return func(*args)
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - base
+        records.append({"stage": name, "seconds": seconds, "peak_bytes": peak})
+        return result
+
+    def totals(self) -> dict:
+        """
+        全ファイル分のステージごとの合計(ピークメモリは最大値)を返す
+        """
+        totals = {
+            name: {"seconds": 0.0, "tokens": 0, "peak_bytes": 0}
+            for name in STAGES
+        }
+        for record in self.timings:
+            total = totals[record["stage"]]
+            total["seconds"] += record["seconds"]
+            total["tokens"] += record["tokens"]
+            total["peak_bytes"] = max(
+                total["peak_bytes"], record["peak_bytes"],
+            )
+        return totals
+
+    def report(self, fmt: "text" or "json" = "text") -> str:
+        """
+        計測結果を表(text)またはJSON(json)の文字列にして返す
+        """
+        totals = self.totals()
+        if fmt == "json":
+            return json.dumps(
+                {"files": self.timings, "totals": totals}, indent=2,
+            )
+        lines = [f"{'stage':<10}{'ms':>10}{'tokens':>10}{'peak KiB':>12}"]
+        for name, total in totals.items():
+            lines.append(
+                f"{name:<10}{total['seconds'] * 1000:>10.2f}"
+                f"{total['tokens']:>10}{total['peak_bytes'] / 1024:>12.1f}"
+            )
+        return "\n".join(lines)
+
+    def peephole_report(self) -> str:
+        """
+        最適化規則ごとの適用回数を表の文字列にして返す
+        """
+        lines = [f"{'rule':<18}{'hits':>8}"]
+        for name in self.peephole:
+            lines.append(f"{name:<18}{self.peephole_hits[name]:>8}")
+        return "\n".join(lines)
+
+    def inline_report(self) -> str:
+        """
+        展開したサブルーチンと呼び出し箇所の数を表の文字列にして返す
+        """
+        lines = [f"{'inlined':<30}{'calls':>8}"]
+        for name, count in sorted(self.inlined.items()):
+            lines.append(f"{name:<30}{count:>8}")
+        return "\n".join(lines)
+
+
+def temporary_path(path: Path) -> Path:
+    """
+    pathを書き出す間に使う、同じディレクトリの一時ファイルのパスを返す
+    (os.replace()でpathへ置き換えられるように同じディレクトリにする)
+    """
+    return path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+
+def compile_file(
+    path: Path, measure: bool, options: dict, inlines: dict = None,
+    signatures: dict = None, trees: dict = None,
+) -> (str or None, list, dict or None):
+    """
+    1ファイルを新しいCompilePipelineでコンパイルし、
+    (エラー文字列 or None, 計測値, run()の結果 or None)を返す。
+    子プロセスからも呼べるようにモジュールの関数にしている
+    (treesは同じプロセスで呼ぶときだけ渡す)
+    """
+    pipeline = CompilePipeline(measure=measure, **options)
+    pipeline.inlines = inlines or {}
+    pipeline.signatures = signatures or {}
+    pipeline.trees = trees
+    try:
+        info = pipeline.run(path)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", pipeline.timings, None
+    return None, pipeline.timings, info
+
+
+def compile_batch(sources: dict, signatures: dict = None,
+                  **options) -> (dict, dict):
+    """
+    クラス名 → Jackのソースの辞書を、ファイルを読み書きせずにコンパイルし、
+    (クラス名 → (VMコード, XML or None), クラス名 → エラー文字列)を返す。
+    呼び出しはsignatures(OSなどの見出し)とsourcesのクラスの見出しで確かめ、
+    optionsはCompilePipelineの引数として使う。
+    コンパイルできないクラスは例外を投げずにエラー文字列にし、ほかのクラスはコンパイルする
+    """
+    pipeline = CompilePipeline(**options)
+    trees = {}
+    errors = {}
+    for name, source in sources.items():
+        try:
+            tokenizer = JackTokenizer(source, f"{name}.jack")
+            trees[name] = CompilationEngine(tokenizer).compileClass()
+        except ValueError as e:
+            errors[name] = str(e)
+        except Exception as e:
+            errors[name] = f"{type(e).__name__}: {e}"
+    pipeline.signatures = dict(signatures or {})
+    for tree in trees.values():
+        pipeline.signatures.update(tree_headers(tree))
+        if pipeline.inline:
+            pipeline.inlines.update(find_inlines(tree, pipeline.inline))
+    results = {}
+    for name, tree in trees.items():
+        try:
+            results[name] = pipeline.compile_tree(tree)
+        except ValueError as e:
+            errors[name] = str(e)
+        except Exception as e:
+            errors[name] = f"{type(e).__name__}: {e}"
+    return results, errors
+
+
+def compile_sources(sources: dict, signatures: dict = None,
+                    **options) -> dict:
+    """
+    クラス名 → Jackのソースの辞書をコンパイルし、クラス名 → VMコードの辞書を返す。
+    ファイルを読み書きせず、呼び出しごとに新しいCompilePipelineを作るので、
+    複数のスレッドから同時に呼べる。エラーのあるクラスがあればValueErrorになる
+    """
+    results, errors = compile_batch(sources, signatures, **options)
+    check_errors(errors)
+    return {name: vm for name, (vm, _) in results.items()}
+
+
+def compile_sources_xml(sources: dict, signatures: dict = None,
+                        **options) -> dict:
+    """
+    compile_sources()と同じようにコンパイルし、クラス名 → シンボル情報付きのXMLの辞書を返す
+    """
+    options["xml"] = True
+    results, errors = compile_batch(sources, signatures, **options)
+    check_errors(errors)
+    return {name: xml for name, (_, xml) in results.items()}
+
+
+def check_errors(errors: dict) -> None:
+    if errors:
+        raise ValueError("\n".join(
+            f"{name}: {error}" for name, error in errors.items()
+        ))
@@ -0,0 +1,192 @@
+"""
+JackCompiler.py --serve のコンパイルサーバ。
+UNIXソケットで1行のJSONのリクエストを受け取り、1行のJSONで結果を返す。
+プロセスを起動し直さないので、読み込んだモジュールと、見出しの索引・ASTのキャッシュが
+リクエストをまたいで温まったまま残る。リクエストは届いた順に1つずつ処理する
+
+    {"argv": [...], "cwd": "..."}
+        cwdでJackCompiler.pyを同じ引数で実行する
+        → {"exit": 終了コード, "stdout": "...", "stderr": "..."}
+    {"sources": {"Main": "...", ...}, "options": {...}}
+        ファイルを読み書きせずにソースをコンパイルする(optionsはCompilePipelineの引数)
+        → {"vm": {"Main": "...", ...}, "xml": {...}, "errors": {...}}
+
+処理できないリクエストには {"error": "..."} を返す
+"""
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+from collections import OrderedDict
+from pathlib import Path
+import JackClient
+from CompilePipeline import compile_batch
+from SignatureIndex import OS_SOURCES, SignatureIndex
+
+SOCKET_PATH = Path(JackClient.SOCKET_PATH)
+# キャッシュしておくASTの数の上限(長く動かしても使ったファイルの数だけメモリが増えないように)
+MAX_TREES = 512
+
+
+class LRUCache(OrderedDict):
+    """
+    要素がlimit個を超えると、最も長く使われていないものから捨てる辞書。
+    CompilePipeline.treesが使うget()と代入で、使った順を更新する
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        super().__init__()
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key, value) -> None:
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.limit:
+            self.popitem(last=False)
+
+
+class CompileCache():
+    """
+    リクエストをまたいで使い回すもの。
+    indexesは索引ファイルのパス → SignatureIndex、treesはCompilePipeline.treesに渡すAST
+    (最近使ったmax_trees個だけを残す)
+    """
+
+    def __init__(self, max_trees: int = MAX_TREES):
+        self.indexes: dict = {}
+        self.trees: LRUCache = LRUCache(max_trees)
+        self.os_index = SignatureIndex(None)
+
+    def index(self, path: Path) -> SignatureIndex:
+        key = path.resolve()
+        if key not in self.indexes:
+            self.indexes[key] = SignatureIndex(path)
+        return self.indexes[key]
+
+    def compile_sources(self, sources: dict, options: dict) -> dict:
+        """
+        クラス名 → ソースの辞書をコンパイルし、クラス名ごとのVMコード・XML・エラーを返す。
+        呼び出しはOSとsourcesのクラスの見出しで確かめる
+        """
+        os_sources = sorted(OS_SOURCES.glob("*.jack"))
+        self.os_index.update(os_sources)
+        results, errors = compile_batch(
+            sources, self.os_index.signatures(os_sources), **options,
+        )
+        return {
+            "vm": {name: vm for name, (vm, _) in results.items()},
+            "xml": {
+                name: xml for name, (_, xml) in results.items()
+                if xml is not None
+            },
+            "errors": errors,
+        }
+
+
+class CompileHandler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            # 何も送らずに閉じた(serve()がサーバの有無を確かめた)
+            return
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response = {"error": f"JSONではありません: {e}"}
+        else:
+            response = self.server.respond(request)
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class CompileServer(socketserver.UnixStreamServer):
+    """
+    リクエストを1つずつ処理するサーバ。
+    mainはJackCompiler.pyのmain(argv, cache)で、標準出力と標準エラー出力を応答に写す
+    """
+
+    def __init__(self, socket_path: Path, main):
+        self.main = main
+        self.cache = CompileCache()
+        super().__init__(str(socket_path), CompileHandler)
+
+    def server_bind(self) -> None:
+        """
+        ソケットファイルは共有の/tmpに置かれるので、作る間もその後も自分だけが読み書きできるようにする
+        """
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+        os.chmod(self.server_address, 0o600)
+
+    def respond(self, request: dict) -> dict:
+        try:
+            if "argv" in request:
+                return self.run(request["argv"], request["cwd"])
+            if "sources" in request:
+                return self.cache.compile_sources(
+                    request["sources"], request.get("options", {}),
+                )
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+        return {"error": f"未知のリクエストです: {sorted(request)}"}
+
+    def run(self, argv: list, cwd: str) -> dict:
+        if any(arg.startswith("--serve") for arg in argv):
+            return {"error": "サーバの中で--serveは使えません"}
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        previous = os.getcwd()
+        os.chdir(cwd)
+        try:
+            with contextlib.redirect_stdout(stdout), \
+                    contextlib.redirect_stderr(stderr):
+                try:
+                    code = self.main(argv, self.cache)
+                except SystemExit as e:
+                    # argparseのエラー(2)と--help(0)
+                    code = e.code if isinstance(e.code, int) else 1
+        finally:
+            os.chdir(previous)
+        return {
+            "exit": code,
+            "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue(),
+        }
+
+
+def serve(socket_path: Path, main) -> None:
+    """
+    socket_pathで待ち受け、Ctrl-Cかkillで止めるまでリクエストを処理する。
+    前のサーバが残したソケットファイルは、つながらなければ消して使う
+    """
+    if socket_path.exists():
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(str(socket_path))
+            except ConnectionRefusedError:
+                socket_path.unlink()
+            else:
+                sys.exit(f"サーバは既に動いています: {socket_path}")
+    # killで止めたときもソケットファイルを消す
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with CompileServer(socket_path, main) as server:
+        print(f"listening on {socket_path}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            socket_path.unlink(missing_ok=True)
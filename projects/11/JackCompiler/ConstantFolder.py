@@ -0,0 +1,208 @@
+"""
+コンパイル時に値の決まる式を、VMコードを生成する前に畳み込む(定数畳み込み)。
+Jackの整数は16ビットの2の補数なので、畳み込んだ結果も16ビットに丸める
+"""
+import JackAST as ast
+
+KEYWORD_VALUES = {"true": -1, "false": 0, "null": 0}
+# x op a op b を x op (a op' b) にまとめられる演算子(16ビットの剰余上で結合的)
+ASSOCIATIVE_OPS = ("*", "&", "|")
+# x op c が x のままになる定数
+IDENTITIES = {"+": 0, "-": 0, "*": 1, "/": 1, "&": -1, "|": 0}
+
+
+def wrap(value: int) -> int:
+    """
+    valueを16ビットの符号付き整数に丸める
+    """
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def constant_value(node: ast.Node) -> int or None:
+    """
+    nodeが定数ならその値を、そうでなければNoneを返す
+    """
+    if isinstance(node, ast.IntegerConstant):
+        return node.value
+    if isinstance(node, ast.KeywordConstant):
+        return KEYWORD_VALUES.get(node.keyword)
+    return None
+
+
+def apply_binary(op: str, a: int, b: int) -> int or None:
+    """
+    a op b をJackの意味で計算する。0除算のように畳み込めないときはNoneを返す
+    """
+    if op == "+":
+        return wrap(a + b)
+    if op == "-":
+        return wrap(a - b)
+    if op == "*":
+        return wrap(a * b)
+    if op == "/":
+        if b == 0:
+            # 実行時にMath.divideがエラーを出すように残す
+            return None
+        # Math.divideと同じく0方向に切り捨てる
+        quotient = abs(a) // abs(b)
+        return wrap(-quotient if (a < 0) != (b < 0) else quotient)
+    if op == "&":
+        return wrap(a & b)
+    if op == "|":
+        return wrap(a | b)
+    if op == "<":
+        return -1 if a < b else 0
+    if op == ">":
+        return -1 if a > b else 0
+    if op == "=":
+        return -1 if a == b else 0
+    raise ValueError(f"未知の演算子です: {op}")
+
+
+def apply_unary(op: str, a: int) -> int:
+    return wrap(-a) if op == "-" else wrap(~a)
+
+
+def signed_term(value: int) -> (str, ast.IntegerConstant):
+    """
+    x + value を、定数が負にならないように x + c か x - c で表す
+    """
+    if value < 0 and value != -0x8000:
+        return "-", ast.IntegerConstant(-value)
+    return "+", ast.IntegerConstant(value)
+
+
+class ConstantFolder(ast.Visitor):
+    """
+    ASTを受け取り、定数部分式を畳み込んだ新しいASTを返す(元のASTは変更しない)。
+    式は優先順位なしで左から評価されるため、畳み込むのは
+    先頭から続く定数の並びと、x + a - b や x * a * b のように直前の定数とまとめられる項に限る。
+    畳み込んだ値は負の数にもなるIntegerConstantで表し、VMBackendが符号を処理する
+    """
+
+    def visitClass(self, node: ast.Class) -> ast.Class:
+        return ast.Class(
+            node.name, node.var_decs,
+            [self.visit(subroutine) for subroutine in node.subroutines],
+        )
+
+    def visitSubroutineDec(self, node: ast.SubroutineDec) -> ast.SubroutineDec:
+        return ast.SubroutineDec(
+            node.kind, node.return_type, node.name, node.parameters,
+            node.var_decs, self.statements(node.statements),
+        )
+
+    def statements(self, statements: list or None) -> list or None:
+        if statements is None:
+            return None
+        return [self.visit(statement) for statement in statements]
+
+    def expression(self, node: ast.Expression or None) -> ast.Node or None:
+        return None if node is None else self.visit(node)
+
+    def visitLetStatement(self, node: ast.LetStatement) -> ast.LetStatement:
+        return ast.LetStatement(
+            node.name, self.expression(node.index), self.visit(node.value),
+        )
+
+    def visitIfStatement(self, node: ast.IfStatement) -> ast.IfStatement:
+        return ast.IfStatement(
+            self.visit(node.condition),
+            self.statements(node.then_statements),
+            self.statements(node.else_statements),
+        )
+
+    def visitWhileStatement(
+        self, node: ast.WhileStatement,
+    ) -> ast.WhileStatement:
+        return ast.WhileStatement(
+            self.visit(node.condition), self.statements(node.statements),
+        )
+
+    def visitDoStatement(self, node: ast.DoStatement) -> ast.DoStatement:
+        return ast.DoStatement(self.visit(node.call))
+
+    def visitReturnStatement(
+        self, node: ast.ReturnStatement,
+    ) -> ast.ReturnStatement:
+        return ast.ReturnStatement(self.expression(node.value))
+
+    def visitExpression(self, node: ast.Expression) -> ast.Expression:
+        terms = [(yield node.terms[0])]
+        ops = []
+        for op, term in zip(node.ops, node.terms[1:]):
+            term = yield term
+            a = constant_value(terms[-1])
+            b = constant_value(term)
+            folded = False
+            if a is not None and b is not None:
+                if not ops:
+                    # 先頭から定数が続く: a op b を1つの定数にする
+                    value = apply_binary(op, a, b)
+                    if value is not None:
+                        terms[0] = ast.IntegerConstant(value)
+                        continue
+                else:
+                    folded = self.combine(ops, terms, op, a, b)
+            if not folded:
+                ops.append(op)
+                terms.append(term)
+            # x + 0 や x * 1 のように値の変わらない項を取り除く
+            if ops and ops[-1] in IDENTITIES and \
+                    constant_value(terms[-1]) == IDENTITIES[ops[-1]]:
+                ops.pop()
+                terms.pop()
+        return ast.Expression(terms, ops)
+
+    def combine(self, ops: list, terms: list, op: str, a: int, b: int) -> bool:
+        """
+        ... last a op b の a op b を1つの定数にまとめ、まとめられたらTrueを返す。
+        terms[-1](値a)の前の演算子はops[-1]
+        """
+        last = ops[-1]
+        if last in ("+", "-") and op in ("+", "-"):
+            value = (a if last == "+" else -a) + (b if op == "+" else -b)
+            ops[-1], terms[-1] = signed_term(wrap(value))
+            return True
+        if last == op and op in ASSOCIATIVE_OPS:
+            terms[-1] = ast.IntegerConstant(apply_binary(op, a, b))
+            return True
+        return False
+
+    def visitIntegerConstant(self, node: ast.IntegerConstant) -> ast.Node:
+        return node
+
+    def visitStringConstant(self, node: ast.StringConstant) -> ast.Node:
+        return node
+
+    def visitKeywordConstant(self, node: ast.KeywordConstant) -> ast.Node:
+        return node
+
+    def visitVarRef(self, node: ast.VarRef) -> ast.Node:
+        return node
+
+    def visitArrayRef(self, node: ast.ArrayRef) -> ast.ArrayRef:
+        return ast.ArrayRef(node.name, (yield node.index))
+
+    def visitSubroutineCall(
+        self, node: ast.SubroutineCall,
+    ) -> ast.SubroutineCall:
+        args = []
+        for arg in node.args:
+            args.append((yield arg))
+        return ast.SubroutineCall(node.qualifier, node.name, args)
+
+    def visitParenExpression(self, node: ast.ParenExpression) -> ast.Node:
+        expression = yield node.expression
+        if len(expression.terms) == 1:
+            # (term) はカッコを外しても評価順が変わらない
+            return expression.terms[0]
+        return ast.ParenExpression(expression)
+
+    def visitUnaryOp(self, node: ast.UnaryOp) -> ast.Node:
+        term = yield node.term
+        value = constant_value(term)
+        if value is not None:
+            return ast.IntegerConstant(apply_unary(node.op, value))
+        return ast.UnaryOp(node.op, term)
@@ -0,0 +1,164 @@
+"""
+呼び出し元に展開(インライン化)できる小さなサブルーチンを見つける。
+展開できるのは、ローカル変数を持たず、本体が
+    let field = 式; ... return 式?;
+だけのファンクションとメソッドで、式は引数・フィールド・定数と演算だけからなるもの
+(フィールドのgetter/setter、定数を返すファンクション、小さな計算だけのファンクション)
+"""
+import sys
+import JackAST as ast
+
+# 展開した引数を置くtempの先頭(temp 0はdo文と配列への代入、1と2は乗算の展開が使う)
+INLINE_TEMP = 3
+MAX_PARAMETERS = 8 - INLINE_TEMP
+
+
+class Inline():
+    """
+    展開できるサブルーチンの本体。fieldsはフィールド名 → フィールドのインデックス
+    """
+    __slots__ = ("method", "parameters", "fields", "assignments", "value")
+
+    def __init__(self, method: bool, parameters: list, fields: dict,
+                 assignments: list, value: ast.Expression or None):
+        self.method = method
+        self.parameters = parameters
+        self.fields = fields
+        # [(フィールド名, 式), ...]
+        self.assignments = assignments
+        # return の式(voidならNone)
+        self.value = value
+
+    def signature(self) -> str:
+        """
+        展開される内容を表す文字列(変わったら呼び出し元を再コンパイルする)
+        """
+        return repr((self.method, self.parameters, self.fields,
+                     self.assignments, self.value))
+
+
+def expression_size(node: ast.Node, names: set, calls: bool,
+                    used: set) -> int or None:
+    """
+    式の項の数を返し、式が使う変数名をusedに加える。展開できない項を含むときはNoneを返す。
+    calls=FalseのときはOSの呼び出しになる*と/も展開できない項とする。
+    入れ子が深くても再帰しないように、たどっていない項をスタックに積む
+    """
+    size = 0
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, ast.Expression):
+            if not calls and ("*" in node.ops or "/" in node.ops):
+                return None
+            nodes.extend(node.terms)
+        elif isinstance(node, ast.IntegerConstant):
+            size += 1
+        elif isinstance(node, ast.KeywordConstant):
+            if node.keyword == "this":
+                return None
+            size += 1
+        elif isinstance(node, ast.VarRef):
+            if node.name not in names:
+                return None
+            used.add(node.name)
+            size += 1
+        elif isinstance(node, ast.ParenExpression):
+            nodes.append(node.expression)
+        elif isinstance(node, ast.UnaryOp):
+            size += 1
+            nodes.append(node.term)
+        else:
+            # 文字列・配列・サブルーチン呼び出しは展開しない
+            return None
+    return size
+
+
+def inline_body(node: ast.SubroutineDec, fields: dict,
+                max_size: int) -> Inline or None:
+    """
+    サブルーチンを展開できればInlineを、できなければNoneを返す。
+    展開した本体を書いている間、メソッドのオブジェクト(pointer 1)と引数(temp)は
+    呼び出したOSの関数に書き換えられうる(--inlineでコンパイルしたMathは同じtempを使う)ので、
+    メソッドと引数のあるファンクションの本体は、*と/(Math.multiply/Math.divide)を含められない
+    """
+    method = node.kind == "method"
+    if node.kind == "constructor" or node.var_decs or \
+            len(node.parameters) > MAX_PARAMETERS:
+        return None
+    *assignments, last = node.statements or [None]
+    if not isinstance(last, ast.ReturnStatement):
+        return None
+    parameters = [name for _, name in node.parameters]
+    # 引数はフィールドを隠す
+    visible = {
+        name: index for name, index in fields.items()
+        if method and name not in parameters
+    }
+    names = set(parameters) | set(visible)
+    calls = not method and not parameters
+    used = set()
+    size = 0
+    for statement in assignments:
+        if not isinstance(statement, ast.LetStatement) or \
+                statement.index is not None or statement.name not in visible:
+            return None
+        used.add(statement.name)
+    expressions = [statement.value for statement in assignments]
+    if last.value is not None:
+        expressions.append(last.value)
+    for expression in expressions:
+        term_size = expression_size(expression, names, calls, used)
+        if term_size is None:
+            return None
+        size += term_size
+    if size > max_size:
+        return None
+    return Inline(
+        method, parameters,
+        {name: visible[name] for name in sorted(used & set(visible))},
+        [(statement.name, statement.value) for statement in assignments],
+        last.value,
+    )
+
+
+def field_indexes(tree: ast.Class) -> dict:
+    """
+    フィールド名 → フィールドのインデックスの辞書を返す
+    """
+    fields = {}
+    for var_dec in tree.var_decs:
+        if var_dec.kind == "field":
+            for name in var_dec.names:
+                fields[name] = len(fields)
+    return fields
+
+
+def inline_candidates(tree: ast.Class) -> ast.Class:
+    """
+    フィールドの宣言と、項の数を問わなければ展開できるサブルーチンだけを残したクラスを返す。
+    find_inlines()に渡すと元のクラスと同じ結果になるので、SignatureIndexに記録しておけば
+    変わっていないクラスを構文解析し直さずに済む
+    """
+    fields = field_indexes(tree)
+    return ast.Class(
+        tree.name,
+        [var_dec for var_dec in tree.var_decs if var_dec.kind == "field"],
+        [
+            subroutine for subroutine in tree.subroutines
+            if inline_body(subroutine, fields, sys.maxsize) is not None
+        ],
+    )
+
+
+def find_inlines(tree: ast.Class, max_size: int) -> dict:
+    """
+    クラスのうち展開できるサブルーチンを、"Class.sub" → Inline の辞書で返す
+    """
+    fields = field_indexes(tree)
+    inlines = {}
+    for subroutine in tree.subroutines:
+        inline = inline_body(subroutine, fields, max_size)
+        if inline is not None:
+            inlines[f"{tree.name}.{subroutine.name}"] = inline
+    return inlines
@@ -0,0 +1,238 @@
+"""
+CompilationEngineが構築する抽象構文木(AST)のノード。
+ノードは__slots__だけを持つ軽量なオブジェクトで、出力はVisitorを継承したバックエンドが担う
+"""
+from types import GeneratorType
+
+
+class Node():
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        """
+        Class(name=..., ...) の形の文字列。深く入れ子になった式でも再帰しないように、
+        書き出す文字列(True, 文字列)と、まだ文字列にしていない値(False, 値)をスタックに積む
+        """
+        parts = []
+        stack = [(False, self)]
+        while stack:
+            is_text, value = stack.pop()
+            if is_text:
+                parts.append(value)
+                continue
+            if isinstance(value, Node):
+                entries = [(True, f"{value.__class__.__name__}(")]
+                for i, name in enumerate(value.__slots__):
+                    entries.append((True, f"{', ' if i else ''}{name}="))
+                    entries.append((False, getattr(value, name)))
+                entries.append((True, ")"))
+            elif isinstance(value, (list, tuple)):
+                is_list = isinstance(value, list)
+                entries = [(True, "[" if is_list else "(")]
+                for i, item in enumerate(value):
+                    if i:
+                        entries.append((True, ", "))
+                    entries.append((False, item))
+                if len(value) == 1 and not is_list:
+                    entries.append((True, ","))
+                entries.append((True, "]" if is_list else ")"))
+            else:
+                parts.append(repr(value))
+                continue
+            stack.extend(reversed(entries))
+        return "".join(parts)
+
+
+class Visitor():
+    """
+    ノードをクラス名に対応するvisit{クラス名}メソッドへ振り分ける。
+    式のように深く入れ子になるノードのメソッドは、子ノードをvisit()せずにyieldする
+    ジェネレータにし、子ノードの結果をyieldの値として受け取る。
+    visit()はジェネレータのスタックでそれを進めるので、入れ子がどれだけ深くても再帰しない
+    """
+
+    def visit(self, node: Node):
+        result = getattr(self, "visit" + node.__class__.__name__)(node)
+        if result.__class__ is not GeneratorType:
+            return result
+        # 進めているジェネレータと、その子ノードを訪れるのを待っているジェネレータ
+        generator = result
+        waiting = []
+        value = None
+        while True:
+            try:
+                node = generator.send(value)
+            except StopIteration as stop:
+                if not waiting:
+                    return stop.value
+                value = stop.value
+                generator = waiting.pop()
+                continue
+            value = getattr(self, "visit" + node.__class__.__name__)(node)
+            if value.__class__ is GeneratorType:
+                waiting.append(generator)
+                generator = value
+                value = None
+
+
+# プログラムの構造
+
+class Class(Node):
+    __slots__ = ("name", "var_decs", "subroutines")
+
+    def __init__(self, name: str, var_decs: list, subroutines: list):
+        self.name = name
+        self.var_decs = var_decs
+        self.subroutines = subroutines
+
+
+class ClassVarDec(Node):
+    __slots__ = ("kind", "type", "names")
+
+    def __init__(self, kind: "static" or "field", type: str, names: list):
+        self.kind = kind
+        self.type = type
+        self.names = names
+
+
+class SubroutineDec(Node):
+    __slots__ = ("kind", "return_type", "name", "parameters", "var_decs",
+                 "statements")
+
+    def __init__(self, kind: "constructor" or "function" or "method",
+                 return_type: str, name: str, parameters: list,
+                 var_decs: list, statements: list):
+        self.kind = kind
+        self.return_type = return_type
+        self.name = name
+        # [(type, name), ...]
+        self.parameters = parameters
+        self.var_decs = var_decs
+        self.statements = statements
+
+
+class VarDec(Node):
+    __slots__ = ("type", "names")
+
+    def __init__(self, type: str, names: list):
+        self.type = type
+        self.names = names
+
+
+# 文
+
+class LetStatement(Node):
+    __slots__ = ("name", "index", "value")
+
+    def __init__(self, name: str, index: "Expression" or None,
+                 value: "Expression"):
+        self.name = name
+        self.index = index
+        self.value = value
+
+
+class IfStatement(Node):
+    __slots__ = ("condition", "then_statements", "else_statements")
+
+    def __init__(self, condition: "Expression", then_statements: list,
+                 else_statements: list or None):
+        self.condition = condition
+        self.then_statements = then_statements
+        # else節がなければNone
+        self.else_statements = else_statements
+
+
+class WhileStatement(Node):
+    __slots__ = ("condition", "statements")
+
+    def __init__(self, condition: "Expression", statements: list):
+        self.condition = condition
+        self.statements = statements
+
+
+class DoStatement(Node):
+    __slots__ = ("call",)
+
+    def __init__(self, call: "SubroutineCall"):
+        self.call = call
+
+
+class ReturnStatement(Node):
+    __slots__ = ("value",)
+
+    def __init__(self, value: "Expression" or None):
+        self.value = value
+
+
+# 式
+
+class Expression(Node):
+    """
+    term (op term)* を左から順に評価する式。ops[i]はterms[i]とterms[i+1]の間の演算子
+    """
+    __slots__ = ("terms", "ops")
+
+    def __init__(self, terms: list, ops: list):
+        self.terms = terms
+        self.ops = ops
+
+
+class IntegerConstant(Node):
+    __slots__ = ("value",)
+
+    def __init__(self, value: int):
+        self.value = value
+
+
+class StringConstant(Node):
+    __slots__ = ("value",)
+
+    def __init__(self, value: str):
+        self.value = value
+
+
+class KeywordConstant(Node):
+    __slots__ = ("keyword",)
+
+    def __init__(self, keyword: "true" or "false" or "null" or "this"):
+        self.keyword = keyword
+
+
+class VarRef(Node):
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class ArrayRef(Node):
+    __slots__ = ("name", "index")
+
+    def __init__(self, name: str, index: Expression):
+        self.name = name
+        self.index = index
+
+
+class SubroutineCall(Node):
+    __slots__ = ("qualifier", "name", "args")
+
+    def __init__(self, qualifier: str or None, name: str, args: list):
+        # qualifier.name(args) のqualifier(クラス名か変数名)。name(args)ならNone
+        self.qualifier = qualifier
+        self.name = name
+        self.args = args
+
+
+class ParenExpression(Node):
+    __slots__ = ("expression",)
+
+    def __init__(self, expression: Expression):
+        self.expression = expression
+
+
+class UnaryOp(Node):
+    __slots__ = ("op", "term")
+
+    def __init__(self, op: "-" or "~", term: Node):
+        self.op = op
+        self.term = term
@@ -0,0 +1,375 @@
+"""
+トークン列とASTを、キャッシュやプロセス間の受け渡しのためのコンパクトなバイト列にする。
+文字列は文字列表に1回だけ置いて番号で参照し、種類・位置・番号はすべてvarint
+(下位から7ビットずつ、最上位ビットが続きの印)で書く。
+読み込みはmemoryviewの上で行い、トークンやノードごとにバイト列を切り出さない。
+ASTのサブルーチンの本体は別の区間に書き、読み込むときは最初に参照されるまで組み立てない
+"""
+import re
+import sys
+from functools import partial
+import JackAST as ast
+
+TOKENS_MAGIC = b"JKT1"
+TREE_MAGIC = b"JKA2"
+# ASTのノードの番号(並びを変えると以前のバイト列を読めなくなる)
+NODES = (
+    ast.Class, ast.ClassVarDec, ast.SubroutineDec, ast.VarDec,
+    ast.LetStatement, ast.IfStatement, ast.WhileStatement, ast.DoStatement,
+    ast.ReturnStatement, ast.Expression, ast.IntegerConstant,
+    ast.StringConstant, ast.KeywordConstant, ast.VarRef, ast.ArrayRef,
+    ast.SubroutineCall, ast.ParenExpression, ast.UnaryOp,
+)
+# ASTの値の符号。LIST/TUPLEの次の値は要素の数、INTの次の値は整数、
+# BODYの次の値はサブルーチンの本体の区間の番号。
+# NODE_BASE + iはNODES[i]、SHORT_LIST_BASE + nは要素がn個のリスト、
+# STRING_BASE + iは文字列表のi番目の文字列
+NONE, LIST, TUPLE, INT, BODY = range(5)
+NODE_BASE = 5
+SHORT_LIST_BASE = NODE_BASE + len(NODES)
+SHORT_LISTS = 8
+STRING_BASE = SHORT_LIST_BASE + SHORT_LISTS
+# SubroutineDecのうち、本体の区間に書かないスロット
+HEADER_SLOTS = ("kind", "return_type", "name", "parameters")
+# 2バイト以上のvarint
+LONG_VARINT_RE = re.compile(rb"[\x80-\xff]+[\x00-\x7f]")
+
+
+def encode_varints(values) -> bytearray:
+    """
+    0以上の整数の列をvarintの列にする
+    """
+    out = bytearray()
+    for value in values:
+        while value >= 0x80:
+            out.append(value & 0x7F | 0x80)
+            value >>= 7
+        out.append(value)
+    return out
+
+
+def decode_varints(data: memoryview) -> list:
+    """
+    varintの列を整数のリストにする。
+    1バイト(127以下)のvarintはバイトの値そのものなので、
+    2バイト以上のvarintの間の区間はまとめてリストへ移す
+    """
+    decoded = []
+    start = 0
+    for m in LONG_VARINT_RE.finditer(data):
+        decoded += data[start:m.start()]
+        value = 0
+        for shift, byte in enumerate(m.group()):
+            value |= (byte & 0x7F) << shift * 7
+        decoded.append(value)
+        start = m.end()
+    decoded += data[start:]
+    return decoded
+
+
+def zigzag(value: int) -> int:
+    # 負の数も小さいvarintになるように、0, -1, 1, -2, ... を 0, 1, 2, 3, ... にする
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+class StringTable():
+    """
+    文字列 → 番号の表。同じ文字列は1回だけ書き出す
+    """
+
+    def __init__(self):
+        self.numbers: dict = {}
+        self.strings: list = []
+
+    def number(self, string: str) -> int:
+        number = self.numbers.get(string)
+        if number is None:
+            number = self.numbers[string] = len(self.strings)
+            self.strings.append(string)
+        return number
+
+
+class Writer():
+    """
+    バイト列を組み立てる。区間(section)は長さ付きのvarintの列
+    """
+
+    def __init__(self, magic: bytes):
+        self.out = bytearray(magic)
+
+    def varint(self, value: int) -> None:
+        self.out += encode_varints((value,))
+
+    def section(self, values) -> None:
+        data = encode_varints(values)
+        self.varint(len(data))
+        self.out += data
+
+    def strings(self, table: StringTable) -> None:
+        encoded = [string.encode() for string in table.strings]
+        self.section(map(len, encoded))
+        self.out += b"".join(encoded)
+
+    def getvalue(self) -> bytes:
+        return bytes(self.out)
+
+
+class Reader():
+    """
+    Writerが組み立てたバイト列をmemoryviewの上で先頭から読む
+    """
+
+    def __init__(self, data: bytes, magic: bytes):
+        self.data = memoryview(data)
+        if self.data[:len(magic)] != magic:
+            raise ValueError(f"{magic.decode()}形式のバイト列ではありません")
+        self.pos = len(magic)
+
+    def varint(self) -> int:
+        data = self.data
+        value = shift = 0
+        while True:
+            byte = data[self.pos]
+            self.pos += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def section(self) -> list:
+        return decode_varints(self.section_data())
+
+    def section_data(self) -> memoryview:
+        """
+        区間をvarintの列のまま返す(あとでdecode_varints()に渡す)
+        """
+        end = self.varint() + self.pos
+        data = self.data[self.pos:end]
+        self.pos = end
+        return data
+
+    def strings(self) -> list:
+        """
+        文字列表を読む。識別子はSymbolTableの辞書のキーになるのでinternする
+        """
+        data = self.data
+        strings = []
+        for length in self.section():
+            start = self.pos
+            self.pos = start + length
+            strings.append(sys.intern(str(data[start:self.pos], "utf-8")))
+        return strings
+
+
+def loaded_slot(name: str) -> property:
+    """
+    本体を組み立ててから、JackAST.SubroutineDecのスロットnameを読み書きするproperty
+    """
+    def get(self):
+        self.load()
+        return getattr(self, name)
+
+    def set(self, value):
+        self.load()
+        setattr(self, name, value)
+    return property(get, set)
+
+
+class SubroutineDec(ast.SubroutineDec):
+    """
+    load_tree()が作るSubroutineDec。var_decsとstatementsは最初に参照したときに
+    本体の区間から組み立て、そのあとはJackAST.SubroutineDecそのものになる。
+    Visitorの呼び分けとreprのために、クラス名とスロットの並びはJackAST.SubroutineDecと同じにする
+    """
+    # スロットを足すと__class__を付け替えられなくなるので、JackAST.SubroutineDecのスロットを使う
+    __slots__ = ()
+    var_decs = loaded_slot("var_decs")
+    statements = loaded_slot("statements")
+
+    def __init__(self, kind: str, return_type: str, name: str,
+                 parameters: list, body: partial):
+        self.kind = kind
+        self.return_type = return_type
+        self.name = name
+        self.parameters = parameters
+        # 組み立てるまでは、var_decsのスロットに本体を組み立てる関数を入れておく
+        ast.SubroutineDec.var_decs.__set__(self, body)
+
+    def load(self) -> None:
+        var_decs, statements = ast.SubroutineDec.var_decs.__get__(self)()
+        self.__class__ = ast.SubroutineDec
+        self.var_decs = var_decs
+        self.statements = statements
+
+
+# repr()やdump_tree()がスロットの並びを__slots__から読むので、空のままにしない
+SubroutineDec.__slots__ = ast.SubroutineDec.__slots__
+# ノードの符号 → (ノードを作るクラス, 引数の数)
+NODE_ARGS = [(cls, len(cls.__slots__)) for cls in NODES]
+# サブルーチンの頭の区間では、SubroutineDecは本体を後で組み立てるものにする
+HEADER_NODE_ARGS = [
+    (SubroutineDec, len(HEADER_SLOTS) + 1) if cls is ast.SubroutineDec
+    else (cls, n)
+    for cls, n in NODE_ARGS
+]
+NODE_NUMBERS = {cls: NODE_BASE + i for i, cls in enumerate(NODES)}
+NODE_NUMBERS[SubroutineDec] = NODE_NUMBERS[ast.SubroutineDec]
+
+
+def encode_value(value, table: StringTable, bodies: list = None) -> list:
+    """
+    値を後順(スロットの値、ノードの順)にたどり、値の符号の列にする。
+    bodiesを与えたときは、SubroutineDecの本体(var_decs, statements)を
+    bodiesに加え、その番号をBODYの符号で書く
+    """
+    codes = []
+    append = codes.append
+    # 入れ子の深い式でも再帰しないように、
+    # (True, 書き出す符号のリスト)か、(False, まだたどっていない値)をスタックに積む
+    stack = [(False, value)]
+    while stack:
+        is_codes, value = stack.pop()
+        if is_codes:
+            codes.extend(value)
+        elif value is None:
+            append(NONE)
+        elif isinstance(value, str):
+            append(STRING_BASE + table.numbers[value])
+        elif isinstance(value, int):
+            append(INT)
+            append(zigzag(value))
+        elif isinstance(value, (list, tuple)):
+            if isinstance(value, list) and len(value) < SHORT_LISTS:
+                stack.append((True, [SHORT_LIST_BASE + len(value)]))
+            else:
+                stack.append(
+                    (True, [LIST if isinstance(value, list) else TUPLE,
+                            len(value)])
+                )
+            stack.extend((False, item) for item in reversed(value))
+        elif isinstance(value, ast.SubroutineDec) and bodies is not None:
+            stack.append(
+                (True, [BODY, len(bodies), NODE_NUMBERS[ast.SubroutineDec]])
+            )
+            bodies.append((value.var_decs, value.statements))
+            stack.extend(
+                (False, getattr(value, name))
+                for name in reversed(HEADER_SLOTS)
+            )
+        elif value.__class__ in NODE_NUMBERS:
+            stack.append((True, [NODE_NUMBERS[value.__class__]]))
+            stack.extend(
+                (False, getattr(value, name))
+                for name in reversed(value.__slots__)
+            )
+        else:
+            raise ValueError(f"書き出せない値です: {value!r}")
+    return codes
+
+
+def dump_tree(tree: ast.Class) -> bytes:
+    """
+    ASTを値の符号の列として書き出す。サブルーチンの本体は1つずつ別の区間にし、
+    木の残り(クラスとサブルーチンの頭)の区間のあとに並べる。
+    文字列の番号は出現の多い順に振り、よく使う文字列ほど短いvarintにする
+    """
+    counts = {}
+    stack = [tree]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            counts[value] = counts.get(value, 0) + 1
+        elif isinstance(value, (list, tuple)):
+            stack.extend(reversed(value))
+        elif isinstance(value, ast.Node):
+            stack.extend(
+                getattr(value, name) for name in reversed(value.__slots__)
+            )
+    table = StringTable()
+    for string in sorted(counts, key=counts.get, reverse=True):
+        table.number(string)
+    bodies = []
+    codes = encode_value(tree, table, bodies)
+    writer = Writer(TREE_MAGIC)
+    writer.strings(table)
+    writer.section(codes)
+    writer.varint(len(bodies))
+    for body in bodies:
+        writer.section(encode_value(body, table))
+    return writer.getvalue()
+
+
+def build(codes: list, strings: list, nodes: list, bodies: list = None):
+    """
+    後順の符号を先頭から読み、値をスタックに積んで、ノードの符号でスロットの数だけ取り出す。
+    ノードはスロットと同じ順の引数で__init__を呼んで作る
+    """
+    values = iter(codes)
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    for code in values:
+        if code >= STRING_BASE:
+            push(strings[code - STRING_BASE])
+        elif code >= SHORT_LIST_BASE:
+            n = code - SHORT_LIST_BASE
+            if n == 0:
+                push([])
+            elif n == 1:
+                stack[-1] = [stack[-1]]
+            else:
+                items = stack[-n:]
+                del stack[-n:]
+                push(items)
+        elif code >= NODE_BASE:
+            cls, n = nodes[code - NODE_BASE]
+            if n == 1:
+                stack[-1] = cls(stack[-1])
+            elif n == 2:
+                second = pop()
+                stack[-1] = cls(stack[-1], second)
+            else:
+                args = stack[-n:]
+                del stack[-n:]
+                push(cls(*args))
+        elif code == NONE:
+            push(None)
+        elif code == INT:
+            push(unzigzag(next(values)))
+        elif code == BODY:
+            push(bodies[next(values)])
+        else:
+            n = next(values)
+            items = stack[len(stack) - n:]
+            del stack[len(stack) - n:]
+            push(items if code == LIST else tuple(items))
+    if len(stack) != 1:
+        raise ValueError("ASTのバイト列が壊れています")
+    return stack[0]
+
+
+def load_body(data: memoryview, strings: list) -> tuple:
+    """
+    サブルーチンの本体の区間から(var_decs, statements)を組み立てる
+    """
+    return build(decode_varints(data), strings, NODE_ARGS)
+
+
+def load_tree(data: bytes) -> ast.Class:
+    """
+    dump_tree()のバイト列からASTを組み立てる。
+    ここで組み立てるのはクラスとサブルーチンの頭だけで、
+    サブルーチンの本体はSubroutineDecが最初に参照されたときに組み立てる
+    """
+    reader = Reader(data, TREE_MAGIC)
+    strings = reader.strings()
+    codes = reader.section()
+    bodies = [
+        partial(load_body, reader.section_data(), strings)
+        for _ in range(reader.varint())
+    ]
+    return build(codes, strings, HEADER_NODE_ARGS, bodies)
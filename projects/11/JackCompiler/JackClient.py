@@ -0,0 +1,54 @@
+"""
+JackCompiler.pyの代わりに使える薄いクライアント。引数はJackCompiler.pyと同じで、
+JackCompiler.py --serve で動いているサーバへ送ってコンパイルさせ、出力と終了コードをそのまま返す。
+サーバが動いていなければ、JackCompiler.pyを起動し直して同じ引数で実行する。
+起動を速くするため、標準ライブラリの軽いモジュールしか読み込まない
+
+    python JackClient.py [JackCompiler.pyの引数...]
+
+ソケットは環境変数JACK_COMPILER_SOCKETで指定できる
+"""
+import json
+import os
+import socket
+import sys
+import tempfile
+
+SOCKET_PATH = os.environ.get("JACK_COMPILER_SOCKET") or os.path.join(
+    tempfile.gettempdir(), f"jackcompiler-{os.getuid()}.sock",
+)
+JACK_COMPILER = os.path.join(os.path.dirname(__file__), "JackCompiler.py")
+
+
+def request(message: dict, socket_path: str = SOCKET_PATH) -> dict:
+    """
+    サーバへ1つのリクエストを送り、応答を返す。
+    サーバが動いていない・ソケットに接続できないときはOSError
+    (FileNotFoundError, ConnectionRefusedError, PermissionErrorなど)になる
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(socket_path))
+        client.sendall(json.dumps(message).encode() + b"\n")
+        client.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return json.loads(b"".join(chunks))
+
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    try:
+        response = request({"argv": argv, "cwd": os.getcwd()})
+    except OSError:
+        # サーバがない・古いソケットファイルが残っている・他のユーザのソケットなど
+        os.execv(sys.executable, [sys.executable, JACK_COMPILER, *argv])
+    if "error" in response:
+        print(response["error"], file=sys.stderr)
+        sys.exit(1)
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    sys.exit(response["exit"])
@@ -1,17 +1,197 @@
-from pathlib import Path
+import argparse
 import sys
-from CompilationEngine import CompilationEngine
+from pathlib import Path
+from BuildManifest import BuildManifest
+from CompilePipeline import CompilePipeline
+from CompileServer import SOCKET_PATH, CompileCache, serve
+from Linker import OS_DIR, Linker
+from SignatureIndex import INDEX_NAME, OS_SOURCES, SignatureIndex
+from PeepholeOptimizer import RULES
 
-if __name__ == "__main__":
-    path = Path(sys.argv[1])
+
+def main(argv: list = None, cache: CompileCache = None) -> int:
+    """
+    コマンドライン引数argvでコンパイルし、終了コードを返す。
+    cacheを与えると(--serveから呼ぶとき)、見出しの索引とASTをリクエストをまたいで使い回す
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", type=Path, nargs="?")
+    # 値を取るオプションをnargs="?"にするとpathを値として読んでしまうので、
+    # 有効にするフラグと値を与えるオプションを分ける
+    parser.add_argument(
+        "--timings", action="store_true",
+        help="ステージごとの実行時間・トークン数・ピークメモリを出力する",
+    )
+    parser.add_argument(
+        "--timings-format", choices=("text", "json"), default="text",
+        help="--timingsの出力形式(省略時はtext)",
+    )
+    parser.add_argument(
+        "--xml", action="store_true",
+        help="シンボル情報付きの構文解析結果を.xmlにも書き出す",
+    )
+    parser.add_argument(
+        "--xml-indent", type=int, default=0, metavar="N",
+        help=".xmlの要素を入れ子の深さごとにN文字ずつ字下げする",
+    )
+    parser.add_argument(
+        "--no-output", action="store_true",
+        help="構文解析までで止め、何も書き出さない(--timingsと合わせて使う)",
+    )
+    parser.add_argument(
+        "--optimize", "-O", action="store_true",
+        help="定数式を畳み込み、定数との乗算をMath.multiplyを呼ばない加算に展開する",
+    )
+    parser.add_argument(
+        "--peephole", action="store_true",
+        help="生成したVMコードに最適化規則を適用し、規則ごとの適用回数を出力する",
+    )
+    parser.add_argument(
+        "--peephole-rules", default=",".join(RULES), metavar="RULES",
+        help="--peepholeで適用する規則をカンマ区切りで指定する"
+             f"(省略時はすべて: {', '.join(RULES)})",
+    )
+    parser.add_argument(
+        "--inline", action="store_true",
+        help="引数・フィールド・定数の演算だけからなる小さなサブルーチンの呼び出しを展開し、"
+             "展開したサブルーチンを出力する",
+    )
+    parser.add_argument(
+        "--inline-size", type=int, default=8, metavar="SIZE",
+        help="--inlineで展開するサブルーチンの式の項の数の上限(省略時は8)",
+    )
+    parser.add_argument(
+        "--branches", action="store_true",
+        help="whileを条件が末尾のループにし、条件を反転した分岐でnotとgotoを省く",
+    )
+    parser.add_argument(
+        "--pool-strings", action="store_true",
+        help="クラスの中の同じ文字列定数を最初に評価したときに1回だけ作り、"
+             "staticに置いて使い回す(文字列を書き換えたりdispose()したりしないプログラム向け)。"
+             "2回以上書かれているかwhileの中にある文字列だけをまとめる"
+             "(1回しか評価されない文字列はまとめると命令が増える)",
+    )
+    parser.add_argument(
+        "--link", action="store_true",
+        help="コンパイルした.vmとOSの.vmから、Sys.initから到達する関数だけを1つの.vmに"
+             "まとめて書き出す",
+    )
+    parser.add_argument(
+        "--link-output", type=Path, metavar="OUT",
+        help="--linkで書き出す.vm(省略時は <フォルダ>/linked/<フォルダ名>.vm)",
+    )
+    parser.add_argument(
+        "--os", type=Path, default=OS_DIR, metavar="DIR",
+        help=f"リンクするOSの.vmのフォルダ(省略時は {OS_DIR})",
+    )
+    parser.add_argument(
+        "--os-sources", type=Path, default=OS_SOURCES, metavar="DIR",
+        help="呼び出しを確かめるために見出しを読むOSの.jackのフォルダ"
+             f"(省略時は {OS_SOURCES})",
+    )
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=1,
+        help="並列にコンパイルするプロセス数",
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="ビルド情報(.jackbuild.json)を無視してすべてのファイルをコンパイルする",
+    )
+    parser.add_argument(
+        "--serve", action="store_true",
+        help="UNIXソケットで待ち受け、JackClient.pyからのコンパイル要求を"
+             "キャッシュを保ったまま処理し続ける",
+    )
+    parser.add_argument(
+        "--socket", type=Path, default=SOCKET_PATH, metavar="SOCKET",
+        help=f"--serveで待ち受けるソケット(省略時は {SOCKET_PATH})",
+    )
+    args = parser.parse_args(argv)
+    if args.serve:
+        serve(args.socket, main)
+        return 0
+    if args.path is None:
+        parser.error("pathを指定して下さい")
+    if args.link and args.no_output:
+        # --no-outputでは.vmを書き出さないので、リンクする.vmがないか古い
+        parser.error("--linkと--no-outputは同時に使えません")
+    path = args.path
+    peephole = [name for name in args.peephole_rules.split(",") if name] \
+        if args.peephole else []
+    unknown = [name for name in peephole if name not in RULES]
+    if unknown:
+        parser.error(f"未知の最適化規則です: {', '.join(unknown)}")
+    pipeline = CompilePipeline(
+        measure=args.timings, xml=args.xml,
+        xml_indent=args.xml_indent, output=not args.no_output,
+        optimize=args.optimize,
+        peephole=peephole, inline=args.inline_size if args.inline else 0,
+        branches=args.branches,
+        pool_strings=args.pool_strings,
+    )
     if path.is_dir():
-        for jack in list(path.glob("*.jack")):
-            with jack.open() as f:
-                c = CompilationEngine(f)
-                c.compileClass()
+        paths = sorted(path.glob("*.jack"))
+        manifest = BuildManifest(path, pipeline.options())
     elif path.is_file():
-        with open(path) as f:
-            c = CompilationEngine(f)
-            c.compileClass()
+        paths = [path]
+        manifest = BuildManifest(path.parent, pipeline.options())
     else:
         print("jackファイルかjackファイルの存在するフォルダを指定して下さい")
+        return 1
+    # OSとプロジェクトのすべてのクラスの見出しを索引にし、前回から変わったものだけ読み直す
+    if cache is not None:
+        index = cache.index(manifest.directory / INDEX_NAME)
+    else:
+        index = SignatureIndex(manifest.directory / INDEX_NAME)
+    sources = sorted(args.os_sources.glob("*.jack")) + paths
+    index.update(sources)
+    pipeline.signatures = index.signatures(sources)
+    if cache is not None:
+        pipeline.trees = cache.trees
+    if pipeline.inline:
+        pipeline.find_inlines(paths, index)
+    if pipeline.output:
+        # --no-outputでは.vmと同じく索引も書き出さない
+        index.save()
+    if args.force:
+        manifest.sources = {}
+    if pipeline.output:
+        statuses = manifest.build(pipeline, paths, args.jobs)
+    else:
+        statuses = pipeline.run_all(paths, args.jobs)
+    errors = [(jack, error) for jack, error in statuses if error]
+    if args.jobs > 1 or errors:
+        for jack, error in statuses:
+            print(f"{'NG' if error else 'OK'} {jack}" +
+                  (f": {error}" if error else ""))
+        print(f"{len(statuses)} files, {len(errors)} errors")
+    if pipeline.peephole:
+        print(pipeline.peephole_report())
+    if pipeline.inline:
+        print(pipeline.inline_report())
+    if args.timings:
+        print(pipeline.report(args.timings_format))
+    if errors:
+        return 1
+    if args.link:
+        directory = manifest.directory
+        output = args.link_output or \
+            directory / "linked" / f"{directory.resolve().name}.vm"
+        linker = Linker()
+        linker.add_directory(args.os)
+        for jack in paths:
+            linker.add(pipeline.outputs(jack)[0])
+        try:
+            stats = linker.write(output)
+        except ValueError as e:
+            # ファイル1つだけをリンクしたときの、他のクラスの未定義の関数など
+            print(f"リンクできませんでした: {e}")
+            return 1
+        print(f"{output}: {stats['linked_functions']}/{stats['functions']} "
+              f"functions, {stats['linked_commands']}/{stats['commands']} "
+              f"commands")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
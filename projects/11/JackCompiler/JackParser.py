@@ -0,0 +1,402 @@
+"""
+Jackの構文解析器の本体。CompilationEngineはこれを継承してdump/loadを加える
+"""
+from JackTokenizer import JackTokenizer
+import JackAST as ast
+
+KEYWORD_CONSTANTS = ("true", "false", "null", "this")
+UNARY_OPS = ("-", "~")
+# 二項演算子(優先順位はなく左から順に評価する)
+OPS = frozenset(("+", "-", "*", "/", "&", "|", "<", ">", "="))
+# 構文解析中の式(ExpressionFrame)の種類: 一番外側の式、括弧の中、配列の添字、呼び出しの引数
+TOP, PAREN, INDEX, ARGUMENT = range(4)
+CLASS_VAR_KINDS = ("static", "field")
+SUBROUTINE_KINDS = ("constructor", "function", "method")
+TYPES = ("int", "char", "boolean", "void")
+
+
+class ExpressionFrame():
+    """
+    構文解析中の式。termsとopsはExpressionになる項と演算子、
+    unary_opsは次の項に適用する単項演算子(後に読んだものほど内側)。
+    dataはINDEXなら配列の変数名、ARGUMENTなら(qualifier, name, 引数のリスト)
+    """
+    __slots__ = ("kind", "data", "terms", "ops", "unary_ops")
+
+    def __init__(self, kind: int, data=None):
+        self.kind = kind
+        self.data = data
+        self.terms: list = []
+        self.ops: list = []
+        self.unary_ops: list = []
+
+
+class JackParser():
+    """
+    JackTokenizerから入力を受け取り、構文解析してASTを構築する
+    """
+    def __init__(self, tokenizer: JackTokenizer):
+        """
+        トークン化済みの入力に対して新しいコンパイルエンジンを生成する。
+        次に呼ぶルーチンはcompileClass()でなければならない
+        """
+        self.tokenizer: JackTokenizer = tokenizer
+
+    def expect(self, text: str) -> None:
+        """
+        次のトークンがtextであることを確かめて読み進める
+        """
+        self.tokenizer.advance()
+        if self.tokenizer.token != text:
+            self.error(f"'{text}'が必要です")
+
+    def identifier(self) -> str:
+        """
+        次のトークン(識別子)を読み進めて返す
+        """
+        self.tokenizer.advance()
+        if self.tokenizer.tokenType() != "identifier":
+            self.error("識別子が必要です")
+        return self.tokenizer.token
+
+    def type_name(self) -> str:
+        """
+        次のトークン(型名かvoid)を読み進めて返す
+        """
+        self.tokenizer.advance()
+        if self.tokenizer.tokenType() != "identifier" and \
+                self.tokenizer.token not in TYPES:
+            self.error("型名が必要です")
+        return self.tokenizer.token
+
+    def error(self, message: str) -> None:
+        current = self.tokenizer.current
+        raise ValueError(
+            f"{message}: {self.tokenizer.filename} "
+            f"{current.line}:{current.col} {current.text!r}"
+        )
+
+    def compileClass(self) -> ast.Class:
+        """
+        クラスをコンパイルする
+        """
+        tokenizer: JackTokenizer = self.tokenizer
+        # 'class' className '{'
+        self.expect("class")
+        name = self.identifier()
+        self.expect("{")
+        # classVarDec*
+        var_decs = []
+        while tokenizer.look_ahead() in CLASS_VAR_KINDS:
+            var_decs.append(self.compileClassVarDec())
+        # subroutine*
+        subroutines = []
+        while tokenizer.look_ahead() in SUBROUTINE_KINDS:
+            subroutines.append(self.compileSubroutine())
+        # '}'
+        self.expect("}")
+        return ast.Class(name, var_decs, subroutines)
+
+    def compileClassVarDec(self) -> ast.ClassVarDec:
+        """
+        スタティック宣言またはフィールド宣言をコンパイルする
+        """
+        # ('static' | 'field') type varName (',' varName)* ';'
+        self.tokenizer.advance()
+        kind = self.tokenizer.token
+        type = self.type_name()
+        return ast.ClassVarDec(kind, type, self.compileVarList())
+
+    def compileVarList(self) -> list:
+        # varName (',' varName)* ';'
+        names = [self.identifier()]
+        while self.tokenizer.look_ahead() == ",":
+            self.expect(",")
+            names.append(self.identifier())
+        self.expect(";")
+        return names
+
+    def compileSubroutine(self) -> ast.SubroutineDec:
+        """
+        メソッド、ファンクション、コンストラクタをコンパイルする
+        """
+        # subroutineKind ("constructor", "function", "method")
+        self.tokenizer.advance()
+        kind = self.tokenizer.token
+        # returnType ("void", ...)
+        return_type = self.type_name()
+        # subroutineName ("main", ...)
+        name = self.identifier()
+        # '(' parameterList ')'
+        self.expect("(")
+        parameters = self.compileParameterList()
+        self.expect(")")
+        # subroutineBody
+        self.expect("{")
+        var_decs = []
+        while self.tokenizer.look_ahead() == "var":
+            var_decs.append(self.compileVarDec())
+        statements = self.compileStatements()
+        self.expect("}")
+        return ast.SubroutineDec(
+            kind, return_type, name, parameters, var_decs, statements,
+        )
+
+    def compileParameterList(self) -> list:
+        """
+        パラメータのリスト(空の可能性もある)をコンパイルする。
+        カッコ"()"は含まない
+        """
+        parameters = []
+        while self.tokenizer.look_ahead() != ")":
+            if parameters:
+                self.expect(",")
+            type = self.type_name()
+            parameters.append((type, self.identifier()))
+        return parameters
+
+    def compileVarDec(self) -> ast.VarDec:
+        """
+        var宣言をコンパイルする
+        """
+        # 'var' type varName (',' varName)* ';'
+        self.expect("var")
+        type = self.type_name()
+        return ast.VarDec(type, self.compileVarList())
+
+    def compileStatements(self) -> list:
+        """
+        一連の文をコンパイルする。
+        波カッコ"{}"は含まない
+        """
+        tokenizer = self.tokenizer
+        statements = []
+        while True:
+            keyword = tokenizer.look_ahead()
+            if keyword == "let":
+                statements.append(self.compileLet())
+            elif keyword == "if":
+                statements.append(self.compileIf())
+            elif keyword == "while":
+                statements.append(self.compileWhile())
+            elif keyword == "do":
+                statements.append(self.compileDo())
+            elif keyword == "return":
+                statements.append(self.compileReturn())
+            else:
+                return statements
+
+    def compileDo(self) -> ast.DoStatement:
+        """
+        do文をコンパイルする
+        """
+        # 'do' subroutineCall ';'
+        self.expect("do")
+        call = self.compileSubroutineCall()
+        self.expect(";")
+        return ast.DoStatement(call)
+
+    def compileSubroutineCall(self) -> ast.SubroutineCall:
+        # (qualifier '.')? subroutineName '(' expressionList ')'
+        qualifier, name = self.compileCallName()
+        self.expect("(")
+        args = self.compileExpressionList()
+        self.expect(")")
+        return ast.SubroutineCall(qualifier, name, args)
+
+    def compileCallName(self) -> (str or None, str):
+        # (qualifier '.')? subroutineName
+        qualifier = None
+        name = self.identifier()
+        if self.tokenizer.look_ahead() == ".":
+            self.expect(".")
+            qualifier = name
+            name = self.identifier()
+        return qualifier, name
+
+    def compileLet(self) -> ast.LetStatement:
+        """
+        let文をコンパイルする
+        """
+        # 'let' varName ('[' expression ']')? '=' expression ';'
+        self.expect("let")
+        name = self.identifier()
+        index = None
+        if self.tokenizer.look_ahead() == "[":
+            self.expect("[")
+            index = self.compileExpression()
+            self.expect("]")
+        self.expect("=")
+        value = self.compileExpression()
+        self.expect(";")
+        return ast.LetStatement(name, index, value)
+
+    def compileWhile(self) -> ast.WhileStatement:
+        """
+        while文をコンパイルする
+        """
+        # 'while' '(' expression ')' '{' statements '}'
+        self.expect("while")
+        self.expect("(")
+        condition = self.compileExpression()
+        self.expect(")")
+        self.expect("{")
+        statements = self.compileStatements()
+        self.expect("}")
+        return ast.WhileStatement(condition, statements)
+
+    def compileReturn(self) -> ast.ReturnStatement:
+        """
+        return文をコンパイルする
+        """
+        # 'return' expression? ';'
+        self.expect("return")
+        value = None
+        if self.tokenizer.look_ahead() != ";":
+            value = self.compileExpression()
+        self.expect(";")
+        return ast.ReturnStatement(value)
+
+    def compileIf(self) -> ast.IfStatement:
+        """
+        if文をコンパイルする。
+        else文を伴う可能性がある
+        """
+        # 'if' '(' expression ')' '{' statements '}'
+        self.expect("if")
+        self.expect("(")
+        condition = self.compileExpression()
+        self.expect(")")
+        self.expect("{")
+        then_statements = self.compileStatements()
+        self.expect("}")
+        # ('else' '{' statements '}')?
+        else_statements = None
+        if self.tokenizer.look_ahead() == "else":
+            self.expect("else")
+            self.expect("{")
+            else_statements = self.compileStatements()
+            self.expect("}")
+        return ast.IfStatement(condition, then_statements, else_statements)
+
+    def compileExpression(self) -> ast.Expression:
+        """
+        式をコンパイルする。
+        括弧・単項演算子・配列の添字・呼び出しの引数で入れ子になった式も再帰せずに、
+        構文解析中の式(ExpressionFrame)を積んだスタックで構文解析する。
+        入れ子がどれだけ深くても、Pythonのスタックは一定の深さしか使わない
+        """
+        # term (op term)*
+        tokenizer = self.tokenizer
+        frames = [ExpressionFrame(TOP)]
+        while True:
+            # 項の先頭のトークンで選ぶ。
+            # 入れ子の式を開いた項と単項演算子は、Noneを返して次の項を読ませる
+            tokenizer.advance()
+            kind = tokenizer.current.kind
+            text = tokenizer.token
+            if kind == "identifier":
+                term = self.compileIdentifierTerm(frames)
+            elif kind == "integerConstant":
+                term = self.compileIntegerConstant(frames)
+            elif kind == "stringConstant":
+                term = self.compileStringConstant(frames)
+            elif text in KEYWORD_CONSTANTS:
+                term = self.compileKeywordConstant(frames)
+            elif text in UNARY_OPS:
+                term = self.compileUnaryOp(frames)
+            elif text == "(":
+                term = self.compileParenExpression(frames)
+            else:
+                self.error("項(term)が必要です")
+            while term is not None:
+                # 項ができたので、演算子が続かない式を内側から閉じていく
+                frame = frames[-1]
+                unary_ops = frame.unary_ops
+                while unary_ops:
+                    term = ast.UnaryOp(unary_ops.pop(), term)
+                frame.terms.append(term)
+                if tokenizer.look_ahead() in OPS:
+                    tokenizer.advance()
+                    frame.ops.append(tokenizer.token)
+                    break
+                expression = ast.Expression(frame.terms, frame.ops)
+                if frame.kind == TOP:
+                    return expression
+                frames.pop()
+                term = self.close_frame(frame, expression, frames)
+
+    def close_frame(self, frame: "ExpressionFrame", expression: ast.Expression,
+                    frames: list) -> ast.Node or None:
+        """
+        入れ子の式expressionを閉じ、それを含む項を返す。
+        呼び出しの引数が続くときは、次の引数の式を積んでNoneを返す
+        """
+        if frame.kind == PAREN:
+            self.expect(")")
+            return ast.ParenExpression(expression)
+        if frame.kind == INDEX:
+            self.expect("]")
+            return ast.ArrayRef(frame.data, expression)
+        qualifier, name, args = frame.data
+        args.append(expression)
+        if self.tokenizer.look_ahead() != ")":
+            self.expect(",")
+            frames.append(ExpressionFrame(ARGUMENT, frame.data))
+            return None
+        self.expect(")")
+        return ast.SubroutineCall(qualifier, name, args)
+
+    # 以下の項のメソッドは、項の先頭のトークンを読み進めた状態で、
+    # 構文解析中の式のスタックを受け取って呼ばれる。
+    # できた項を返すか、入れ子の式を積んでNoneを返す
+
+    def compileIdentifierTerm(self, frames: list) -> ast.Node or None:
+        # varName | varName '[' expression ']' | subroutineCall
+        tokenizer = self.tokenizer
+        name = tokenizer.token
+        next_token = tokenizer.look_ahead()
+        if next_token == "[":
+            self.expect("[")
+            frames.append(ExpressionFrame(INDEX, name))
+            return None
+        if next_token in ("(", "."):
+            tokenizer.go_back()
+            qualifier, name = self.compileCallName()
+            self.expect("(")
+            if tokenizer.look_ahead() == ")":
+                self.expect(")")
+                return ast.SubroutineCall(qualifier, name, [])
+            frames.append(ExpressionFrame(ARGUMENT, (qualifier, name, [])))
+            return None
+        return ast.VarRef(name)
+
+    def compileIntegerConstant(self, frames: list) -> ast.IntegerConstant:
+        return ast.IntegerConstant(self.tokenizer.intVal())
+
+    def compileStringConstant(self, frames: list) -> ast.StringConstant:
+        return ast.StringConstant(self.tokenizer.stringVal())
+
+    def compileKeywordConstant(self, frames: list) -> ast.KeywordConstant:
+        return ast.KeywordConstant(self.tokenizer.token)
+
+    def compileUnaryOp(self, frames: list) -> None:
+        # unaryOp term: 演算子は次の項ができたときに適用する
+        frames[-1].unary_ops.append(self.tokenizer.token)
+        return None
+
+    def compileParenExpression(self, frames: list) -> None:
+        # '(' expression ')'
+        frames.append(ExpressionFrame(PAREN))
+        return None
+
+    def compileExpressionList(self) -> list:
+        """
+        コンマで分離された式のリスト(空の可能性もある)をコンパイルする
+        """
+        expressions = []
+        while self.tokenizer.look_ahead() != ")":
+            if expressions:
+                self.expect(",")
+            expressions.append(self.compileExpression())
+        return expressions
@@ -1,10 +1,52 @@
-import io
 import re
+import sys
+from itertools import accumulate
+from JackBinary import TOKENS_MAGIC, Reader, StringTable, Writer
 
 
 SYMBOLS = ["{", "}", "(", ")", "[", "]", ".", ",", ";", "+", "-", "*",
            "/", "&", "|", "<", ">", "=", "~"]
+KEYWORDS = frozenset([
+    "class", "constructor", "function", "method", "field", "static", "var",
+    "int", "char", "boolean", "void", "true", "false", "null", "this", "let",
+    "do", "if", "else", "while", "return",
+])
+# dump()でトークンの種類を書く番号
+KINDS = ("keyword", "symbol", "integerConstant", "stringConstant",
+         "identifier")
+XML_ESCAPES = {"<": "&lt;", ">": "&gt;", "&": "&amp;"}
 MAX_INT = 32767
+IDENTIFIER_RE = re.compile(r"[^\W\d]\w*")
+# 1回のマッチで1トークン(または読み飛ばす空白文字・コメントの塊)を切り出す。
+# 閉じていない/*は記号の/より先に試す
+TOKEN_RE = re.compile(r"""
+    (?P<skip>\s+|//[^\n]*|/\*.*?\*/)
+  | (?P<string>"[^"\n]*")
+  | (?P<unclosed>/\*)
+  | (?P<symbol>[{}()\[\].,;+\-*/&|<>=~])
+  | (?P<word>[^\s{}()\[\].,;+\-*/&|<>=~"]+)
+  | (?P<error>"|.)
+""", re.VERBOSE | re.DOTALL)
+
+
+class Token():
+    """
+        字句解析の時点で一度だけ分類されたトークン。
+        kindはtokenType()の値、valueはintegerConstantならint、
+        stringConstantなら"を除いた文字列、それ以外はtextと同じ
+    """
+    __slots__ = ("kind", "text", "value", "line", "col")
+
+    def __init__(self, kind: str, text: str, value: (int or str),
+                 line: int, col: int):
+        self.kind = kind
+        self.text = text
+        self.value = value
+        self.line = line
+        self.col = col
+
+    def __repr__(self) -> str:
+        return f"Token({self.kind}, {self.text!r}, {self.line}:{self.col})"
 
 
 class JackTokenizer():
@@ -13,67 +55,102 @@ class JackTokenizer():
         Jack文法に従いJack言語のトークンへ分割する。
     """
 
-    def __init__(self, file: io.TextIOWrapper):
+    def __init__(self, source: str, filename: str = "",
+                 tokens: tuple = None):
         """
-            入力ファイル/ストリームを開き、トークン化を行う準備をする
+            読み込み済みのソースをトークン化する。
+            filenameはエラーメッセージに使う。
+            tokensを与えたときは(load()から)、トークン化せずにそれを使う
         """
-        self.filename = re.sub(r".jack$", "", file.name)
-        self.file = file.read()
-        self.tokens = []
+        self.filename = re.sub(r".jack$", "", filename)
+        self.file = source
+        self.tokens: tuple = ()
+        self.pos: int = 0
+        self.current: Token = None
         self.token: str = None
-        self.tokenize()
+        if tokens is None:
+            self.tokenize()
+        else:
+            self.tokens = tokens
 
     def hasMoreTokens(self) -> bool:
         """
             入力にまだトークンは存在するか？
         """
-        return len(self.tokens) > 0
+        return self.pos < len(self.tokens)
 
     def advance(self) -> None:
         """
             入力から次のトークンを取得し、それを現在のトークン(現トークン)とする。
             このルーチンは、hasMoreTokens()がtrueの場合のみ呼び出すことができる。
+            (入力の終わりで呼ぶと、終わりの位置を示すValueErrorを投げる)
             また、最初は現トークンは設定されていない。
         """
-        self.token = self.tokens.pop(0)
+        try:
+            self.current = self.tokens[self.pos]
+        except IndexError:
+            self.current = self.end()
+            raise ValueError(
+                f"ファイルが途中で終わっています: {self.filename} "
+                f"{self.current.line}:{self.current.col}"
+            ) from None
+        self.pos += 1
+        self.token = self.current.text
 
     def go_back(self) -> None:
-        self.tokens.insert(0, self.token)
+        """
+        現トークンを入力に戻す(次のadvance()で再び現トークンになる)
+        """
+        self.pos -= 1
+
+    def peek(self, k: int = 0) -> Token:
+        """
+        現トークンからk+1個先のトークンを、読み進めずに返す。
+        入力の終わりより先ならend()を返す
+        """
+        try:
+            return self.tokens[self.pos + k]
+        except IndexError:
+            return self.end()
+
+    def look_ahead(self, k: int = 0) -> str:
+        """
+        先読みをする。入力の終わりより先なら空文字列を返す
+        """
+        try:
+            return self.tokens[self.pos + k].text
+        except IndexError:
+            return ""
+
+    def end(self) -> Token:
+        """
+        入力の終わりを表すトークン。位置は最後のトークンの直後にする
+        """
+        if not self.tokens:
+            return Token("eof", "", "", 1, 1)
+        last = self.tokens[-1]
+        return Token("eof", "", "", last.line, last.col + len(last.text))
+
+    def mark(self) -> int:
+        """
+        現在の読み取り位置を返す。reset()に渡すとこの位置まで戻る
+        """
+        return self.pos
 
-    def look_ahead(self) -> str:
+    def reset(self, mark: int) -> None:
         """
-        先読みをする
+        mark()で記録した読み取り位置へ戻る
         """
-        return self.tokens[0]
+        self.pos = mark
+        self.current = self.tokens[mark - 1] if mark > 0 else None
+        self.token = self.current.text if self.current else None
 
     def tokenType(self) -> "keyword" or "symbol" or "identifier" \
                            or "integerrConstant" or "stringConstant":
         """
             現トークンの種類を返す
         """
-        keywords = ["class", "constructor", "function", "method", "field",
-                    "static", "var", "int", "char", "boolean", "void", "true",
-                    "false", "null", "this", "let", "do", "if", "else",
-                    "while", "return"]
-        symbols = SYMBOLS
-        if self.token in keywords:
-            return "keyword"
-        elif self.token in symbols:
-            return "symbol"
-        elif self.token.isnumeric() and \
-                0 <= int(self.token) and int(self.token) <= MAX_INT:
-            return "integerConstant"
-        elif re.match(r"^\".*\"$", self.token) and \
-                "\n" not in self.token:
-            return "stringConstant"
-        elif not self.token[0].isnumeric() and \
-            all(list(map(
-                        lambda t: t.isalpha() or t.isnumeric() or t == "_",
-                        self.token
-                        ))):
-            return "identifier"
-        else:
-            print(f"トークンの種類が分かりませんでした: {self.token}")
+        return self.current.kind
 
     def keyWord(self) -> "class" or "method" or "function" or "constructor" \
                          or "int" or "boolean" or "char" or "void" or "var" \
@@ -94,14 +171,7 @@ class JackTokenizer():
         return self.do_escape(self.token)
 
     def do_escape(self, s: str) -> str:
-        if s == "<":
-            return "&lt;"
-        elif s == ">":
-            return "&gt;"
-        elif s == "&":
-            return "&amp;"
-        else:
-            return s
+        return XML_ESCAPES.get(s, s)
 
     def identifier(self) -> str:
         """
@@ -115,14 +185,14 @@ class JackTokenizer():
             現トークンの整数の値を返す。
             このルーチンは、tokenType()がintegerConstantの場合のみ呼び出すことができる。
         """
-        return int(self.token)
+        return self.current.value
 
     def stringVal(self) -> str:
         """
             現トークンの文字列を返す。
             このルーチンは、tokenType()がstringConstantの場合のみ呼び出すことができる。
         """
-        return re.sub("\"", "", self.token)
+        return self.current.value
 
     def conv2_xml_elm(
         self, category: str = "", is_defining: bool = False,
@@ -142,47 +212,97 @@ class JackTokenizer():
         elif token_type == "stringConstant":
             elm = self.stringVal()
         else:
-            print(f"トークンのタイプが不明: {self.token}")
+            print(f"トークンのタイプが不明: {self.current}")
         return f"<{token_type}> {elm} </{token_type}>"
 
     def tokenize(self) -> None:
+        """
+            TOKEN_REの1回のマッチで1トークンを切り出し、その場で種類を決めたTokenにする。
+            空白文字とコメントはまとめて読み飛ばし、各トークンの位置(行, 列)を記録する
+        """
         file = self.file
-        symbols = SYMBOLS
-        tmp_str = ""
-        i = 0
-        while i < len(file):
-            # 文字列判定
-            if file[i] == '"':
-                tmp_str = '"'
-                i += 1
-                while file[i] != '"':
-                    tmp_str += file[i]
-                    i += 1
-                tmp_str += '"'
-                self.tokens.append(tmp_str)
-                tmp_str = ""
-            # //コメント判定
-            elif file[i] == "/" and file[i+1] == "/":
-                while file[i] != "\n":
-                    i += 1
-            # /* */コメント判定
-            elif file[i] == "/" and file[i+1] == "*":
-                i += 2
-                while not (file[i] == "*" and file[i+1] == "/"):
-                    i += 1
-                i += 1
-            # シンボル判定
-            elif file[i] in symbols:
-                self.tokens.append(file[i])
-            # 空白文字判定
-            elif re.match(r"\s", file[i]):
-                pass
+        tokens = []
+        line = 1
+        line_start = 0
+        for m in TOKEN_RE.finditer(file):
+            kind = m.lastgroup
+            if kind == "skip":
+                start, end = m.span()
+                newlines = file.count("\n", start, end)
+                if newlines:
+                    line += newlines
+                    line_start = file.rfind("\n", start, end) + 1
+                continue
+            text = m.group()
+            col = m.start() - line_start + 1
+            if kind == "symbol":
+                token = Token("symbol", text, text, line, col)
+            elif kind == "string":
+                token = Token("stringConstant", text, text[1:-1], line, col)
+            elif kind == "word" and text in KEYWORDS:
+                token = Token("keyword", text, text, line, col)
+            elif kind == "word" and text.isascii() and text.isdigit() \
+                    and int(text) <= MAX_INT:
+                token = Token("integerConstant", text, int(text), line, col)
+            elif kind == "word" and IDENTIFIER_RE.fullmatch(text):
+                # 識別子はSymbolTableの辞書のキーになるので、同じ名前を同じオブジェクトにする
+                text = sys.intern(text)
+                token = Token("identifier", text, text, line, col)
+            elif kind == "unclosed":
+                raise ValueError(
+                    f"コメントが閉じられていません: {self.filename} "
+                    f"{line}:{col}"
+                )
+            else:
+                raise ValueError(
+                    f"トークンの種類が分かりませんでした: {self.filename} "
+                    f"{line}:{col} {text!r}"
+                )
+            tokens.append(token)
+        self.tokens = tuple(tokens)
+        self.pos = 0
+
+    def dump(self) -> bytes:
+        """
+            トークン列をバイト列にする。load()で読み戻せる。
+            同じテキストのトークンは同じ種類なので、種類は文字列表の文字列ごとに書き、
+            トークンごとには文字列の番号・前のトークンからの行の差・列だけを書く
+        """
+        table = StringTable()
+        numbers = [table.number(token.text) for token in self.tokens]
+        kinds = {token.text: token.kind for token in self.tokens}
+        lines = [token.line for token in self.tokens]
+        writer = Writer(TOKENS_MAGIC)
+        writer.strings(table)
+        writer.section(KINDS.index(kinds[text]) for text in table.strings)
+        writer.section(numbers)
+        writer.section(
+            line - previous for previous, line in zip([1] + lines, lines)
+        )
+        writer.section(token.col for token in self.tokens)
+        return writer.getvalue()
+
+    @classmethod
+    def load(cls, data: bytes, filename: str = "") -> "JackTokenizer":
+        """
+            dump()のバイト列から、トークン化を終えた状態のJackTokenizerを作る
+        """
+        reader = Reader(data, TOKENS_MAGIC)
+        entries = []
+        for text, kind in zip(reader.strings(), reader.section()):
+            kind = KINDS[kind]
+            if kind == "integerConstant":
+                value = int(text)
+            elif kind == "stringConstant":
+                value = text[1:-1]
             else:
-                while ((file[i] not in symbols) and
-                       (not re.match(r"\s", file[i]))):
-                    tmp_str += file[i]
-                    i += 1
-                self.tokens.append(tmp_str)
-                tmp_str = ""
-                i -= 1
-            i += 1
+                value = text
+            entries.append((kind, text, value))
+        numbers = reader.section()
+        lines = accumulate(reader.section(), initial=1)
+        next(lines)
+        tokens = tuple([
+            Token(*entries[number], line, col)
+            for number, line, col in zip(numbers, lines, reader.section())
+        ])
+        return cls("", filename, tokens)
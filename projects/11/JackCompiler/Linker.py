@@ -0,0 +1,150 @@
+"""
+コンパイルした.vmとOSの.vmを1つの.vmにまとめる(リンクする)。
+Sys.init(なければMain.main)から呼び出しをたどり、到達しない関数を取り除く
+"""
+from collections import Counter
+from pathlib import Path
+
+OS_DIR = Path(__file__).resolve().parents[3] / "tools" / "OS"
+ROOTS = ("Sys.init", "Main.main")
+# ループの中の呼び出しは、ループの外の呼び出しより何倍も実行されるとみなす
+LOOP_WEIGHT = 10
+
+
+def read_vm(path: Path) -> dict:
+    """
+    .vmファイルを読み、関数名 → 関数のコマンド(functionの行を含む)の辞書を返す
+    """
+    functions = {}
+    commands = None
+    for line in path.read_text().splitlines():
+        line = line.split("//")[0].strip()
+        if not line:
+            continue
+        if line.startswith("function "):
+            commands = functions[line.split()[1]] = []
+        elif commands is None:
+            raise ValueError(f"関数の外にコマンドがあります: {path} {line!r}")
+        commands.append(line)
+    return functions
+
+
+def call_weights(commands: list) -> Counter:
+    """
+    関数の中の呼び出し先ごとの重みを返す。
+    後ろから戻るgoto/if-gotoで囲まれた範囲(ループ)の中の呼び出しは、深さに応じて重くする
+    """
+    labels = {}
+    loops = []
+    for i, command in enumerate(commands):
+        op, *args = command.split()
+        if op == "label":
+            labels[args[0]] = i
+        elif op in ("goto", "if-goto") and args[0] in labels:
+            loops.append((labels[args[0]], i))
+    weights = Counter()
+    for i, command in enumerate(commands):
+        if command.startswith("call "):
+            depth = sum(start < i < end for start, end in loops)
+            weights[command.split()[1]] += LOOP_WEIGHT ** depth
+    return weights
+
+
+class Linker():
+    """
+    クラスごとの.vmファイルを集め、呼び出しグラフで到達する関数だけを1つの.vmに書き出す。
+    同じクラスの.vmを後から加えると、前のクラスを置き換える(OSを自作の.vmで差し替えるため)。
+    関数は根から深さ優先でたどった順に並べ、呼び出し元の直後に最もよく呼ぶ関数を置く。
+    staticはファイルごとの領域なので、1つのファイルにまとめるときにクラスごとに番号をずらす
+    """
+
+    def __init__(self):
+        self.classes: dict = {}
+
+    def add(self, path: Path) -> None:
+        self.classes[path.stem] = read_vm(path)
+
+    def add_directory(self, directory: Path) -> None:
+        for path in sorted(directory.glob("*.vm")):
+            self.add(path)
+
+    def functions(self) -> dict:
+        return {
+            name: commands
+            for functions in self.classes.values()
+            for name, commands in functions.items()
+        }
+
+    def static_bases(self, order: list) -> (dict, dict):
+        """
+        関数名 → クラス名と、クラス名 → リンク後のstaticの先頭番号を返す
+        """
+        owners = {
+            name: class_name
+            for class_name, functions in self.classes.items()
+            for name in functions
+        }
+        bases = {}
+        base = 0
+        for name in order:
+            class_name = owners[name]
+            if class_name in bases:
+                continue
+            bases[class_name] = base
+            base += 1 + max((
+                int(command.split()[2])
+                for commands in self.classes[class_name].values()
+                for command in commands
+                if command.split()[1:2] == ["static"]
+            ), default=-1)
+        return owners, bases
+
+    def link(self) -> list:
+        """
+        到達する関数名を、書き出す順に返す
+        """
+        functions = self.functions()
+        roots = [root for root in ROOTS if root in functions]
+        if not roots:
+            raise ValueError(f"{' / '.join(ROOTS)}がありません")
+        order = []
+        seen = set()
+        stack = [(roots[0], None)]
+        while stack:
+            name, caller = stack.pop()
+            if name in seen:
+                continue
+            if name not in functions:
+                raise ValueError(f"未定義の関数です: {name} ({caller}から呼び出し)")
+            seen.add(name)
+            order.append(name)
+            weights = call_weights(functions[name])
+            # 重い呼び出し先ほど後に積み、先に取り出す
+            # (重みが同じなら、先に呼び出している関数を先に取り出す)
+            callees = sorted(reversed(weights), key=weights.get)
+            stack.extend((callee, name) for callee in callees
+                         if callee not in seen)
+        return order
+
+    def write(self, output: Path) -> dict:
+        """
+        リンクした.vmをoutputへ書き出し、リンク前後の関数数とコマンド数を返す
+        """
+        functions = self.functions()
+        order = self.link()
+        owners, bases = self.static_bases(order)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with output.open("w") as f:
+            for name in order:
+                base = bases[owners[name]]
+                for command in functions[name]:
+                    op, *args = command.split()
+                    if args[:1] == ["static"]:
+                        command = f"{op} static {base + int(args[1])}"
+                    f.write(command + "\n")
+        return {
+            "functions": len(functions),
+            "linked_functions": len(order),
+            "commands": sum(map(len, functions.values())),
+            "linked_commands": sum(len(functions[name]) for name in order),
+        }
@@ -0,0 +1,173 @@
+"""
+VMBackendが生成するVMコマンド列を、書き出す前に小さな窓(peephole)で見て冗長な並びを置き換える。
+コマンドは ("push", segment, index) のようなタプルで扱う
+"""
+from collections import Counter
+from VMWriter import VMWriter
+
+# 書き出しに使うVMWriterのメソッド
+WRITERS = {
+    "push": "writePush", "pop": "writePop", "label": "writeLabel",
+    "goto": "writeGoto", "if-goto": "writeIf", "call": "writeCall",
+    "function": "writeFunction", "return": "writeReturn",
+}
+JUMPS = ("goto", "return")
+COMPARISONS = ("lt", "gt", "eq")
+CANCELLING = ("not", "neg")
+NEUTRAL_WITH_ZERO = ("add", "sub", "or")
+
+
+def double_negation(window: list) -> list or None:
+    # not / not, neg / neg
+    if window[0] == window[1] and window[0][0] in CANCELLING:
+        return []
+    return None
+
+
+def zero_operand(window: list) -> list or None:
+    # push constant 0 / add (sub, or)
+    if window[0] == ("push", "constant", 0) and \
+            window[1][0] in NEUTRAL_WITH_ZERO:
+        return []
+    return None
+
+
+def compare_not(window: list) -> list or None:
+    # push constant c / lt / not → push constant c-1 / gt (x >= c は x > c-1)
+    # push constant c / gt / not → push constant c+1 / lt (x <= c は x < c+1)
+    push, compare, negate = window
+    if push[:2] != ("push", "constant") or negate != ("not",):
+        return None
+    c = push[2]
+    if compare == ("lt",) and c > 0:
+        return [("push", "constant", c - 1), ("gt",)]
+    if compare == ("gt",) and c < 0x7FFF:
+        return [("push", "constant", c + 1), ("lt",)]
+    return None
+
+
+def constant_branch(window: list) -> list or None:
+    # push constant c / if-goto L は、cが0でなければ goto L、0なら何もしない
+    push, branch = window
+    if push[:2] != ("push", "constant") or branch[0] != "if-goto":
+        return None
+    return [("goto", branch[1])] if push[2] != 0 else []
+
+
+def true_branch(window: list) -> list or None:
+    # push constant 0 / not / if-goto L (trueで分岐する) → goto L
+    if window[:2] == [("push", "constant", 0), ("not",)] and \
+            window[2][0] == "if-goto":
+        return [("goto", window[2][1])]
+    return None
+
+
+def branch_invert(window: list) -> list or None:
+    # lt / not / if-goto T / goto F / label T → lt / if-goto F / label T
+    # (notはビット反転なので、値が比較の結果(-1か0)のときだけ分岐先を入れ替えられる)
+    compare, negate, branch, jump, label = window
+    if compare[0] in COMPARISONS and negate == ("not",) and \
+            branch[0] == "if-goto" and jump[0] == "goto" and \
+            label == ("label", branch[1]):
+        return [compare, ("if-goto", jump[1]), label]
+    return None
+
+
+def unreachable(window: list) -> list or None:
+    # goto / return の直後から次のlabelまでは実行されない
+    jump, command = window
+    if jump[0] in JUMPS and command[0] not in ("label", "function"):
+        return [jump]
+    return None
+
+
+# 規則名 → (窓の長さ, 規則)。窓の中のlabelは最後のコマンドにしか現れない。
+# どの規則もprojects/09・11・12のプログラムのどれかに当てはまる(bench_peephole.py)
+RULES = {
+    "double-negation": (2, double_negation),
+    "zero-operand": (2, zero_operand),
+    "compare-not": (3, compare_not),
+    "constant-branch": (2, constant_branch),
+    "true-branch": (3, true_branch),
+    "branch-invert": (5, branch_invert),
+    "unreachable": (2, unreachable),
+}
+
+
+class PeepholeOptimizer():
+    """
+    VMWriterと同じメソッドでコマンドを受け取り、サブルーチンごとに溜めながら規則を適用して、
+    サブルーチンの終わり(次のfunctionかflush())でvm_writerへ書き出す。
+    hitsには規則ごとの適用回数を数える
+    """
+
+    def __init__(self, vm_writer: VMWriter, rules: list = tuple(RULES)):
+        unknown = [name for name in rules if name not in RULES]
+        if unknown:
+            raise ValueError(f"未知の最適化規則です: {', '.join(unknown)}")
+        self.vm_writer = vm_writer
+        self.rules = [(name, *RULES[name]) for name in RULES if name in rules]
+        self.commands: list = []
+        self.hits: Counter = Counter()
+
+    def writePush(self, segment: str, index: int) -> None:
+        self.append(("push", segment, index))
+
+    def writePop(self, segment: str, index: int) -> None:
+        self.append(("pop", segment, index))
+
+    def writeArithmetic(self, command: str) -> None:
+        self.append((command,))
+
+    def writeLabel(self, label: str) -> None:
+        self.append(("label", label))
+
+    def writeGoto(self, label: str) -> None:
+        self.append(("goto", label))
+
+    def writeIf(self, label: str) -> None:
+        self.append(("if-goto", label))
+
+    def writeCall(self, name: str, nArgs: int) -> None:
+        self.append(("call", name, nArgs))
+
+    def writeFunction(self, name: str, nLocals: int) -> None:
+        self.flush()
+        self.append(("function", name, nLocals))
+
+    def writeReturn(self) -> None:
+        self.append(("return",))
+
+    def append(self, command: tuple) -> None:
+        """
+        commandを追加し、末尾に当てはまる規則がなくなるまで置き換えを繰り返す
+        """
+        commands = self.commands
+        commands.append(command)
+        matched = True
+        while matched:
+            matched = False
+            for name, length, rule in self.rules:
+                if len(commands) < length:
+                    continue
+                window = commands[-length:]
+                if any(c[0] == "label" for c in window[:-1]):
+                    continue
+                replacement = rule(window)
+                if replacement is not None:
+                    commands[-length:] = replacement
+                    self.hits[name] += 1
+                    matched = True
+                    break
+
+    def flush(self) -> None:
+        """
+        溜めているコマンドをvm_writerへ書き出す
+        """
+        vm_writer = self.vm_writer
+        for op, *args in self.commands:
+            if op in WRITERS:
+                getattr(vm_writer, WRITERS[op])(*args)
+            else:
+                vm_writer.writeArithmetic(op)
+        self.commands = []
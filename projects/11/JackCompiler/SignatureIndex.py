@@ -0,0 +1,142 @@
+"""
+プロジェクトのすべてのクラス(projects/12のOSのクラスを含む)のサブルーチンの見出しを集めた索引。
+本体は読み飛ばし、クラス名とサブルーチンの種類・戻り値の型・引数の数だけを記録する。
+--inlineのときは、展開できるサブルーチンの候補(Inliner.inline_candidates())も記録する
+"""
+import base64
+import json
+from pathlib import Path
+from JackBinary import TREE_MAGIC, dump_tree, load_tree
+from JackTokenizer import JackTokenizer
+import JackAST as ast
+
+INDEX_NAME = ".jacksignatures.json"
+OS_SOURCES = Path(__file__).resolve().parents[2] / "12"
+SUBROUTINE_KINDS = ("constructor", "function", "method")
+
+
+def scan_headers(source: str, filename: str = "") -> (str, dict):
+    """
+    クラス名と、サブルーチン名 → [種類, 戻り値の型, 引数の数] の辞書を返す。
+    サブルーチンの本体は波カッコの対応だけを見て読み飛ばす
+    """
+    texts = [token.text for token in JackTokenizer(source, filename).tokens]
+    if texts[:1] != ["class"] or len(texts) < 3:
+        raise ValueError(f"classが必要です: {filename}")
+    class_name = texts[1]
+    subroutines = {}
+    depth = 0
+    i = 2
+    while i < len(texts):
+        text = texts[i]
+        if depth == 1 and text in SUBROUTINE_KINDS:
+            # kind type name '(' parameterList ')'
+            kind, return_type, name = texts[i:i + 3]
+            end = texts.index(")", i + 3)
+            parameters = texts[i + 4:end]
+            n_params = parameters.count(",") + 1 if parameters else 0
+            subroutines[name] = [kind, return_type, n_params]
+            i = end + 1
+            continue
+        if text == "{":
+            depth += 1
+        elif text == "}":
+            depth -= 1
+        i += 1
+    return class_name, subroutines
+
+
+def tree_headers(tree: ast.Class) -> dict:
+    """
+    構文解析済みのクラスの見出しを、"Class.sub" → [種類, 戻り値の型, 引数の数] の辞書で返す
+    """
+    return {
+        f"{tree.name}.{sub.name}":
+            [sub.kind, sub.return_type, len(sub.parameters)]
+        for sub in tree.subroutines
+    }
+
+
+class SignatureIndex():
+    """
+    ソースごとの見出しを、更新時刻とサイズと一緒にファイル(.jacksignatures.json)へ保存する。
+    次の実行では変わったソースだけを読み直す。pathがNoneのときはメモリの上だけに持つ
+    """
+
+    def __init__(self, path: Path or None):
+        self.path = path
+        self.files: dict = {}
+        if path is not None and path.exists():
+            self.files = json.loads(path.read_text()).get("files", {})
+
+    def update(self, paths: list) -> int:
+        """
+        pathsのうち前回から変わったソースの見出しを読み直し、読み直した数を返す。
+        構文エラーで読めないソースは索引から外す(エラーはコンパイルのときに報告される)
+        """
+        scanned = 0
+        for path in paths:
+            key = str(path.resolve())
+            stat = path.stat()
+            entry = self.files.get(key)
+            if entry is not None and \
+                    entry["stat"] == [stat.st_mtime_ns, stat.st_size]:
+                continue
+            scanned += 1
+            try:
+                class_name, subroutines = scan_headers(
+                    path.read_text(), path.name,
+                )
+            except ValueError:
+                self.files.pop(key, None)
+                continue
+            self.files[key] = {
+                "stat": [stat.st_mtime_ns, stat.st_size],
+                "class": class_name,
+                "subroutines": subroutines,
+            }
+        for key in [key for key in self.files if not Path(key).exists()]:
+            del self.files[key]
+        return scanned
+
+    def signatures(self, paths: list) -> dict:
+        """
+        pathsのクラスのサブルーチンを "Class.sub" → [種類, 戻り値の型, 引数の数] の辞書で返す。
+        同じクラスが複数あるときは後のpathを優先する(OSのクラスを自作のクラスで置き換えるため)
+        """
+        classes = {}
+        for path in paths:
+            entry = self.files.get(str(path.resolve()))
+            if entry is not None:
+                classes[entry["class"]] = entry["subroutines"]
+        return {
+            f"{class_name}.{name}": signature
+            for class_name, subroutines in classes.items()
+            for name, signature in subroutines.items()
+        }
+
+    def inline_candidates(self, path: Path) -> ast.Class or None:
+        """
+        pathについて記録した展開の候補を返す
+        (記録がない・ソースが変わった・古い形式で記録したときはNone)
+        """
+        entry = self.files.get(str(path.resolve()))
+        if entry is None or "inlines" not in entry:
+            return None
+        data = base64.b64decode(entry["inlines"])
+        if not data.startswith(TREE_MAGIC):
+            return None
+        return load_tree(data)
+
+    def set_inline_candidates(self, path: Path, tree: ast.Class) -> None:
+        """
+        pathの展開の候補を記録する。update()でソースが変わったと分かると捨てられる
+        """
+        entry = self.files.get(str(path.resolve()))
+        if entry is not None:
+            entry["inlines"] = base64.b64encode(dump_tree(tree)).decode()
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        self.path.write_text(json.dumps({"files": self.files}, indent=1))
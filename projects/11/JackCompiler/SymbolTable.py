@@ -1,22 +1,42 @@
+import sys
+from typing import NamedTuple
+
+CLASS_KINDS = ("static", "field")
+SUBROUTINE_KINDS = ("argument", "var")
+
+
+class Symbol(NamedTuple):
+    """
+    シンボルテーブルに登録された識別子の属性、型、実行インデックス(変更できない)
+    """
+    kind: "static" or "field" or "argument" or "var"
+    type: str
+    index: int
 
 
 class SymbolTable():
+    """
+    クラスのスコープとサブルーチンのスコープを、それぞれ名前 → Symbolの平らな辞書で持つ。
+    名前はsys.internして登録し、resolve()はサブルーチン、クラスの順に1回ずつ引くだけで済む
+    """
+
     def __init__(self):
         """
         空のシンボルテーブルを生成する
         """
-        self.tbl_for_class = {}
-        self.tbl_for_class["static"] = {}
-        self.tbl_for_class["field"] = {}
+        self.class_scope: dict = {}
+        self.subroutine_scope: dict = {}
+        self.counts = dict.fromkeys(CLASS_KINDS + SUBROUTINE_KINDS, 0)
 
     def startSubroutine(self) -> None:
         """
         新しいサブルーチンのスコープを開始する
-        (つまり、サブルーチンのシンボルテーブルをリセットする)
+        (つまり、サブルーチンのシンボルテーブルをリセットする)。
+        辞書を作り直すだけなので、前のサブルーチンの変数の数によらず定数時間で終わる
         """
-        self.tbl_for_subr = {}
-        self.tbl_for_subr["argument"] = {}
-        self.tbl_for_subr["var"] = {}
+        self.subroutine_scope = {}
+        self.counts["argument"] = 0
+        self.counts["var"] = 0
 
     def define(self, name: str, type: str,
                kind: "static" or "field" or "argument" or "var") -> None:
@@ -25,16 +45,20 @@ class SymbolTable():
         割り当てる。staticとfield属性の識別子はクラスのスコープを持ち、argとvar属性の識別子は
         サブルーチンのスコープを持つ
         """
-        if kind in ("argument", "var"):
-            self.tbl_for_subr[kind][name] = {
-                "idx": len(self.tbl_for_subr[kind]),
-                "type": type,
-            }
-        elif kind in ("static", "field"):
-            self.tbl_for_class[kind][name] = {
-                "idx": len(self.tbl_for_class[kind]),
-                "type": type,
-            }
+        scope = self.class_scope if kind in CLASS_KINDS else \
+            self.subroutine_scope
+        scope[sys.intern(name)] = Symbol(kind, type, self.counts[kind])
+        self.counts[kind] += 1
+
+    def resolve(self, name: str) -> Symbol or None:
+        """
+        引数で与えられた名前の識別子を現在のスコープで探し、そのSymbolを返す。
+        見つからなければNoneを返す
+        """
+        symbol = self.subroutine_scope.get(name)
+        if symbol is None:
+            return self.class_scope.get(name)
+        return symbol
 
     def varCount(
         self, kind: "static" or "field" or "argument" or "var"
@@ -42,10 +66,7 @@ class SymbolTable():
         """
         引数で与えられた属性について、それが現在のスコープで定義されている数を返す
         """
-        if kind in ("argument", "var"):
-            return len(self.tbl_for_subr[kind])
-        elif kind in ("static", "field"):
-            return len(self.tbl_for_class[kind])
+        return self.counts[kind]
 
     def kindOf(
         self,
@@ -55,46 +76,23 @@ class SymbolTable():
         引数で与えられた名前の識別子を現在のスコープで探し、その属性を返す。
         その識別子が現在のスコープで見つからなければ、NONEを返す
         """
-        if hasattr(self, "tbl_for_subr"):
-            if name in self.tbl_for_subr["argument"]:
-                return "argument"
-            elif name in self.tbl_for_subr["var"]:
-                return "var"
-        if name in self.tbl_for_class["static"]:
-            return "static"
-        elif name in self.tbl_for_class["field"]:
-            return "field"
-        else:
-            return "NONE"
+        symbol = self.resolve(name)
+        return "NONE" if symbol is None else symbol.kind
 
     def typeOf(self, name: str) -> str:
         """
         引数で与えられた名前の識別子を現在のスコープで探し、その型を返す
         """
-        if hasattr(self, "tbl_for_subr"):
-            if name in self.tbl_for_subr["argument"]:
-                return self.tbl_for_subr["argument"][name]["type"]
-            elif name in self.tbl_for_subr["var"]:
-                return self.tbl_for_subr["var"][name]["type"]
-        if name in self.tbl_for_class["static"]:
-            return self.tbl_for_class["static"][name]["type"]
-        elif name in self.tbl_for_class["field"]:
-            return self.tbl_for_class["field"][name]["type"]
-        else:
+        symbol = self.resolve(name)
+        if symbol is None:
             raise ValueError(f"typeが見つかりません: {name}")
+        return symbol.type
 
     def indexOf(self, name: str) -> int:
         """
         引数で与えられた名前の識別子を現在のスコープで探し、そのインデックスを返す
         """
-        if hasattr(self, "tbl_for_subr"):
-            if name in self.tbl_for_subr["argument"]:
-                return self.tbl_for_subr["argument"][name]["idx"]
-            elif name in self.tbl_for_subr["var"]:
-                return self.tbl_for_subr["var"][name]["idx"]
-        if name in self.tbl_for_class["static"]:
-            return self.tbl_for_class["static"][name]["idx"]
-        elif name in self.tbl_for_class["field"]:
-            return self.tbl_for_class["field"][name]["idx"]
-        else:
+        symbol = self.resolve(name)
+        if symbol is None:
             raise ValueError(f"idxが見つかりません: {name}")
+        return symbol.index
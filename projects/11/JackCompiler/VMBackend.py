@@ -0,0 +1,599 @@
+from collections import Counter
+from Inliner import INLINE_TEMP, Inline
+from SymbolTable import Symbol, SymbolTable
+from VMWriter import VMWriter
+import JackAST as ast
+
+# 変数の属性 → VMのメモリセグメント
+SEGMENTS = {
+    "static": "static", "field": "this",
+    "argument": "argument", "var": "local",
+}
+# 二項演算子 → VMの算術コマンド(*と/はOSのMathを呼び出す)
+BINARY_OPS = {
+    "+": "add", "-": "sub", "&": "and", "|": "or",
+    "<": "lt", ">": "gt", "=": "eq",
+}
+OS_OPS = {"*": "Math.multiply", "/": "Math.divide"}
+UNARY_OPS = {"-": "neg", "~": "not"}
+COMPARISONS = ("<", ">", "=")
+LOGICAL_OPS = ("&", "|")
+# 2のべき乗と、この値以下の定数との乗算は、Math.multiplyを呼ばずに加算で計算する
+SMALL_FACTOR = 16
+
+
+def unwrap(node: ast.Node) -> ast.Node:
+    """
+    項が1つだけの式と括弧を外した中身を返す
+    """
+    while True:
+        if isinstance(node, ast.ParenExpression):
+            node = node.expression
+        elif isinstance(node, ast.Expression) and not node.ops:
+            node = node.terms[0]
+        else:
+            return node
+
+
+def pooled_strings(tree: ast.Class) -> set:
+    """
+    pool_stringsでまとめる文字列定数を返す。クラスの中に2回以上書かれているか、
+    whileの中にあって何度も評価されうるものだけをまとめる。
+    1回しか評価されない文字列は、まとめるとstaticを確かめる命令と
+    Class.$stringsの呼び出しの分だけ実行する命令が増え、ヒープも減らないので、
+    ふつうの文字列定数のままにする
+    """
+    counts = Counter()
+    # (値, whileの中か)。入れ子の深い式でも再帰しないようにスタックに積む
+    stack = [(tree, False)]
+    while stack:
+        value, in_loop = stack.pop()
+        if isinstance(value, ast.StringConstant):
+            counts[value.value] += 2 if in_loop else 1
+        elif isinstance(value, list):
+            stack.extend((item, in_loop) for item in value)
+        elif isinstance(value, ast.Node):
+            in_loop = in_loop or isinstance(value, ast.WhileStatement)
+            stack.extend(
+                (getattr(value, name), in_loop) for name in value.__slots__
+            )
+    return {value for value, count in counts.items() if count >= 2}
+
+
+def reducible(factor: int) -> bool:
+    """
+    factor(0〜0xFFFF)との乗算を加算に展開するか
+    """
+    return factor <= SMALL_FACTOR or factor & (factor - 1) == 0
+
+
+class VMBackend(ast.Visitor):
+    """
+    ASTからVMコードを生成し、VMWriterへ書き込む。
+    strength_reduction=Trueのときは、定数との乗算を倍加と加算に、
+    -1での除算を符号反転に置き換える。
+    inlinesに("Class.sub" → Inline)を与えると、そのサブルーチンの呼び出しを展開し、
+    展開した回数をinlinedに数える。
+    signaturesに("Class.sub" → [種類, 戻り値の型, 引数の数])を与えると、
+    呼び出しがメソッドかどうかを見出しで決め、引数の数などの誤りを検出する。
+    branches=Trueのときは、whileを条件が末尾のループにし、
+    条件を反転した分岐で不要なnotとgotoを省く(条件が真偽値とわかるときだけ)。
+    pool_strings=Trueのときは、クラスの中の同じ文字列定数を1つのStringにまとめて
+    宣言したstaticの後ろに置き、クラスのすべての文字列を作る関数 Class.$strings を加える。
+    文字列定数を最初に評価したときに1回だけこの関数を呼ぶ
+    (まとめた文字列を書き換えたりdispose()したりするプログラムでは使えない)。
+    まとめるのは何度も評価されうる文字列定数だけ(pooled_strings()を参照)
+    """
+
+    def __init__(self, vm_writer: VMWriter, strength_reduction: bool = False,
+                 inlines: dict = None, signatures: dict = None,
+                 branches: bool = False, pool_strings: bool = False):
+        self.vm_writer: VMWriter = vm_writer
+        self.strength_reduction = strength_reduction
+        self.branches = branches
+        self.pool_strings = pool_strings
+        # 文字列定数 → それを置くstaticのインデックス
+        self.strings: dict = {}
+        # このクラスでまとめる文字列定数
+        self.pooled: set = set()
+        self.inlines = inlines or {}
+        self.inlined: Counter = Counter()
+        self.signatures = signatures or {}
+        self.known_classes = {name.split(".")[0] for name in self.signatures}
+        # 展開中のサブルーチンの変数名 → (セグメント, インデックス)
+        self.inline_vars: dict = {}
+        self.symbol_table = SymbolTable()
+        # 公開インタフェース("Class.sub" → [種類, 引数の数])と、呼び出している他クラスのサブルーチン
+        self.subroutines: dict = {}
+        self.calls: set = set()
+
+    def visitClass(self, node: ast.Class) -> None:
+        self.class_name = node.name
+        for var_dec in node.var_decs:
+            self.visit(var_dec)
+        self.strings = {}
+        if self.pool_strings:
+            self.pooled = pooled_strings(node)
+        for subroutine in node.subroutines:
+            self.visit(subroutine)
+        if self.strings:
+            self.write_string_pool()
+
+    def visitClassVarDec(self, node: ast.ClassVarDec) -> None:
+        for name in node.names:
+            self.symbol_table.define(name=name, type=node.type, kind=node.kind)
+
+    def visitVarDec(self, node: ast.VarDec) -> None:
+        for name in node.names:
+            self.symbol_table.define(name=name, type=node.type, kind="var")
+
+    def visitSubroutineDec(self, node: ast.SubroutineDec) -> None:
+        self.symbol_table.startSubroutine()
+        self.if_count = 0
+        self.while_count = 0
+        self.string_count = 0
+        name = f"{self.class_name}.{node.name}"
+        self.subroutines[name] = [node.kind, len(node.parameters)]
+        if name in self.inlines:
+            self.subroutines[name].append(self.inlines[name].signature())
+        if node.kind == "method":
+            self.symbol_table.define(
+                name="this", type=self.class_name, kind="argument",
+            )
+        for type, arg_name in node.parameters:
+            self.symbol_table.define(name=arg_name, type=type, kind="argument")
+        for var_dec in node.var_decs:
+            self.visit(var_dec)
+        self.vm_writer.writeFunction(name, self.symbol_table.varCount("var"))
+        if node.kind == "constructor":
+            self.vm_writer.writePush(
+                "constant", self.symbol_table.varCount("field"),
+            )
+            self.vm_writer.writeCall("Memory.alloc", 1)
+            self.vm_writer.writePop("pointer", 0)
+        elif node.kind == "method":
+            self.vm_writer.writePush("argument", 0)
+            self.vm_writer.writePop("pointer", 0)
+        self.statements(node.statements)
+
+    def statements(self, statements: list) -> None:
+        for statement in statements:
+            self.visit(statement)
+
+    def visitLetStatement(self, node: ast.LetStatement) -> None:
+        if node.index is None:
+            self.visit(node.value)
+            self.write_pop_var(node.name)
+            return
+        self.visit(node.index)
+        self.write_push_var(node.name)
+        self.vm_writer.writeArithmetic("add")
+        self.visit(node.value)
+        # 右辺の評価中にpointer 1が書き換わる可能性があるため、ここで設定する
+        self.vm_writer.writePop("temp", 0)
+        self.vm_writer.writePop("pointer", 1)
+        self.vm_writer.writePush("temp", 0)
+        self.vm_writer.writePop("that", 0)
+
+    def visitIfStatement(self, node: ast.IfStatement) -> None:
+        if self.branches:
+            self.write_if(node)
+            return
+        label_true = f"IF_TRUE{self.if_count}"
+        label_false = f"IF_FALSE{self.if_count}"
+        label_end = f"IF_END{self.if_count}"
+        self.if_count += 1
+        self.visit(node.condition)
+        self.vm_writer.writeIf(label_true)
+        self.vm_writer.writeGoto(label_false)
+        self.vm_writer.writeLabel(label_true)
+        self.statements(node.then_statements)
+        if node.else_statements is not None:
+            self.vm_writer.writeGoto(label_end)
+            self.vm_writer.writeLabel(label_false)
+            self.statements(node.else_statements)
+            self.vm_writer.writeLabel(label_end)
+        else:
+            self.vm_writer.writeLabel(label_false)
+
+    def visitWhileStatement(self, node: ast.WhileStatement) -> None:
+        if self.branches and self.boolean(node.condition):
+            self.write_while(node)
+            return
+        label_exp = f"WHILE_EXP{self.while_count}"
+        label_end = f"WHILE_END{self.while_count}"
+        self.while_count += 1
+        self.vm_writer.writeLabel(label_exp)
+        self.visit(node.condition)
+        self.vm_writer.writeArithmetic("not")
+        self.vm_writer.writeIf(label_end)
+        self.statements(node.statements)
+        self.vm_writer.writeGoto(label_exp)
+        self.vm_writer.writeLabel(label_end)
+
+    def write_if(self, node: ast.IfStatement) -> None:
+        """
+        条件が偽ならIF_FALSEへ分岐し、真ならthen節へそのまま進む。
+        else節が空ならIF_ENDへのgotoとIF_ENDを書かず、
+        then節がreturnで終わるならIF_ENDへのgotoを書かない。
+        真偽値とわからない条件は、0以外を真とするためにIF_TRUEへ分岐する
+        """
+        label_true = f"IF_TRUE{self.if_count}"
+        label_false = f"IF_FALSE{self.if_count}"
+        label_end = f"IF_END{self.if_count}"
+        self.if_count += 1
+        then_statements = node.then_statements
+        else_statements = node.else_statements or []
+        if self.boolean(node.condition):
+            self.write_branch(node.condition, label_false, False)
+        elif else_statements:
+            # 条件が真ならthen節へ分岐し、偽ならelse節へそのまま進む
+            self.visit(node.condition)
+            self.vm_writer.writeIf(label_true)
+            self.statements(else_statements)
+            self.vm_writer.writeGoto(label_end)
+            self.vm_writer.writeLabel(label_true)
+            self.statements(then_statements)
+            self.vm_writer.writeLabel(label_end)
+            return
+        else:
+            self.visit(node.condition)
+            self.vm_writer.writeIf(label_true)
+            self.vm_writer.writeGoto(label_false)
+            self.vm_writer.writeLabel(label_true)
+        self.statements(then_statements)
+        if not else_statements:
+            self.vm_writer.writeLabel(label_false)
+            return
+        returns = then_statements and \
+            isinstance(then_statements[-1], ast.ReturnStatement)
+        if not returns:
+            self.vm_writer.writeGoto(label_end)
+        self.vm_writer.writeLabel(label_false)
+        self.statements(else_statements)
+        if not returns:
+            self.vm_writer.writeLabel(label_end)
+
+    def write_while(self, node: ast.WhileStatement) -> None:
+        """
+        条件を本体の後に置き、1回の繰り返しで条件が真のときのif-gotoだけを実行する。
+        最初の条件の評価へは1回だけgotoする
+        """
+        label_body = f"WHILE_BODY{self.while_count}"
+        label_exp = f"WHILE_EXP{self.while_count}"
+        self.while_count += 1
+        self.vm_writer.writeGoto(label_exp)
+        self.vm_writer.writeLabel(label_body)
+        self.statements(node.statements)
+        self.vm_writer.writeLabel(label_exp)
+        self.write_branch(node.condition, label_body, True)
+
+    def write_branch(self, condition: ast.Node, label: str,
+                     when: bool) -> None:
+        """
+        真偽値の条件conditionがwhenのときlabelへ分岐する。
+        ~で反転した条件は分岐の向きを入れ替え、偽で分岐するときは
+        x = y を x - y で、x < c を x > c-1 で、x > c を x < c+1 で判定してnotを省く
+        """
+        condition = unwrap(condition)
+        while isinstance(condition, ast.UnaryOp) and condition.op == "~":
+            condition = unwrap(condition.term)
+            when = not when
+        if not when and isinstance(condition, ast.Expression):
+            if self.write_negated_comparison(condition):
+                self.vm_writer.writeIf(label)
+                return
+        self.visit(condition)
+        if not when:
+            self.vm_writer.writeArithmetic("not")
+        self.vm_writer.writeIf(label)
+
+    def write_negated_comparison(self, node: ast.Expression) -> bool:
+        """
+        比較で終わる式の否定を、0で偽・0以外で真になる値として書けるなら書いてTrueを返す
+        """
+        op, term = node.ops[-1], node.terms[-1]
+        if op == "=":
+            command = "sub"
+        elif op == "<" and isinstance(term, ast.IntegerConstant) and \
+                0 < term.value <= 0x7FFF:
+            term, command = ast.IntegerConstant(term.value - 1), "gt"
+        elif op == ">" and isinstance(term, ast.IntegerConstant) and \
+                0 <= term.value < 0x7FFF:
+            term, command = ast.IntegerConstant(term.value + 1), "lt"
+        else:
+            return False
+        self.visit(ast.Expression(node.terms[:-1], node.ops[:-1]))
+        self.visit(term)
+        self.vm_writer.writeArithmetic(command)
+        return True
+
+    def boolean(self, node: ast.Node) -> bool:
+        """
+        nodeの値が必ず真(-1)か偽(0)になるか。比較・true/falseと、それらの~, &, |だけを
+        真偽値とみなす(Jackはboolean型の変数やbooleanを返す呼び出しに-1と0以外の値も
+        入れられるので、それらは0以外を真とする通常の分岐にする)。
+        入れ子が深くても再帰しないように、調べる項をスタックに積む
+        """
+        nodes = [node]
+        while nodes:
+            node = unwrap(nodes.pop())
+            if isinstance(node, ast.Expression):
+                terms, ops = node.terms, node.ops
+                for i in reversed(range(len(ops))):
+                    if ops[i] in COMPARISONS:
+                        break
+                    if ops[i] not in LOGICAL_OPS:
+                        return False
+                    nodes.append(terms[i + 1])
+                else:
+                    nodes.append(terms[0])
+            elif isinstance(node, ast.KeywordConstant):
+                if node.keyword not in ("true", "false"):
+                    return False
+            elif isinstance(node, ast.UnaryOp) and node.op == "~":
+                nodes.append(node.term)
+            else:
+                return False
+        return True
+
+    def visitDoStatement(self, node: ast.DoStatement) -> None:
+        self.visit(node.call)
+        self.vm_writer.writePop("temp", 0)
+
+    def visitReturnStatement(self, node: ast.ReturnStatement) -> None:
+        if node.value is not None:
+            self.visit(node.value)
+        else:
+            # voidのサブルーチンも何らかの値を返す
+            self.vm_writer.writePush("constant", 0)
+        self.vm_writer.writeReturn()
+
+    def visitExpression(self, node: ast.Expression) -> None:
+        terms = node.terms
+        if self.strength_reduction and node.ops and node.ops[0] == "*" and \
+                isinstance(terms[0], ast.IntegerConstant) and \
+                not isinstance(terms[1], ast.IntegerConstant):
+            # c * x を x * c として計算する(定数の評価には副作用がない)
+            terms = [terms[1], terms[0]] + terms[2:]
+        yield terms[0]
+        for op, term in zip(node.ops, terms[1:]):
+            if self.strength_reduction and self.write_by_constant(op, term):
+                continue
+            yield term
+            if op in OS_OPS:
+                self.vm_writer.writeCall(OS_OPS[op], 2)
+            else:
+                self.vm_writer.writeArithmetic(BINARY_OPS[op])
+
+    def write_by_constant(self, op: str, term: ast.Node) -> bool:
+        """
+        スタックの先頭の値と定数termとの乗除算を、OSを呼ばずに書ければ書いてTrueを返す
+        """
+        if not isinstance(term, ast.IntegerConstant):
+            return False
+        if op == "*":
+            return self.write_multiply(term.value)
+        if op == "/" and term.value in (1, -1):
+            if term.value == -1:
+                self.vm_writer.writeArithmetic("neg")
+            return True
+        return False
+
+    def write_multiply(self, value: int) -> bool:
+        """
+        スタックの先頭の値をvalue倍する。temp 1に元の値、temp 2に倍加中の値を置く。
+        展開すると長くなりすぎる定数のときは何も書かずにFalseを返す
+        """
+        factor, negate = value & 0xFFFF, False
+        if not reducible(factor):
+            factor, negate = -value & 0xFFFF, True
+            if not reducible(factor):
+                return False
+        if factor == 0:
+            # 左辺は副作用のために評価済みなので、値だけ捨てる
+            self.vm_writer.writePop("temp", 1)
+            self.vm_writer.writePush("constant", 0)
+        elif factor & (factor - 1) == 0:
+            for _ in range(factor.bit_length() - 1):
+                self.write_double(1)
+        else:
+            self.vm_writer.writePop("temp", 1)
+            self.vm_writer.writePush("temp", 1)
+            # 上位ビットから順に、倍加して、ビットが立っていれば元の値を足す
+            for bit in bin(factor)[3:]:
+                self.write_double(2)
+                if bit == "1":
+                    self.vm_writer.writePush("temp", 1)
+                    self.vm_writer.writeArithmetic("add")
+        if negate:
+            self.vm_writer.writeArithmetic("neg")
+        return True
+
+    def write_double(self, index: int) -> None:
+        """
+        スタックの先頭の値をtemp indexを使って2倍する(VMにはdupがない)
+        """
+        self.vm_writer.writePop("temp", index)
+        self.vm_writer.writePush("temp", index)
+        self.vm_writer.writePush("temp", index)
+        self.vm_writer.writeArithmetic("add")
+
+    def visitIntegerConstant(self, node: ast.IntegerConstant) -> None:
+        if node.value >= 0:
+            self.vm_writer.writePush("constant", node.value)
+        elif node.value == -0x8000:
+            # ConstantFolderが畳み込んだ-32768は ~32767 で作る
+            self.vm_writer.writePush("constant", 0x7FFF)
+            self.vm_writer.writeArithmetic("not")
+        else:
+            # ConstantFolderが畳み込んだ負の定数
+            self.vm_writer.writePush("constant", -node.value)
+            self.vm_writer.writeArithmetic("neg")
+
+    def visitStringConstant(self, node: ast.StringConstant) -> None:
+        if self.pool_strings and node.value in self.pooled:
+            self.write_pooled_string(node)
+            return
+        self.write_string(node)
+
+    def write_pooled_string(self, node: ast.StringConstant) -> None:
+        """
+        文字列を置くstaticが0(まだ作っていない)のときだけClass.$stringsを呼び、
+        staticの値を積む
+        """
+        index = self.strings.get(node.value)
+        if index is None:
+            index = self.symbol_table.varCount("static") + len(self.strings)
+            self.strings[node.value] = index
+        label = f"STRING{self.string_count}"
+        self.string_count += 1
+        self.vm_writer.writePush("static", index)
+        self.vm_writer.writeIf(label)
+        self.vm_writer.writeCall(f"{self.class_name}.$strings", 0)
+        self.vm_writer.writePop("temp", 0)
+        self.vm_writer.writeLabel(label)
+        self.vm_writer.writePush("static", index)
+
+    def write_string_pool(self) -> None:
+        """
+        クラスのすべての文字列定数を作ってstaticに置く関数 Class.$strings を書く
+        """
+        self.vm_writer.writeFunction(f"{self.class_name}.$strings", 0)
+        for value, index in self.strings.items():
+            self.write_string(ast.StringConstant(value))
+            self.vm_writer.writePop("static", index)
+        self.vm_writer.writePush("constant", 0)
+        self.vm_writer.writeReturn()
+
+    def write_string(self, node: ast.StringConstant) -> None:
+        self.vm_writer.writePush("constant", len(node.value))
+        self.vm_writer.writeCall("String.new", 1)
+        for c in node.value:
+            self.vm_writer.writePush("constant", ord(c))
+            self.vm_writer.writeCall("String.appendChar", 2)
+
+    def visitKeywordConstant(self, node: ast.KeywordConstant) -> None:
+        if node.keyword == "this":
+            self.vm_writer.writePush("pointer", 0)
+        else:
+            # true(-1), false(0), null(0)
+            self.vm_writer.writePush("constant", 0)
+            if node.keyword == "true":
+                self.vm_writer.writeArithmetic("not")
+
+    def visitVarRef(self, node: ast.VarRef) -> None:
+        self.write_push_var(node.name)
+
+    def visitArrayRef(self, node: ast.ArrayRef) -> None:
+        yield node.index
+        self.write_push_var(node.name)
+        self.vm_writer.writeArithmetic("add")
+        self.vm_writer.writePop("pointer", 1)
+        self.vm_writer.writePush("that", 0)
+
+    def visitSubroutineCall(self, node: ast.SubroutineCall) -> None:
+        n_args = len(node.args)
+        name, symbol = self.call_name(node)
+        is_method = self.check_call(name, node, symbol)
+        if node.qualifier is None and is_method:
+            # method(): 自身のメソッドを呼ぶ
+            self.vm_writer.writePush("pointer", 0)
+            n_args += 1
+        elif symbol is not None:
+            # var.method(): 変数の指すオブジェクトを第0引数にする
+            self.vm_writer.writePush(SEGMENTS[symbol.kind], symbol.index)
+            n_args += 1
+        for arg in node.args:
+            yield arg
+        if not name.startswith(f"{self.class_name}."):
+            self.calls.add(name)
+        inline = self.inlines.get(name)
+        if inline is not None and \
+                len(inline.parameters) + inline.method == n_args:
+            self.write_inline(inline)
+            self.inlined[name] += 1
+        else:
+            self.vm_writer.writeCall(name, n_args)
+
+    def call_name(self, node: ast.SubroutineCall) -> (str, Symbol or None):
+        """
+        呼び出すサブルーチンの"Class.sub"と、qualifierが変数ならそのシンボルを返す
+        """
+        if node.qualifier is None:
+            return f"{self.class_name}.{node.name}", None
+        symbol = self.symbol_table.resolve(node.qualifier)
+        name = f"{node.qualifier if symbol is None else symbol.type}." \
+               f"{node.name}"
+        return name, symbol
+
+    def check_call(self, name: str, node: ast.SubroutineCall,
+                   symbol: Symbol or None) -> bool:
+        """
+        呼び出しを索引の見出しと照らし合わせ、呼び出すのがメソッドかどうかを返す。
+        索引にないサブルーチンはメソッドとみなす(同じクラスの name() は自身のメソッドを呼ぶ)
+        """
+        signature = self.signatures.get(name)
+        if signature is None:
+            if name.split(".")[0] in self.known_classes:
+                raise ValueError(f"未定義のサブルーチンです: {name}")
+            return True
+        kind, _, n_params = signature
+        if n_params != len(node.args):
+            raise ValueError(
+                f"引数の数が違います: {name}は{n_params}個ですが"
+                f"{len(node.args)}個で呼び出しています"
+            )
+        if symbol is not None and kind != "method":
+            raise ValueError(f"メソッドでないものを変数から呼び出しています: {name}")
+        if node.qualifier is not None and symbol is None and kind == "method":
+            raise ValueError(f"メソッドをクラス名で呼び出しています: {name}")
+        return kind == "method"
+
+    def write_inline(self, inline: Inline) -> None:
+        """
+        スタックに積んだ引数(メソッドならその前にオブジェクト)を使って、呼び出しの代わりに本体を書く。
+        引数はtemp INLINE_TEMP以降に、オブジェクトはpointer 1に置き、フィールドはthatで読み書きする
+        """
+        for i in reversed(range(len(inline.parameters))):
+            self.vm_writer.writePop("temp", INLINE_TEMP + i)
+        if inline.method:
+            self.vm_writer.writePop("pointer", 1)
+        saved = self.inline_vars
+        self.inline_vars = {
+            name: ("that", index) for name, index in inline.fields.items()
+        }
+        for i, name in enumerate(inline.parameters):
+            self.inline_vars[name] = ("temp", INLINE_TEMP + i)
+        for name, value in inline.assignments:
+            self.visit(value)
+            self.write_pop_var(name)
+        if inline.value is None:
+            self.vm_writer.writePush("constant", 0)
+        else:
+            self.visit(inline.value)
+        self.inline_vars = saved
+
+    def visitParenExpression(self, node: ast.ParenExpression) -> None:
+        yield node.expression
+
+    def visitUnaryOp(self, node: ast.UnaryOp) -> None:
+        yield node.term
+        self.vm_writer.writeArithmetic(UNARY_OPS[node.op])
+
+    def variable(self, name: str) -> (str, int):
+        """
+        変数nameのセグメントとインデックスを返す
+        """
+        if name in self.inline_vars:
+            return self.inline_vars[name]
+        symbol = self.symbol_table.resolve(name)
+        if symbol is None:
+            raise ValueError(f"未定義の変数です: {name}")
+        return SEGMENTS[symbol.kind], symbol.index
+
+    def write_push_var(self, name: str) -> None:
+        self.vm_writer.writePush(*self.variable(name))
+
+    def write_pop_var(self, name: str) -> None:
+        self.vm_writer.writePop(*self.variable(name))
@@ -0,0 +1,917 @@
+"""
+画面を持たないVMエミュレータ。コンパイルした.vmとtools/OSの.vmを読み込み、Sys.initから実行する。
+読み込むときにすべてのコマンドを(命令番号, 引数, 引数)の整数の組に変換し、
+ラベルと関数の番地・staticの番地を解決しておくので、実行中は文字列を扱わない。
+OSの関数は、選んだものをVMIntrinsicsの組み込み関数で実行できる(--check で
+呼び出しのたびにVMのコードでも実行し、RAMと戻り値が一致するか確かめる)。
+--compile-after N で、N回呼ばれるかループを回った関数の基本ブロックを
+Pythonの関数にコンパイルして実行する
+
+    python VMEmulator.py <.vmファイルか.vmのフォルダ> [--budget N] [--keys TEXT]
+                         [--peek ADDR[:N]] [--intrinsics all|NAME,...]
+                         [--check] [--compile-after N]
+"""
+import argparse
+import sys
+import time
+from collections import deque
+from itertools import islice
+from pathlib import Path
+from Linker import OS_DIR, Linker
+from VMIntrinsics import INTRINSICS, Intrinsics
+
+SP, LCL, ARG, THIS, THAT = range(5)
+TEMP = 5
+STATIC = 16
+STACK = 256
+HEAP = 2048
+KEYBOARD = 24576
+RAM_SIZE = 32768
+BUDGET = 100_000_000
+NEWLINE = 128
+# 実行中のIndexErrorの理由(これ以外のIndexErrorはRAMの範囲外の読み書き)
+NEGATIVE_ADDRESS = "THIS/THATが負の番地です"
+STACK_OVERFLOW = "スタックがRAMの終わりを超えました"
+
+# 命令番号。runの振り分けは、よく実行される命令から順に比べる(この順に番号を振る)
+(
+    PUSH_LOCAL, PUSH_CONSTANT, ADD, PUSH_ARGUMENT, POP_POINTER, PUSH_THAT,
+    IF_GOTO, POP_LOCAL, NOT, GOTO, LT, PUSH_ADDRESS, SUB, POP_ARGUMENT, AND,
+    GT, FUNCTION, CALL, RETURN, POP_ADDRESS, EQ, POP_THAT, OR, NEG, PUSH_THIS,
+    POP_THIS, PUSH_POINTER, CALL_KEYBOARD, NATIVE, BLOCK, ENTER, LOOP,
+    LOOP_IF, HALT,
+) = range(34)
+PUSH_SEGMENTS = {
+    "local": PUSH_LOCAL, "argument": PUSH_ARGUMENT,
+    "this": PUSH_THIS, "that": PUSH_THAT,
+}
+POP_SEGMENTS = {
+    "local": POP_LOCAL, "argument": POP_ARGUMENT,
+    "this": POP_THIS, "that": POP_THAT,
+}
+# push/popの命令番号 → 番地の基準のレジスタ(BlockWriterが使う)
+REGISTERS = {
+    PUSH_LOCAL: "lcl", PUSH_ARGUMENT: "arg", PUSH_THIS: "this",
+    PUSH_THAT: "that", POP_LOCAL: "lcl", POP_ARGUMENT: "arg",
+    POP_THIS: "this", POP_THAT: "that",
+}
+ARITHMETIC = {
+    "add": ADD, "sub": SUB, "neg": NEG, "eq": EQ, "gt": GT, "lt": LT,
+    "and": AND, "or": OR, "not": NOT,
+}
+
+
+class VMEmulator():
+    """
+    ファイル名 → (関数名 → コマンド)の辞書で与えたVMコードを実行する。
+    staticはファイルごとの領域で、ファイルの順にRAM[16]から割り当てる。
+    codeは命令の組のリストで、code[0]はSys.initからの戻り先のHALT。
+    実行中のSP/LCL/ARG/THIS/THATはローカル変数に置き、run()から戻るときにRAM[0..4]へ書く。
+    intrinsicsに挙げたOSの関数の呼び出しはNATIVEにし、組み込み関数で実行する
+    (組み込み関数がNoneを返したら、ふつうに呼び出す)。
+    checkのときは呼び出しのたびにVMのコードでも実行し、一致しなかった呼び出しをmismatchesに残して
+    VMのコードの結果で続ける。
+    compile_afterを与えると、関数の入口と後ろへのジャンプをENTER/LOOP/LOOP_IFにして数え、
+    compile_after回になった関数の基本ブロックをコンパイルし、先頭の命令をBLOCKに置き換える
+    (コンパイルしない関数とブロックは、このクラスの命令の振り分けで実行する)
+    """
+
+    def __init__(self, files: dict, intrinsics: tuple = (),
+                 check: bool = False, compile_after: int = None):
+        self.code: list = [(HALT, 0, 0)]
+        self.addresses: dict = {}
+        self.ram: list = [0] * RAM_SIZE
+        self.steps = 0
+        self.halted = False
+        self.key_presses: deque = deque()
+        self.natives: list = []
+        self.checks = 0
+        self.mismatches: list = []
+        # (関数名, 先頭の番地, 終わりの番地)と、コンパイルするまでに残っている入口・ループの回数
+        self.functions: list = []
+        # 関数名 → コマンド(エラーメッセージに使う)
+        self.sources: dict = {}
+        self.heat: list = []
+        self.blocks: list = []
+        static_bases = {}
+        base = STATIC
+        for file, functions in files.items():
+            static_bases[file] = base
+            base += 1 + max((
+                int(command.split()[2])
+                for commands in functions.values() for command in commands
+                if command.split()[1:2] == ["static"]
+            ), default=-1)
+        if base > STACK:
+            raise ValueError(f"staticが多すぎます: {base - STATIC}語")
+        for name in intrinsics:
+            if name not in INTRINSICS:
+                raise ValueError(f"組み込み関数がありません: {name}")
+            missing = [c for c in INTRINSICS[name][1] if c not in files]
+            if missing:
+                raise ValueError(f"{name}に必要なクラスがありません: "
+                                 f"{', '.join(missing)}")
+        builtins = Intrinsics(self.ram, static_bases)
+        calls = []
+        for file, functions in files.items():
+            for name, commands in functions.items():
+                start = len(self.code)
+                calls.extend(self.decode(name, commands, static_bases[file]))
+                self.sources[name] = commands
+                self.functions.append((name, start, len(self.code)))
+        # (関数名, 引数の数) → self.nativesの番号
+        natives = {}
+        for pc, name in calls:
+            op, _, n_args = self.code[pc]
+            if name not in self.addresses:
+                raise ValueError(f"未定義の関数です: {name}")
+            address = self.addresses[name]
+            if name in intrinsics:
+                if (name, n_args) not in natives:
+                    native = getattr(builtins, INTRINSICS[name][0])
+                    if check:
+                        native = self.checked(name, native, address, n_args)
+                    natives[name, n_args] = len(self.natives)
+                    self.natives.append((native, address))
+                self.code[pc] = (NATIVE, natives[name, n_args], n_args)
+            else:
+                self.code[pc] = (op, address, n_args)
+        # NATIVEをふつうの呼び出しに戻したコード(checkでVMのコードを実行するときに使う)
+        self.vm_code: list = [
+            (CALL, self.natives[a][1], b) if op == NATIVE else (op, a, b)
+            for op, a, b in self.code
+        ] if check else self.code
+        if compile_after is not None:
+            self.count_heat(compile_after)
+        # BLOCKに置き換える前のコード(budgetに収まらないブロックはこれで実行する)
+        self.plain: list = list(self.code)
+        if "Sys.init" not in self.addresses:
+            raise ValueError("Sys.initがありません")
+        self.reset()
+
+    @classmethod
+    def load(cls, path: Path, os_dir: Path = OS_DIR, intrinsics: tuple = (),
+             check: bool = False,
+             compile_after: int = None) -> "VMEmulator":
+        """
+        os_dirの.vmとpath(.vmファイルか.vmのフォルダ)を読み込む。
+        pathにOSと同じ名前のクラスがあれば、OSのクラスを置き換える。
+        intrinsicsのうち、tools/OSのままのクラスだけで動く組み込み関数を使う
+        """
+        linker = Linker()
+        linker.add_directory(os_dir)
+        os_classes = set(linker.classes) if os_dir == OS_DIR else set()
+        if path.is_dir():
+            linker.add_directory(path)
+            os_classes -= {p.stem for p in path.glob("*.vm")}
+        else:
+            linker.add(path)
+            os_classes.discard(path.stem)
+        intrinsics = [
+            name for name in intrinsics
+            if name not in INTRINSICS or set(INTRINSICS[name][1]) <= os_classes
+        ]
+        return cls(linker.classes, intrinsics, check, compile_after)
+
+    def decode(self, name: str, commands: list, static_base: int) -> list:
+        """
+        関数nameのコマンドを命令の組にしてcodeへ加え、
+        呼び出し先の番地がまだ決まらないcallの(番地, 関数名)を返す
+        """
+        code = self.code
+        start = len(code)
+        labels = {}
+        jumps = []
+        calls = []
+        for command in commands:
+            op, *args = command.split()
+            if op == "label":
+                labels[args[0]] = len(code)
+                continue
+            if op in ("push", "pop"):
+                code.append(self.decode_access(
+                    name, op, args[0], int(args[1]), static_base,
+                ))
+            elif op in ARITHMETIC:
+                code.append((ARITHMETIC[op], 0, 0))
+            elif op in ("goto", "if-goto"):
+                jumps.append((len(code), args[0]))
+                code.append((GOTO if op == "goto" else IF_GOTO, 0, 0))
+            elif op == "call":
+                if args[0] == "Sys.halt":
+                    code.append((HALT, 0, 0))
+                    continue
+                calls.append((len(code), args[0]))
+                if args[0] == "Keyboard.keyPressed":
+                    code.append((CALL_KEYBOARD, 0, int(args[1])))
+                else:
+                    code.append((CALL, 0, int(args[1])))
+            elif op == "function":
+                self.addresses[args[0]] = len(code)
+                code.append((FUNCTION, int(args[1]), (0,) * int(args[1])))
+            elif op == "return":
+                code.append((RETURN, 0, 0))
+            else:
+                raise ValueError(f"未知のコマンドです: {name}: {command!r}")
+        for pc, label in jumps:
+            if label not in labels:
+                raise ValueError(f"未定義のラベルです: {name}: {label}")
+            code[pc] = (code[pc][0], labels[label], 0)
+        if start == len(code):
+            raise ValueError(f"空の関数です: {name}")
+        return calls
+
+    def count_heat(self, compile_after: int) -> None:
+        """
+        関数の入口をENTER、後ろへのgoto/if-gotoをLOOP/LOOP_IFにし、
+        どれもcompile_after回実行したら関数をコンパイルするようにする
+        """
+        if compile_after < 1:
+            raise ValueError(f"コンパイルするまでの回数は1以上です: {compile_after}")
+        code = self.code
+        self.heat = [compile_after] * len(self.functions)
+        for index, (_, start, end) in enumerate(self.functions):
+            code[start] = (ENTER, code[start][1], index)
+            for pc in range(start + 1, end):
+                op, a, _ = code[pc]
+                if op in (GOTO, IF_GOTO) and a <= pc:
+                    code[pc] = (LOOP if op == GOTO else LOOP_IF, a, index)
+
+    def compile_function(self, index: int) -> None:
+        """
+        functions[index]の関数を基本ブロックに分け、ブロックごとにPythonの関数を作って
+        blocksに加え、ブロックの先頭の命令を(BLOCK, blocksの番号, 命令数)にする。
+        ブロックはジャンプ先・ジャンプと呼び出しの次の命令から始まり、
+        ジャンプ・call・returnで終わる(Keyboard.keyPressedの呼び出しとSys.haltは含めない)
+        """
+        name, start, end = self.functions[index]
+        plain = self.plain
+        leaders = {start}
+        for pc in range(start, end):
+            op, a, _ = plain[pc]
+            if op in (GOTO, IF_GOTO, LOOP, LOOP_IF):
+                leaders.update((a, pc + 1))
+            elif op in (CALL, NATIVE, CALL_KEYBOARD, RETURN, HALT):
+                leaders.add(pc + 1)
+        leaders = sorted(pc for pc in leaders if start <= pc < end)
+        sources = []
+        compiled = []
+        for leader, limit in zip(leaders, leaders[1:] + [end]):
+            writer = BlockWriter(leader, self.natives)
+            length = writer.write(plain, limit)
+            if length:
+                sources.append(writer.source())
+                compiled.append((leader, length))
+        namespace = {"ram": self.ram}
+        namespace.update((f"native_{i}", native)
+                         for i, (native, _) in enumerate(self.natives))
+        exec(compile("\n".join(sources), f"<{name}>", "exec"), namespace)
+        for leader, length in compiled:
+            self.code[leader] = (BLOCK, len(self.blocks), length)
+            self.blocks.append(namespace[f"block_{leader}"])
+
+    def decode_access(self, name: str, op: str, segment: str, index: int,
+                      static_base: int) -> tuple:
+        if op == "push" and segment == "constant":
+            if not 0 <= index <= 0x7FFF:
+                raise ValueError(f"定数が範囲外です: {name}: {index}")
+            return (PUSH_CONSTANT, index, 0)
+        segments = PUSH_SEGMENTS if op == "push" else POP_SEGMENTS
+        if segment in segments:
+            return (segments[segment], index, 0)
+        if segment == "pointer" and index in (0, 1):
+            return (PUSH_POINTER if op == "push" else POP_POINTER, index, 0)
+        if segment == "temp" and 0 <= index < 8:
+            address = TEMP + index
+        elif segment == "static" and index >= 0:
+            address = static_base + index
+        else:
+            raise ValueError(f"不正なセグメントです: {name}: {op} {segment} "
+                             f"{index}")
+        return (PUSH_ADDRESS if op == "push" else POP_ADDRESS, address, 0)
+
+    def reset(self) -> None:
+        """
+        RAMを消し、call Sys.init 0 を実行した直後の状態にする
+        """
+        ram = self.ram
+        ram[:] = [0] * RAM_SIZE
+        # 戻り先はcode[0]のHALT
+        ram[ARG] = STACK
+        ram[LCL] = ram[SP] = STACK + 5
+        self.pc = self.addresses["Sys.init"]
+        self.steps = 0
+        self.halted = False
+
+    def press(self, text: str) -> None:
+        """
+        Keyboard.keyPressedが呼ばれるたびに、textの文字を1つずつ押して離す
+        (改行はJackのnewLine(128)にする)
+        """
+        for c in text:
+            self.key_presses.extend(
+                (NEWLINE if c == "\n" else ord(c), 0)
+            )
+
+    def run(self, budget: int = BUDGET) -> int:
+        """
+        Sys.haltを呼ぶか、budget個の命令を実行するまで実行し、実行した命令数を返す。
+        途中で止まったときは、もう一度呼ぶと続きから実行する
+        """
+        if self.halted:
+            return 0
+        return self.execute(self.code, budget)
+
+    def execute(self, code: list, budget: int) -> int:
+        """
+        runの本体。codeをpcから実行する。
+        RAMの範囲外の読み書きと負の番地は、関数名とコマンドを示すValueErrorにする
+        """
+        ram = self.ram
+        key_presses = self.key_presses
+        natives = self.natives
+        blocks = self.blocks
+        heat = self.heat
+        sp, lcl, arg, this, that = ram[:5]
+        pc = self.pc
+        steps = iter(range(budget))
+        executed = budget
+        try:
+            for step in steps:
+                op, a, b = code[pc]
+                pc += 1
+                if op == PUSH_LOCAL:
+                    ram[sp] = ram[lcl + a]
+                    sp += 1
+                elif op == PUSH_CONSTANT:
+                    ram[sp] = a
+                    sp += 1
+                elif op == ADD:
+                    sp -= 1
+                    value = ram[sp - 1] + ram[sp]
+                    if value > 0x7FFF:
+                        value -= 0x10000
+                    elif value < -0x8000:
+                        value += 0x10000
+                    ram[sp - 1] = value
+                elif op == PUSH_ARGUMENT:
+                    ram[sp] = ram[arg + a]
+                    sp += 1
+                elif op == POP_POINTER:
+                    sp -= 1
+                    value = ram[sp]
+                    if value < 0:
+                        raise IndexError(NEGATIVE_ADDRESS)
+                    if a:
+                        that = value
+                    else:
+                        this = value
+                elif op == PUSH_THAT:
+                    ram[sp] = ram[that + a]
+                    sp += 1
+                elif op == IF_GOTO:
+                    sp -= 1
+                    if ram[sp]:
+                        pc = a
+                elif op == POP_LOCAL:
+                    sp -= 1
+                    ram[lcl + a] = ram[sp]
+                elif op == NOT:
+                    ram[sp - 1] = ~ram[sp - 1]
+                elif op == GOTO:
+                    pc = a
+                elif op == LT:
+                    sp -= 1
+                    ram[sp - 1] = -1 if ram[sp - 1] < ram[sp] else 0
+                elif op == PUSH_ADDRESS:
+                    ram[sp] = ram[a]
+                    sp += 1
+                elif op == SUB:
+                    sp -= 1
+                    value = ram[sp - 1] - ram[sp]
+                    if value > 0x7FFF:
+                        value -= 0x10000
+                    elif value < -0x8000:
+                        value += 0x10000
+                    ram[sp - 1] = value
+                elif op == POP_ARGUMENT:
+                    sp -= 1
+                    ram[arg + a] = ram[sp]
+                elif op == AND:
+                    sp -= 1
+                    ram[sp - 1] &= ram[sp]
+                elif op == GT:
+                    sp -= 1
+                    ram[sp - 1] = -1 if ram[sp - 1] > ram[sp] else 0
+                elif op == FUNCTION:
+                    if a:
+                        # スライスへの代入はRAMの終わりを超えるとリストを伸ばしてしまう
+                        if sp + a > RAM_SIZE:
+                            raise IndexError(STACK_OVERFLOW)
+                        ram[sp:sp + a] = b
+                        sp += a
+                elif op == CALL:
+                    if sp > RAM_SIZE - 5:
+                        raise IndexError(STACK_OVERFLOW)
+                    ram[sp:sp + 5] = (pc, lcl, arg, this, that)
+                    arg = sp - b
+                    sp += 5
+                    lcl = sp
+                    pc = a
+                elif op == RETURN:
+                    frame = lcl
+                    pc = ram[frame - 5]
+                    ram[arg] = ram[sp - 1]
+                    sp = arg + 1
+                    lcl, arg, this, that = ram[frame - 4:frame]
+                elif op == POP_ADDRESS:
+                    sp -= 1
+                    ram[a] = ram[sp]
+                elif op == EQ:
+                    sp -= 1
+                    ram[sp - 1] = -1 if ram[sp - 1] == ram[sp] else 0
+                elif op == POP_THAT:
+                    sp -= 1
+                    ram[that + a] = ram[sp]
+                elif op == OR:
+                    sp -= 1
+                    ram[sp - 1] |= ram[sp]
+                elif op == NEG:
+                    if ram[sp - 1] != -0x8000:
+                        ram[sp - 1] = -ram[sp - 1]
+                elif op == PUSH_THIS:
+                    ram[sp] = ram[this + a]
+                    sp += 1
+                elif op == POP_THIS:
+                    sp -= 1
+                    ram[this + a] = ram[sp]
+                elif op == PUSH_POINTER:
+                    ram[sp] = that if a else this
+                    sp += 1
+                elif op == CALL_KEYBOARD:
+                    if sp > RAM_SIZE - 5:
+                        raise IndexError(STACK_OVERFLOW)
+                    if key_presses:
+                        ram[KEYBOARD] = key_presses.popleft()
+                    ram[sp:sp + 5] = (pc, lcl, arg, this, that)
+                    arg = sp - b
+                    sp += 5
+                    lcl = sp
+                    pc = a
+                elif op == NATIVE:
+                    native, address = natives[a]
+                    value = native(sp - b)
+                    if value is None:
+                        if sp > RAM_SIZE - 5:
+                            raise IndexError(STACK_OVERFLOW)
+                        ram[sp:sp + 5] = (pc, lcl, arg, this, that)
+                        arg = sp - b
+                        sp += 5
+                        lcl = sp
+                        pc = address
+                    else:
+                        sp -= b
+                        ram[sp] = value
+                        sp += 1
+                elif op == BLOCK:
+                    # コンパイルしたブロックを、次の命令がBLOCKでなくなるまで続けて実行する
+                    left = budget - step
+                    done = 0
+                    while done + b <= left:
+                        pc, sp, lcl, arg, this, that = \
+                            blocks[a](sp, lcl, arg, this, that)
+                        done += b
+                        op, a, b = code[pc]
+                        if op != BLOCK:
+                            break
+                    if done == 0:
+                        # budgetに収まらないので、残りは置き換える前のコードで実行する
+                        ram[:5] = (sp, lcl, arg, this, that)
+                        self.pc = pc - 1
+                        self.steps += step
+                        return step + self.execute(self.plain, left)
+                    if done > 1:
+                        next(islice(steps, done - 2, None))
+                elif op == ENTER:
+                    if a:
+                        if sp + a > RAM_SIZE:
+                            raise IndexError(STACK_OVERFLOW)
+                        ram[sp:sp + a] = (0,) * a
+                        sp += a
+                    heat[b] -= 1
+                    if heat[b] == 0:
+                        self.compile_function(b)
+                elif op == LOOP:
+                    pc = a
+                    heat[b] -= 1
+                    if heat[b] == 0:
+                        self.compile_function(b)
+                elif op == LOOP_IF:
+                    sp -= 1
+                    if ram[sp]:
+                        pc = a
+                        heat[b] -= 1
+                        if heat[b] == 0:
+                            self.compile_function(b)
+                else:
+                    # HALT: Sys.haltの呼び出しか、Sys.initからの戻り
+                    self.halted = True
+                    executed = step
+                    break
+        except IndexError as e:
+            raise ValueError(self.fault(e, pc)) from None
+        ram[:5] = (sp, lcl, arg, this, that)
+        self.pc = pc
+        self.steps += executed
+        return executed
+
+    def fault(self, error: IndexError, pc: int) -> str:
+        """
+        実行中に起きたIndexErrorを、起きた関数とコマンドを示すメッセージにする。
+        pcは命令を取り出した後のpcで、コンパイルしたブロックの中で起きたときは
+        ブロックの先頭のコマンドを示す
+        """
+        address = pc - 1
+        traceback = error.__traceback__
+        while traceback is not None:
+            name = traceback.tb_frame.f_code.co_name
+            if name.startswith("block_"):
+                address = int(name[len("block_"):])
+            traceback = traceback.tb_next
+        reason = error.args[0] if error.args else ""
+        if reason not in (NEGATIVE_ADDRESS, STACK_OVERFLOW):
+            reason = "RAMの範囲外を読み書きしました"
+        return f"{reason}: {self.describe(address)}"
+
+    def describe(self, pc: int) -> str:
+        """
+        code[pc]の関数名と元のコマンドを返す
+        """
+        for name, start, end in self.functions:
+            if start <= pc < end:
+                commands = [
+                    command for command in self.sources[name]
+                    if not command.startswith("label ")
+                ]
+                return f"{name}: {commands[pc - start]}"
+        return "Sys.initからの戻り"
+
+    def checked(self, name: str, native, address: int, n_args: int):
+        """
+        組み込み関数nativeを、呼び出すたびにaddressの関数(VMのコード)と比べる関数にする。
+        temp・スタックの引数より上を除くRAMと戻り値を比べ、VMのコードの結果を返す
+        """
+        def check(args: int) -> int:
+            ram = self.ram
+            before = ram[:]
+            value = native(args)
+            self.checks += 1
+            if value is None:
+                if ram != before:
+                    self.mismatches.append(
+                        f"{name}: VMのコードに任せる前にRAMを書き換えました"
+                    )
+                    ram[:] = before
+                return None
+            after = ram[:]
+            ram[:] = before
+            expected = self.call_vm(address, args, n_args)
+            call = f"{name}({', '.join(map(str, before[args:args + n_args]))})"
+            if expected is None:
+                # VMのコードはSys.haltで止まる。止めずに組み込み関数の結果で続ける
+                self.mismatches.append(f"{call}: VMのコードは止まります")
+                ram[:] = after
+                return value
+            if value != expected:
+                self.mismatches.append(
+                    f"{call}: 戻り値が{expected}ではなく{value}です"
+                )
+            for start, end in ((TEMP + 8, args), (HEAP, RAM_SIZE)):
+                if after[start:end] != ram[start:end]:
+                    i = next(
+                        i for i in range(start, end) if after[i] != ram[i]
+                    )
+                    self.mismatches.append(
+                        f"{call}: RAM[{i}]が{ram[i]}ではなく{after[i]}です"
+                    )
+                    break
+            return expected
+        return check
+
+    def call_vm(self, address: int, args: int, n_args: int) -> int:
+        """
+        RAM[args]からn_args個の引数でaddressの関数をVMのコードだけで実行し、戻り値を返す。
+        Sys.haltで止まったとき(とBUDGET個の命令で戻らないとき)はNone
+        """
+        ram = self.ram
+        saved = ram[:5], self.pc, self.steps
+        sp = args + n_args
+        # 戻り先はcode[0]のHALTで、戻ったらpcは1になる
+        ram[sp:sp + 5] = (0, 0, 0, 0, 0)
+        ram[:5] = (sp + 5, sp + 5, args, 0, 0)
+        self.pc = address
+        self.execute(self.vm_code, BUDGET)
+        returned = self.halted and self.pc == 1
+        ram[:5], self.pc, self.steps = saved
+        self.halted = False
+        return ram[args] if returned else None
+
+    def peek(self, address: int, count: int = 1) -> list:
+        return self.ram[address:address + count]
+
+
+class BlockWriter():
+    """
+    code[start]から始まる基本ブロックを、Pythonの関数
+        block_<start>(sp, lcl, arg, this, that)
+            -> (pc, sp, lcl, arg, this, that)
+    のソースにする。積んだ値はRAMに書かずに(式, 真偽値の式か, RAMかレジスタを読むか)の組で
+    pendingに持ち、ブロックの終わりでまだ積まれている値だけをRAMへ書く。
+    RAMかレジスタを読む式は、RAMかTHIS/THATへ書く前に変数へ移す。
+    作業用のスタック(SPより上)をthis/thatやstaticの番地で読み書きしないことを前提にする
+    (Jackのコンパイラが出すコードはそうなっている)
+    """
+
+    def __init__(self, start: int, natives: list):
+        self.start = start
+        self.natives = natives
+        self.lines: list = []
+        self.pending: list = []
+        # ブロックの始めのspから、今のスタックの先頭までの差
+        self.offset = 0
+        self.temps = 0
+
+    def source(self) -> str:
+        body = "".join(f"\n    {line}" for line in self.lines)
+        return (f"def block_{self.start}(sp, lcl, arg, this, that, ram=ram):"
+                f"{body}")
+
+    def emit(self, line: str) -> None:
+        self.lines.append(line)
+
+    def slot(self, offset: int = 0) -> str:
+        offset += self.offset
+        if offset == 0:
+            return "sp"
+        return f"sp + {offset}" if offset > 0 else f"sp - {-offset}"
+
+    def state(self, pc, sp: str = None) -> str:
+        return f"return {pc}, {sp or self.slot()}, lcl, arg, this, that"
+
+    def push(self, text: str, cond: bool = False,
+             volatile: bool = False) -> None:
+        self.pending.append((text, cond, volatile))
+        self.offset += 1
+
+    def pop(self) -> tuple:
+        self.offset -= 1
+        if self.pending:
+            return self.pending.pop()
+        return (f"ram[{self.slot()}]", False, True)
+
+    def value(self, entry: tuple) -> str:
+        text, cond, _ = entry
+        return f"(-1 if {text} else 0)" if cond else text
+
+    def temp(self, text: str) -> str:
+        name = f"v{self.temps}"
+        self.temps += 1
+        self.emit(f"{name} = {text}")
+        return name
+
+    def materialize(self) -> None:
+        """
+        RAMかレジスタを読む、まだ積んだままの式を変数へ移す
+        """
+        for i, (text, cond, volatile) in enumerate(self.pending):
+            if volatile:
+                self.pending[i] = (self.temp(text), cond, False)
+
+    def spill(self) -> None:
+        """
+        積んだままの値をRAMのスタックへ書く(1つの代入なので、右辺はすべて書く前に読む)
+        """
+        pending = self.pending
+        if len(pending) == 1:
+            self.emit(f"ram[{self.slot(-1)}] = {self.value(pending[0])}")
+        elif pending:
+            values = ", ".join(self.value(entry) for entry in pending)
+            self.emit(f"ram[{self.slot(-len(pending))}:{self.slot()}] = "
+                      f"{values}")
+        self.pending = []
+
+    def write(self, code: list, limit: int) -> int:
+        """
+        code[start]からlimitの手前までの命令を訳し、訳した命令の数を返す
+        """
+        pc = self.start
+        while pc < limit:
+            op, a, b = code[pc]
+            if op in (CALL_KEYBOARD, HALT):
+                break
+            pc += 1
+            if op in REGISTERS:
+                register = REGISTERS[op]
+                address = f"{register} + {a}" if a else register
+                if op in PUSH_SEGMENTS.values():
+                    self.push(f"ram[{address}]", volatile=True)
+                else:
+                    self.store(f"ram[{address}]")
+            elif op == PUSH_CONSTANT:
+                self.push(str(a))
+            elif op == PUSH_ADDRESS:
+                self.push(f"ram[{a}]", volatile=True)
+            elif op == POP_ADDRESS:
+                self.store(f"ram[{a}]")
+            elif op == PUSH_POINTER:
+                self.push("that" if a else "this", volatile=True)
+            elif op == POP_POINTER:
+                register = "that" if a else "this"
+                self.store(register)
+                self.emit(f"if {register} < 0:")
+                self.emit(f"    raise IndexError({NEGATIVE_ADDRESS!r})")
+            elif op in (ADD, SUB, EQ, GT, LT, AND, OR):
+                self.binary(op)
+            elif op == NEG:
+                entry = self.pop()
+                self.push(f"((32768 - {self.value(entry)} & 65535) - 32768)",
+                          volatile=entry[2])
+            elif op == NOT:
+                text, cond, volatile = self.pop()
+                if cond:
+                    self.push(f"(not {text})", True, volatile)
+                else:
+                    self.push(f"(~{text})", False, volatile)
+            elif op in (FUNCTION, ENTER):
+                self.spill()
+                if a:
+                    self.overflow(a)
+                    self.emit(f"ram[{self.slot()}:{self.slot(a)}] = "
+                              f"{(0,) * a}")
+                    self.offset += a
+            else:
+                self.jump(op, a, b, pc)
+                return pc - self.start
+        if pc == self.start:
+            return 0
+        self.spill()
+        self.emit(self.state(pc))
+        return pc - self.start
+
+    def overflow(self, n: int) -> None:
+        """
+        スタックの先頭からn語がRAMに収まらなければIndexErrorにする
+        (スライスへの代入はRAMの終わりを超えるとリストを伸ばしてしまう)
+        """
+        self.emit(f"if {self.slot(n)} > {RAM_SIZE}:")
+        self.emit(f"    raise IndexError({STACK_OVERFLOW!r})")
+
+    def store(self, target: str) -> None:
+        value = self.value(self.pop())
+        self.materialize()
+        self.emit(f"{target} = {value}")
+
+    def binary(self, op: int) -> None:
+        y = self.pop()
+        x = self.pop()
+        volatile = x[2] or y[2]
+        if op in (AND, OR) and x[1] and y[1]:
+            self.push(f"({x[0]} {'and' if op == AND else 'or'} {y[0]})",
+                      True, volatile)
+            return
+        left, right = self.value(x), self.value(y)
+        if op in (ADD, SUB):
+            if right.isdigit():
+                constant = int(right) if op == ADD else -int(right)
+                text = f"{left} + {constant + 32768}"
+            else:
+                text = f"{left} {'+' if op == ADD else '-'} {right} + 32768"
+            self.push(f"(({text} & 65535) - 32768)", False, volatile)
+        elif op in (AND, OR):
+            self.push(f"({left} {'&' if op == AND else '|'} {right})",
+                      False, volatile)
+        else:
+            comparison = {EQ: "==", GT: ">", LT: "<"}[op]
+            self.push(f"({left} {comparison} {right})", True, volatile)
+
+    def jump(self, op: int, a: int, b: int, pc: int) -> None:
+        """
+        ブロックを終える命令(goto・if-goto・call・return)を訳す。pcは次の命令の番地
+        """
+        if op in (GOTO, LOOP):
+            self.spill()
+            self.emit(self.state(a))
+        elif op in (IF_GOTO, LOOP_IF):
+            text, cond, volatile = entry = self.pop()
+            if not cond:
+                text = self.value(entry)
+            if volatile and self.pending:
+                text = self.temp(text)
+            self.spill()
+            self.emit(f"if {text}:")
+            self.emit(f"    {self.state(a)}")
+            self.emit(self.state(pc))
+        elif op == CALL:
+            self.spill()
+            self.overflow(5)
+            self.emit(f"ram[{self.slot()}:{self.slot(5)}] = "
+                      f"{pc}, lcl, arg, this, that")
+            self.emit(f"return {a}, {self.slot(5)}, {self.slot(5)}, "
+                      f"{self.slot(-b)}, this, that")
+        elif op == NATIVE:
+            self.spill()
+            self.emit(f"value = native_{a}({self.slot(-b)})")
+            self.emit("if value is None:")
+            self.emit(f"    if {self.slot(5)} > {RAM_SIZE}:")
+            self.emit(f"        raise IndexError({STACK_OVERFLOW!r})")
+            self.emit(f"    ram[{self.slot()}:{self.slot(5)}] = "
+                      f"{pc}, lcl, arg, this, that")
+            self.emit(f"    return {self.natives[a][1]}, {self.slot(5)}, "
+                      f"{self.slot(5)}, {self.slot(-b)}, this, that")
+            self.emit(f"ram[{self.slot(-b)}] = value")
+            self.emit(self.state(pc, self.slot(1 - b)))
+        elif op == RETURN:
+            # 積んだままの値は捨てる。引数が0個ならram[arg]が戻り先なので先に読む
+            value = self.value(self.pop())
+            self.emit("pc = ram[lcl - 5]")
+            self.emit(f"ram[arg] = {value}")
+            self.emit("return pc, arg + 1, ram[lcl - 4], ram[lcl - 3], "
+                      "ram[lcl - 2], ram[lcl - 1]")
+        else:
+            raise ValueError(f"ブロックにできない命令です: {op}")
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", type=Path)
+    parser.add_argument(
+        "--budget", type=int, default=BUDGET,
+        help=f"実行する命令数の上限(省略時は {BUDGET})",
+    )
+    parser.add_argument(
+        "--os", type=Path, default=OS_DIR, metavar="DIR",
+        help=f"読み込むOSの.vmのフォルダ(省略時は {OS_DIR})",
+    )
+    parser.add_argument(
+        "--keys", default="", metavar="TEXT",
+        help="Keyboard.keyPressedが呼ばれるたびに1文字ずつ押して離す文字列"
+             "(\\nは改行)",
+    )
+    parser.add_argument(
+        "--peek", action="append", default=[], metavar="ADDR[:N]",
+        help="終了後にRAM[ADDR]からN語(省略時は1語)を出力する",
+    )
+    parser.add_argument(
+        "--intrinsics", default="", metavar="all|NAME,...",
+        help="組み込み関数で実行するOSの関数(allはすべて。例: Math.multiply,"
+             "Memory.alloc)",
+    )
+    parser.add_argument(
+        "--check", action="store_true",
+        help="組み込み関数の呼び出しごとにVMのコードでも実行し、結果が一致するか確かめる",
+    )
+    parser.add_argument(
+        "--compile-after", type=int, default=None, metavar="N",
+        help="N回呼ばれるかループを回った関数を、Pythonの関数にコンパイルして実行する",
+    )
+    args = parser.parse_args(argv)
+    if args.intrinsics == "all":
+        intrinsics = list(INTRINSICS)
+    else:
+        intrinsics = [name for name in args.intrinsics.split(",") if name]
+    try:
+        emulator = VMEmulator.load(args.path, args.os, intrinsics, args.check,
+                                   args.compile_after)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    emulator.press(args.keys.replace("\\n", "\n"))
+    start = time.perf_counter()
+    try:
+        steps = emulator.run(args.budget)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    seconds = time.perf_counter() - start
+    status = "halted" if emulator.halted else "budget exhausted"
+    print(f"{status}: {steps} instructions in {seconds:.3f} s "
+          f"({steps / seconds / 1e6:.2f} M instructions/s)")
+    if emulator.blocks:
+        print(f"compiled {len(emulator.blocks)} blocks in "
+              f"{sum(heat <= 0 for heat in emulator.heat)} functions")
+    if emulator.natives:
+        print(f"intrinsics: {len(emulator.natives)} call targets")
+    if args.check:
+        print(f"checked {emulator.checks} intrinsic calls, "
+              f"{len(emulator.mismatches)} mismatches")
+        for mismatch in emulator.mismatches:
+            print(mismatch)
+    for peek in args.peek:
+        address, _, count = peek.partition(":")
+        values = emulator.peek(int(address), int(count or 1))
+        print(f"RAM[{address}]: {' '.join(map(str, values))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
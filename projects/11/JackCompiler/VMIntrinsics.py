@@ -0,0 +1,655 @@
+"""
+VMEmulatorで、tools/OSの.vmの関数の代わりに実行するPythonの組み込み関数(intrinsics)。
+どれもOSの.vmと同じ番地へ同じ値を書き、同じ値を返す。
+違うのは呼び出し元から見えないところだけで、SP/LCL/ARG/THIS/THATとtemp、
+スタックの引数より上(VMなら関数の枠を置くところ)には何も書かない。
+OSの関数がSys.errorを呼ぶ引数や、ヒープが足りないときはNoneを返してVMのコードに任せる。
+Noneを返すときは、RAMに何も書かない
+"""
+
+HEAP = 2048
+HEAP_END = 16379
+NEWLINE, BACKSPACE = 128, 129
+MINUS, ZERO = 45, 48
+# Output.initMapがOutput.createで字形を作る文字(0は未定義の文字の字形)
+GLYPHS = (0,) + tuple(range(32, 127))
+
+
+def wrap(value: int) -> int:
+    return (value + 0x8000 & 0xFFFF) - 0x8000
+
+
+class Intrinsics():
+    """
+    RAMと、クラス名 → staticの先頭番地から、OSの関数の組み込み版を作る。
+    Jackの関数に当たるメソッド(math_multiplyなど)は、1つ目の引数を置いたRAMの番地argsを受け取る。
+    ほかのメソッド(divideなど)は値を受け取る下請けで、組み込み版どうしはこれを呼び合う。
+    OSの配列(Math.twoToTheなど)はSys.initで作られている前提で読む
+    """
+
+    def __init__(self, ram: list, static_bases: dict):
+        self.ram = ram
+        self.math = static_bases.get("Math", 0)
+        self.memory = static_bases.get("Memory", 0)
+        self.screen = static_bases.get("Screen", 0)
+        self.output = static_bases.get("Output", 0)
+        # Noneでなければ、allocが書き換える前の(番地, 値)を加える
+        self.journal: list = None
+
+    def rollback(self, journal: list) -> None:
+        ram = self.ram
+        for address, value in reversed(journal):
+            ram[address] = value
+
+    # Math
+
+    def math_abs(self, args: int) -> int:
+        x = self.ram[args]
+        return wrap(-x) if x < 0 else x
+
+    def math_multiply(self, args: int) -> int:
+        return wrap(self.ram[args] * self.ram[args + 1])
+
+    def math_divide(self, args: int) -> int:
+        if self.ram[args + 1] == 0:
+            return None
+        return self.divide(self.ram[args], self.ram[args + 1])
+
+    def math_sqrt(self, args: int) -> int:
+        ram = self.ram
+        x = ram[args]
+        if x < 0:
+            return None
+        two_to_the = ram[self.math]
+        y = 0
+        for j in range(7, -1, -1):
+            t = wrap(y + ram[wrap(j + two_to_the)])
+            square = wrap(t * t)
+            if 0 <= square <= x:
+                y = t
+        return y
+
+    def math_max(self, args: int) -> int:
+        return max(self.ram[args], self.ram[args + 1])
+
+    def math_min(self, args: int) -> int:
+        return min(self.ram[args], self.ram[args + 1])
+
+    def divide(self, x: int, y: int) -> int:
+        """
+        Math.divide(y != 0)。商の桁ごとのyの倍数を、Mathのstatic 1の配列に書いていく
+        """
+        ram = self.ram
+        two_to_the = ram[self.math]
+        multiples = ram[self.math + 1]
+        negative = x < 0 < y or y < 0 < x
+        ram[multiples] = wrap(-y) if y < 0 else y
+        if x < 0:
+            x = wrap(-x)
+        i = 0
+        overflow = False
+        while i < 15 and not overflow:
+            value = ram[multiples + i]
+            overflow = wrap(32768 - value) < wrap(value - 1)
+            if not overflow:
+                ram[multiples + i + 1] = wrap(value + value)
+                overflow = wrap(value + value - 1) > wrap(x - 1)
+                if not overflow:
+                    i += 1
+        quotient = 0
+        while i > -1:
+            if not wrap(ram[multiples + i] - 1) > wrap(x - 1):
+                quotient = wrap(quotient + ram[two_to_the + i])
+                x = wrap(x - ram[multiples + i])
+            i -= 1
+        return wrap(-quotient) if negative else quotient
+
+    # Memory・Array
+
+    def memory_peek(self, args: int) -> int:
+        address = wrap(self.ram[args] + self.ram[self.memory])
+        if address < 0:
+            # VMのコードで実行し、VMEmulatorに負の番地として報告させる
+            return None
+        return self.ram[address]
+
+    def memory_poke(self, args: int) -> int:
+        ram = self.ram
+        address = wrap(ram[args] + ram[self.memory])
+        if address < 0:
+            return None
+        ram[address] = ram[args + 1]
+        return 0
+
+    def memory_alloc(self, args: int) -> int:
+        return self.alloc(self.ram[args])
+
+    def memory_de_alloc(self, args: int) -> int:
+        return self.de_alloc(self.ram[args])
+
+    def array_new(self, args: int) -> int:
+        if self.ram[args] <= 0:
+            return None
+        return self.alloc(self.ram[args])
+
+    def alloc(self, size: int) -> int:
+        """
+        Memory.alloc。Sys.errorになるときと、空きリストがたどりきれないときはNone
+        """
+        if size < 1:
+            return None
+        ram = self.ram
+        block = HEAP
+        for _ in range(HEAP_END - HEAP):
+            if ram[block] >= size:
+                break
+            block = ram[wrap(1 + block)]
+        else:
+            return None
+        if wrap(block + size) > HEAP_END:
+            return None
+        written = (
+            wrap(size + 2 + block), wrap(size + 3 + block),
+            wrap(1 + block), block,
+        )
+        if self.journal is not None:
+            self.journal.extend((address, ram[address]) for address in written)
+        if ram[block] > wrap(size + 2):
+            ram[written[0]] = wrap(ram[block] - size - 2)
+            if ram[written[2]] == wrap(block + 2):
+                ram[written[1]] = wrap(block + size + 4)
+            else:
+                ram[written[1]] = ram[written[2]]
+            ram[written[2]] = wrap(block + size + 2)
+        ram[block] = 0
+        return wrap(block + 2)
+
+    def de_alloc(self, address: int) -> int:
+        ram = self.ram
+        block = wrap(address - 2)
+        after = ram[wrap(1 + block)]
+        if ram[after] == 0:
+            ram[block] = wrap(ram[wrap(1 + block)] - block - 2)
+        else:
+            ram[block] = wrap(ram[wrap(1 + block)] - block + ram[after])
+            if ram[wrap(1 + after)] == wrap(after + 2):
+                ram[wrap(1 + block)] = wrap(block + 2)
+            else:
+                ram[wrap(1 + block)] = ram[wrap(1 + after)]
+        return 0
+
+    # String(this 0が最大の長さ、this 1が文字の配列、this 2が長さ)
+
+    def string_new(self, args: int) -> int:
+        ram = self.ram
+        length = ram[args]
+        if length < 0:
+            return None
+        journal = self.journal = []
+        this = self.alloc(3)
+        chars = None
+        if this is not None and length > 0:
+            chars = self.alloc(length)
+            if chars is None:
+                this = None
+        self.journal = None
+        if this is None:
+            self.rollback(journal)
+            return None
+        if length > 0:
+            ram[this + 1] = chars
+        ram[this] = length
+        ram[this + 2] = 0
+        return this
+
+    def string_dispose(self, args: int) -> int:
+        ram = self.ram
+        this = ram[args]
+        if ram[this] > 0:
+            self.de_alloc(ram[this + 1])
+        return self.de_alloc(this)
+
+    def string_length(self, args: int) -> int:
+        return self.ram[self.ram[args] + 2]
+
+    def string_char_at(self, args: int) -> int:
+        ram = self.ram
+        this, i = ram[args], ram[args + 1]
+        if not 0 <= i < ram[this + 2]:
+            return None
+        return ram[wrap(i + ram[this + 1])]
+
+    def string_set_char_at(self, args: int) -> int:
+        ram = self.ram
+        this, i = ram[args], ram[args + 1]
+        if not 0 <= i < ram[this + 2]:
+            return None
+        ram[wrap(i + ram[this + 1])] = ram[args + 2]
+        return 0
+
+    def string_append_char(self, args: int) -> int:
+        ram = self.ram
+        this = ram[args]
+        if ram[this + 2] == ram[this]:
+            return None
+        ram[wrap(ram[this + 2] + ram[this + 1])] = ram[args + 1]
+        ram[this + 2] = wrap(ram[this + 2] + 1)
+        return this
+
+    def string_erase_last_char(self, args: int) -> int:
+        ram = self.ram
+        this = ram[args]
+        if ram[this + 2] == 0:
+            return None
+        ram[this + 2] = wrap(ram[this + 2] - 1)
+        return 0
+
+    def string_int_value(self, args: int) -> int:
+        ram = self.ram
+        this = ram[args]
+        if ram[this + 2] == 0:
+            return 0
+        negative = ram[ram[this + 1]] == MINUS
+        i = 1 if negative else 0
+        value = 0
+        while i < ram[this + 2]:
+            digit = wrap(ram[wrap(i + ram[this + 1])] - ZERO)
+            if not 0 <= digit <= 9:
+                break
+            value = wrap(value * 10 + digit)
+            i += 1
+        return wrap(-value) if negative else value
+
+    def string_set_int(self, args: int) -> int:
+        return self.set_int(self.ram[args], self.ram[args + 1])
+
+    def set_int(self, this: int, number: int) -> int:
+        """
+        String.setInt。数字は逆順にいったん6語の配列へ書き、文字列へ写してから解放する
+        """
+        ram = self.ram
+        if ram[this] == 0:
+            return None
+        negative = number < 0
+        if negative:
+            number = wrap(-number)
+        length = (len(str(number)) if number > 0 else 0) + negative
+        if ram[this] < length:
+            return None
+        digits = self.alloc(6)
+        if digits is None:
+            return None
+        i = 0
+        while number > 0:
+            quotient = self.divide(number, 10)
+            ram[wrap(i + digits)] = wrap(ZERO + number - quotient * 10)
+            i += 1
+            number = quotient
+        if negative:
+            ram[wrap(i + digits)] = MINUS
+            i += 1
+        if i == 0:
+            ram[ram[this + 1]] = ZERO
+            ram[this + 2] = 1
+        else:
+            ram[this + 2] = 0
+            while ram[this + 2] < i:
+                j = ram[this + 2]
+                ram[wrap(j + ram[this + 1])] = ram[wrap(i - j - 1 + digits)]
+                ram[this + 2] = wrap(j + 1)
+        return self.de_alloc(digits)
+
+    # Screen(static 0がtwoToThe、static 1が画面の先頭番地、static 2が色)
+
+    def screen_clear_screen(self, args: int) -> int:
+        ram = self.ram
+        base = ram[self.screen + 1]
+        if not 0 <= base <= len(ram) - 8192:
+            return None
+        ram[base:base + 8192] = [0] * 8192
+        return 0
+
+    def screen_update_location(self, args: int) -> int:
+        return self.update_location(self.ram[args], self.ram[args + 1])
+
+    def screen_draw_pixel(self, args: int) -> int:
+        x, y = self.ram[args], self.ram[args + 1]
+        if not (0 <= x <= 511 and 0 <= y <= 255):
+            return None
+        return self.draw_pixel(x, y)
+
+    def screen_draw_conditional(self, args: int) -> int:
+        ram = self.ram
+        if ram[args + 2]:
+            y, x = ram[args], ram[args + 1]
+        else:
+            x, y = ram[args], ram[args + 1]
+        if not (0 <= x <= 511 and 0 <= y <= 255):
+            return None
+        return self.draw_pixel(x, y)
+
+    def screen_draw_line(self, args: int) -> int:
+        x1, y1, x2, y2 = self.ram[args:args + 4]
+        # 端点が画面の中なら、途中のdrawPixelもSys.errorにならない
+        if not (0 <= x1 <= 511 and 0 <= x2 <= 511 and
+                0 <= y1 <= 255 and 0 <= y2 <= 255):
+            return None
+        dx = abs(x2 - x1)
+        dy = abs(y2 - y1)
+        steep = dx < dy
+        if steep and y2 < y1 or not steep and x2 < x1:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+        if steep:
+            dx, dy = dy, dx
+            a, b, end, backward = y1, x1, y2, x1 > x2
+        else:
+            a, b, end, backward = x1, y1, x2, y1 > y2
+        error = 2 * dy - dx
+        straight = 2 * dy
+        diagonal = 2 * (dy - dx)
+        draw_pixel = self.draw_pixel
+        if steep:
+            draw_pixel(b, a)
+        else:
+            draw_pixel(a, b)
+        while a < end:
+            if error < 0:
+                error += straight
+            else:
+                error += diagonal
+                b += -1 if backward else 1
+            a += 1
+            if steep:
+                draw_pixel(b, a)
+            else:
+                draw_pixel(a, b)
+        return 0
+
+    def screen_draw_rectangle(self, args: int) -> int:
+        ram = self.ram
+        x1, y1, x2, y2 = ram[args:args + 4]
+        if x1 > x2 or y1 > y2 or x1 < 0 or x2 > 511 or y1 < 0 or y2 > 255:
+            return None
+        self.draw_span(x1, x2, y1, y2)
+        return 0
+
+    def screen_draw_horizontal(self, args: int) -> int:
+        return self.draw_horizontal(*self.ram[args:args + 3])
+
+    def screen_draw_symetric(self, args: int) -> int:
+        return self.draw_symetric(*self.ram[args:args + 4])
+
+    def screen_draw_circle(self, args: int) -> int:
+        x, y, r = self.ram[args:args + 3]
+        if x < 0 or x > 511 or y < 0 or y > 255:
+            return None
+        if wrap(x - r) < 0 or wrap(x + r) > 511 or \
+                wrap(y - r) < 0 or wrap(y + r) > 255:
+            return None
+        dx, dy = 0, r
+        decision = wrap(1 - r)
+        self.draw_symetric(x, y, dx, dy)
+        while dy > dx:
+            if decision < 0:
+                decision = wrap(decision + 2 * dx + 3)
+            else:
+                decision = wrap(decision + 2 * (dx - dy) + 5)
+                dy -= 1
+            dx += 1
+            self.draw_symetric(x, y, dx, dy)
+        return 0
+
+    def update_location(self, address: int, mask: int) -> int:
+        ram = self.ram
+        address = wrap(address + ram[self.screen + 1])
+        if ram[self.screen + 2]:
+            ram[address] |= mask
+        else:
+            ram[address] &= ~mask
+        return 0
+
+    def draw_pixel(self, x: int, y: int) -> int:
+        """
+        画面の中の(x, y)のScreen.drawPixel
+        """
+        column = self.divide(x, 16)
+        mask = self.ram[x - column * 16 + self.ram[self.screen]]
+        return self.update_location(y * 32 + column, mask)
+
+    def draw_span(self, x1: int, x2: int, y1: int, y2: int) -> None:
+        """
+        0 <= x1 <= x2 <= 511の横線を、y1からy2の行に引く
+        (Screen.drawRectangleとScreen.drawHorizontalの共通部分)
+        """
+        ram = self.ram
+        two_to_the = ram[self.screen]
+        first = self.divide(x1, 16)
+        last = self.divide(x2, 16)
+        left = ~wrap(ram[x1 - first * 16 + two_to_the] - 1)
+        right = wrap(ram[x2 - last * 16 + 1 + two_to_the] - 1)
+        width = last - first
+        address = y1 * 32 + first
+        update_location = self.update_location
+        while y1 <= y2:
+            end = address + width
+            if width == 0:
+                update_location(address, right & left)
+            else:
+                update_location(address, left)
+                for address in range(address + 1, end):
+                    update_location(address, -1)
+                update_location(end, right)
+            y1 += 1
+            address = end + 32 - width
+
+    def draw_horizontal(self, y: int, x1: int, x2: int) -> int:
+        left, right = min(x1, x2), max(x1, x2)
+        if -1 < y < 256 and left < 512 and right > -1:
+            self.draw_span(max(left, 0), min(right, 511), y, y)
+        return 0
+
+    def draw_symetric(self, x: int, y: int, dx: int, dy: int) -> int:
+        draw_horizontal = self.draw_horizontal
+        draw_horizontal(wrap(y - dy), wrap(x + dx), wrap(x - dx))
+        draw_horizontal(wrap(y + dy), wrap(x + dx), wrap(x - dx))
+        draw_horizontal(wrap(y - dx), wrap(x - dy), wrap(x + dy))
+        draw_horizontal(wrap(y + dx), wrap(x - dy), wrap(x + dy))
+        return 0
+
+    # Output(static 0が列、static 1がカーソルの語の番地、static 2が語の左半分か、
+    # static 3がprintIntの文字列、static 4が画面の先頭番地、static 5・6が字形の表)
+
+    def output_create(self, args: int) -> int:
+        ram = self.ram
+        glyph = self.alloc(11)
+        if glyph is None:
+            return None
+        ram[wrap(ram[args] + ram[self.output + 5])] = glyph
+        for i in range(11):
+            ram[wrap(i + glyph)] = ram[args + 1 + i]
+        return 0
+
+    def output_create_shifted_map(self, args: int) -> int:
+        """
+        Output.createShiftedMap。確保に失敗したらそれまでの確保を戻してNoneを返す。
+        確保した語に書く値は空きリストに影響しないので、先にすべて確保してから書く
+        """
+        ram = self.ram
+        output = self.output
+        journal = self.journal = []
+        shifted = self.alloc(127)
+        glyphs = []
+        if shifted is not None:
+            for _ in GLYPHS:
+                glyphs.append(self.alloc(11))
+                if glyphs[-1] is None:
+                    shifted = None
+                    break
+        self.journal = None
+        if shifted is None:
+            self.rollback(journal)
+            return None
+        ram[output + 6] = shifted
+        for c, glyph in zip(GLYPHS, glyphs):
+            source = ram[wrap(c + ram[output + 5])]
+            ram[wrap(c + ram[output + 6])] = glyph
+            for i in range(11):
+                ram[wrap(i + glyph)] = wrap(ram[wrap(i + source)] * 256)
+        return 0
+
+    def output_get_map(self, args: int) -> int:
+        return self.get_map(self.ram[args])
+
+    def output_draw_char(self, args: int) -> int:
+        return self.draw_char(self.ram[args])
+
+    def output_print_char(self, args: int) -> int:
+        return self.print_char(self.ram[args])
+
+    def output_print_string(self, args: int) -> int:
+        return self.print_string(self.ram[args])
+
+    def output_print_int(self, args: int) -> int:
+        string = self.ram[self.output + 3]
+        if self.set_int(string, self.ram[args]) is None:
+            return None
+        return self.print_string(string)
+
+    def output_println(self, args: int) -> int:
+        return self.println()
+
+    def output_back_space(self, args: int) -> int:
+        return self.back_space()
+
+    def get_map(self, c: int) -> int:
+        ram = self.ram
+        if c < 32 or c > 126:
+            c = 0
+        if ram[self.output + 2]:
+            return ram[wrap(c + ram[self.output + 5])]
+        return ram[wrap(c + ram[self.output + 6])]
+
+    def draw_char(self, c: int) -> int:
+        ram = self.ram
+        output = self.output
+        glyph = self.get_map(c)
+        address = ram[output + 1]
+        for i in range(11):
+            word = wrap(address + ram[output + 4])
+            if ram[output + 2]:
+                kept = ram[word] & -256
+            else:
+                kept = ram[word] & 255
+            ram[word] = ram[wrap(i + glyph)] | kept
+            address = wrap(address + 32)
+        return 0
+
+    def print_char(self, c: int) -> int:
+        ram = self.ram
+        output = self.output
+        if c == NEWLINE:
+            return self.println()
+        if c == BACKSPACE:
+            return self.back_space()
+        self.draw_char(c)
+        if ~ram[output + 2]:
+            ram[output] = wrap(ram[output] + 1)
+            ram[output + 1] = wrap(ram[output + 1] + 1)
+        if ram[output] == 32:
+            self.println()
+        else:
+            ram[output + 2] = ~ram[output + 2]
+        return 0
+
+    def print_string(self, string: int) -> int:
+        ram = self.ram
+        for i in range(ram[string + 2]):
+            self.print_char(ram[wrap(i + ram[string + 1])])
+        return 0
+
+    def println(self) -> int:
+        ram = self.ram
+        output = self.output
+        ram[output + 1] = wrap(ram[output + 1] + 352 - ram[output])
+        ram[output] = 0
+        ram[output + 2] = -1
+        if ram[output + 1] == 8128:
+            ram[output + 1] = 32
+        return 0
+
+    def back_space(self) -> int:
+        ram = self.ram
+        output = self.output
+        if ram[output + 2]:
+            if ram[output] > 0:
+                ram[output] = wrap(ram[output] - 1)
+                ram[output + 1] = wrap(ram[output + 1] - 1)
+            else:
+                ram[output] = 31
+                if ram[output + 1] == 32:
+                    ram[output + 1] = 8128
+                ram[output + 1] = wrap(ram[output + 1] - 321)
+            ram[output + 2] = 0
+        else:
+            ram[output + 2] = -1
+        return self.draw_char(32)
+
+    # Sys
+
+    def sys_wait(self, args: int) -> int:
+        # 待つだけで、RAMには関数の枠より上のlocalしか書かない
+        return None if self.ram[args] < 0 else 0
+
+
+# 関数名 → (Intrinsicsのメソッド名, 同じ動きをするOSのクラス)。
+# クラスのどれかをプログラムが置き換えていたら、その組み込み関数は使えない
+INTRINSICS = {
+    "Math.abs": ("math_abs", ("Math",)),
+    "Math.multiply": ("math_multiply", ("Math",)),
+    "Math.divide": ("math_divide", ("Math",)),
+    "Math.sqrt": ("math_sqrt", ("Math",)),
+    "Math.max": ("math_max", ("Math",)),
+    "Math.min": ("math_min", ("Math",)),
+    "Memory.peek": ("memory_peek", ("Memory",)),
+    "Memory.poke": ("memory_poke", ("Memory",)),
+    "Memory.alloc": ("memory_alloc", ("Memory",)),
+    "Memory.deAlloc": ("memory_de_alloc", ("Memory",)),
+    "Array.new": ("array_new", ("Array", "Memory")),
+    "Array.dispose": ("memory_de_alloc", ("Array", "Memory")),
+    "String.new": ("string_new", ("String", "Array", "Memory")),
+    "String.dispose": ("string_dispose", ("String", "Array", "Memory")),
+    "String.length": ("string_length", ("String",)),
+    "String.charAt": ("string_char_at", ("String",)),
+    "String.setCharAt": ("string_set_char_at", ("String",)),
+    "String.appendChar": ("string_append_char", ("String",)),
+    "String.eraseLastChar": ("string_erase_last_char", ("String",)),
+    "String.intValue": ("string_int_value", ("String", "Math")),
+    "String.setInt": (
+        "string_set_int", ("String", "Array", "Memory", "Math"),
+    ),
+    "Screen.clearScreen": ("screen_clear_screen", ("Screen",)),
+    "Screen.updateLocation": ("screen_update_location", ("Screen",)),
+    "Screen.drawPixel": ("screen_draw_pixel", ("Screen", "Math")),
+    "Screen.drawConditional": (
+        "screen_draw_conditional", ("Screen", "Math"),
+    ),
+    "Screen.drawLine": ("screen_draw_line", ("Screen", "Math")),
+    "Screen.drawRectangle": ("screen_draw_rectangle", ("Screen", "Math")),
+    "Screen.drawHorizontal": ("screen_draw_horizontal", ("Screen", "Math")),
+    "Screen.drawSymetric": ("screen_draw_symetric", ("Screen", "Math")),
+    "Screen.drawCircle": ("screen_draw_circle", ("Screen", "Math")),
+    "Output.create": ("output_create", ("Output", "Array", "Memory")),
+    "Output.createShiftedMap": (
+        "output_create_shifted_map", ("Output", "Array", "Memory", "Math"),
+    ),
+    "Output.getMap": ("output_get_map", ("Output",)),
+    "Output.drawChar": ("output_draw_char", ("Output",)),
+    "Output.printChar": ("output_print_char", ("Output", "String")),
+    "Output.printString": ("output_print_string", ("Output", "String")),
+    "Output.printInt": (
+        "output_print_int", ("Output", "String", "Array", "Memory", "Math"),
+    ),
+    "Output.println": ("output_println", ("Output",)),
+    "Output.backSpace": ("output_back_space", ("Output",)),
+    "Sys.wait": ("sys_wait", ("Sys",)),
+}
@@ -0,0 +1,86 @@
+import io
+
+
+class VMWriter():
+    """
+    VMコマンドの文法に従い、VMコマンドを出力ファイル/ストリームへ書き込む。
+    コマンドはリストに溜めず、生成した順にバッファ付きのストリームへ書き出す
+    """
+
+    def __init__(self, output: io.TextIOBase):
+        """
+        新しいファイル/ストリームを作り、書き込む準備をする
+        """
+        self.output = output
+        self.write = output.write
+
+    def writePush(
+        self, segment: "constant" or "argument" or "local" or "static"
+                       or "this" or "that" or "pointer" or "temp",
+        index: int,
+    ) -> None:
+        """
+        pushコマンドを書く
+        """
+        self.write(f"push {segment} {index}\n")
+
+    def writePop(
+        self, segment: "argument" or "local" or "static" or "this" or "that"
+                       or "pointer" or "temp",
+        index: int,
+    ) -> None:
+        """
+        popコマンドを書く
+        """
+        self.write(f"pop {segment} {index}\n")
+
+    def writeArithmetic(
+        self, command: "add" or "sub" or "neg" or "eq" or "gt" or "lt"
+                       or "and" or "or" or "not",
+    ) -> None:
+        """
+        算術コマンドを書く
+        """
+        self.write(f"{command}\n")
+
+    def writeLabel(self, label: str) -> None:
+        """
+        labelコマンドを書く
+        """
+        self.write(f"label {label}\n")
+
+    def writeGoto(self, label: str) -> None:
+        """
+        gotoコマンドを書く
+        """
+        self.write(f"goto {label}\n")
+
+    def writeIf(self, label: str) -> None:
+        """
+        if-gotoコマンドを書く
+        """
+        self.write(f"if-goto {label}\n")
+
+    def writeCall(self, name: str, nArgs: int) -> None:
+        """
+        callコマンドを書く
+        """
+        self.write(f"call {name} {nArgs}\n")
+
+    def writeFunction(self, name: str, nLocals: int) -> None:
+        """
+        functionコマンドを書く
+        """
+        self.write(f"function {name} {nLocals}\n")
+
+    def writeReturn(self) -> None:
+        """
+        returnコマンドを書く
+        """
+        self.write("return\n")
+
+    def close(self) -> None:
+        """
+        出力ファイルを閉じる
+        """
+        self.output.close()
@@ -0,0 +1,260 @@
+import io
+from JackTokenizer import KEYWORDS, XML_ESCAPES
+from SymbolTable import Symbol, SymbolTable
+import JackAST as ast
+
+
+class XMLBackend(ast.Visitor):
+    """
+    ASTを構文解析結果のXMLへ変換し、要素ができた順にoutputへ書き出す(行を溜めない)。
+    outputがNoneのときは何も書き出さない(構文解析だけの速度を測るため)。
+    識別子にはシンボルテーブルの情報(属性、定義/使用、インデックス)を付け、
+    indentを指定すると入れ子の深さに応じて字下げする
+    """
+
+    def __init__(self, output: io.TextIOBase or None = None,
+                 indent: str = ""):
+        self.write = output.write if output is not None else self.discard
+        self.indent = indent
+        self.depth = 0
+        self.symbol_table = SymbolTable()
+
+    def discard(self, text: str) -> None:
+        pass
+
+    def line(self, text: str) -> None:
+        self.write(f"{self.indent * self.depth}{text}\n")
+
+    def open_tag(self, tag: str) -> None:
+        self.line(f"<{tag}>")
+        self.depth += 1
+
+    def close_tag(self, tag: str) -> None:
+        self.depth -= 1
+        self.line(f"</{tag}>")
+
+    def keyword(self, text: str) -> None:
+        self.line(f"<keyword> {text} </keyword>")
+
+    def symbol(self, text: str) -> None:
+        self.line(f"<symbol> {XML_ESCAPES.get(text, text)} </symbol>")
+
+    def identifier(
+        self, name: str,
+        category: ("var" or "argument" or "static" or "field" or "class"
+                   or "subroutine" or "") = "",
+        is_defining: bool = False, symbol: Symbol or None = None,
+    ) -> None:
+        """
+        識別子を書く。変数の場合は、引いたSymbolを渡せばもう一度引かずに済む
+        """
+        running_index = None
+        if category in ("var", "argument", "static", "field"):
+            if symbol is None:
+                symbol = self.symbol_table.resolve(name)
+            running_index = symbol.index
+        name = f"{name} {category} " + \
+               f"{'defined' if is_defining else 'used'} {running_index}"
+        self.line(f"<identifier> {name} </identifier>")
+
+    def variable(self, name: str) -> None:
+        """
+        変数の使用箇所を書く
+        """
+        symbol = self.symbol_table.resolve(name)
+        if symbol is None:
+            self.identifier(name, "NONE")
+        else:
+            self.identifier(name, symbol.kind, symbol=symbol)
+
+    def type(self, type: str, class_by_case: bool = True) -> None:
+        """
+        型名を書く。class_by_case=Trueのときは、大文字で始まる型名をクラスとして注釈する
+        """
+        if type in KEYWORDS:
+            self.keyword(type)
+        elif class_by_case and type[0].isupper():
+            self.identifier(type, "class")
+        else:
+            self.identifier(type)
+
+    def names(self, names: list, type: str, kind: str) -> None:
+        """
+        varName (',' varName)* ';' を、各変数を定義しながら書く
+        """
+        for i, name in enumerate(names):
+            if i > 0:
+                self.symbol(",")
+            self.symbol_table.define(name=name, type=type, kind=kind)
+            self.identifier(name, kind, True)
+        self.symbol(";")
+
+    def visitClass(self, node: ast.Class) -> None:
+        self.class_name = node.name
+        self.open_tag("class")
+        self.keyword("class")
+        self.identifier(node.name, "class", True)
+        self.symbol("{")
+        for var_dec in node.var_decs:
+            self.visit(var_dec)
+        for subroutine in node.subroutines:
+            self.visit(subroutine)
+        self.symbol("}")
+        self.close_tag("class")
+
+    def visitClassVarDec(self, node: ast.ClassVarDec) -> None:
+        self.open_tag("classVarDec")
+        self.keyword(node.kind)
+        self.type(node.type)
+        self.names(node.names, node.type, node.kind)
+        self.close_tag("classVarDec")
+
+    def visitSubroutineDec(self, node: ast.SubroutineDec) -> None:
+        self.symbol_table.startSubroutine()
+        self.open_tag("subroutineDec")
+        self.keyword(node.kind)
+        self.type(node.return_type)
+        self.identifier(node.name, "subroutine", True)
+        self.symbol("(")
+        self.open_tag("parameterList")
+        if node.kind == "method":
+            self.symbol_table.define(
+                name="this", type=self.class_name, kind="argument",
+            )
+        for i, (type, name) in enumerate(node.parameters):
+            if i > 0:
+                self.symbol(",")
+            self.type(type, class_by_case=False)
+            self.symbol_table.define(name=name, type=type, kind="argument")
+            self.identifier(name, "argument", True)
+        self.close_tag("parameterList")
+        self.symbol(")")
+        self.open_tag("subroutineBody")
+        self.symbol("{")
+        for var_dec in node.var_decs:
+            self.visit(var_dec)
+        self.statements(node.statements)
+        self.symbol("}")
+        self.close_tag("subroutineBody")
+        self.close_tag("subroutineDec")
+
+    def visitVarDec(self, node: ast.VarDec) -> None:
+        self.open_tag("varDec")
+        self.keyword("var")
+        self.type(node.type)
+        self.names(node.names, node.type, "var")
+        self.close_tag("varDec")
+
+    def statements(self, statements: list) -> None:
+        self.open_tag("statements")
+        for statement in statements:
+            self.visit(statement)
+        self.close_tag("statements")
+
+    def visitLetStatement(self, node: ast.LetStatement) -> None:
+        self.open_tag("letStatement")
+        self.keyword("let")
+        self.variable(node.name)
+        if node.index is not None:
+            self.symbol("[")
+            self.visit(node.index)
+            self.symbol("]")
+        self.symbol("=")
+        self.visit(node.value)
+        self.symbol(";")
+        self.close_tag("letStatement")
+
+    def visitIfStatement(self, node: ast.IfStatement) -> None:
+        self.open_tag("ifStatement")
+        self.keyword("if")
+        self.symbol("(")
+        self.visit(node.condition)
+        self.symbol(")")
+        self.symbol("{")
+        self.statements(node.then_statements)
+        self.symbol("}")
+        if node.else_statements is not None:
+            self.keyword("else")
+            self.symbol("{")
+            self.statements(node.else_statements)
+            self.symbol("}")
+        self.close_tag("ifStatement")
+
+    def visitWhileStatement(self, node: ast.WhileStatement) -> None:
+        self.open_tag("whileStatement")
+        self.keyword("while")
+        self.symbol("(")
+        self.visit(node.condition)
+        self.symbol(")")
+        self.symbol("{")
+        self.statements(node.statements)
+        self.symbol("}")
+        self.close_tag("whileStatement")
+
+    def visitDoStatement(self, node: ast.DoStatement) -> None:
+        self.open_tag("doStatement")
+        self.keyword("do")
+        self.visit(node.call)
+        self.symbol(";")
+        self.close_tag("doStatement")
+
+    def visitReturnStatement(self, node: ast.ReturnStatement) -> None:
+        self.open_tag("returnStatement")
+        self.keyword("return")
+        if node.value is not None:
+            self.visit(node.value)
+        self.symbol(";")
+        self.close_tag("returnStatement")
+
+    def visitExpression(self, node: ast.Expression) -> None:
+        self.open_tag("expression")
+        for i, term in enumerate(node.terms):
+            if i > 0:
+                self.symbol(node.ops[i - 1])
+            self.open_tag("term")
+            yield term
+            self.close_tag("term")
+        self.close_tag("expression")
+
+    def visitIntegerConstant(self, node: ast.IntegerConstant) -> None:
+        self.line(f"<integerConstant> {node.value} </integerConstant>")
+
+    def visitStringConstant(self, node: ast.StringConstant) -> None:
+        self.line(f"<stringConstant> {node.value} </stringConstant>")
+
+    def visitKeywordConstant(self, node: ast.KeywordConstant) -> None:
+        self.keyword(node.keyword)
+
+    def visitVarRef(self, node: ast.VarRef) -> None:
+        self.variable(node.name)
+
+    def visitArrayRef(self, node: ast.ArrayRef) -> None:
+        self.variable(node.name)
+        self.symbol("[")
+        yield node.index
+        self.symbol("]")
+
+    def visitSubroutineCall(self, node: ast.SubroutineCall) -> None:
+        if node.qualifier is not None:
+            self.identifier(node.qualifier, "class")
+            self.symbol(".")
+        self.identifier(node.name, "subroutine")
+        self.symbol("(")
+        self.open_tag("expressionList")
+        for i, arg in enumerate(node.args):
+            if i > 0:
+                self.symbol(",")
+            yield arg
+        self.close_tag("expressionList")
+        self.symbol(")")
+
+    def visitParenExpression(self, node: ast.ParenExpression) -> None:
+        self.symbol("(")
+        yield node.expression
+        self.symbol(")")
+
+    def visitUnaryOp(self, node: ast.UnaryOp) -> None:
+        self.symbol(node.op)
+        self.open_tag("term")
+        yield node.term
+        self.close_tag("term")
@@ -0,0 +1,38 @@
+"""
+ASTのメモリ使用量を、以前CompilationEngineが溜めていたXMLの文字列リストと比較する
+
+    python bench_ast.py [サブルーチン数]
+"""
+import sys
+import tracemalloc
+from types import SimpleNamespace
+from bench_corpus import synthetic_class
+from CompilationEngine import CompilationEngine
+from JackTokenizer import JackTokenizer
+from XMLBackend import XMLBackend
+
+
+def allocated(func) -> (object, int):
+    """
+    func()の結果と、結果が保持しているメモリのバイト数を返す
+    """
+    before = tracemalloc.get_traced_memory()[0]
+    result = func()
+    return result, tracemalloc.get_traced_memory()[0] - before
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    tokenizer = JackTokenizer(synthetic_class("Bench", n), "Bench.jack")
+    tracemalloc.start()
+    tree, ast_bytes = allocated(CompilationEngine(tokenizer).compileClass)
+    # 以前と同じく、XMLの行をリストへ溜めた場合と比べる
+    lines = []
+    xml_backend = XMLBackend(SimpleNamespace(write=lines.append))
+    _, xml_bytes = allocated(lambda: xml_backend.visit(tree))
+    tracemalloc.stop()
+    print(f"tokens: {len(tokenizer.tokens)}")
+    print(f"AST            : {ast_bytes / 1024:10.1f} KiB")
+    print(f"XML string list: {xml_bytes / 1024:10.1f} KiB "
+          f"({len(lines)} lines)")
+    print(f"ratio          : {xml_bytes / ast_bytes:.1f}x")
@@ -0,0 +1,58 @@
+"""
+projects/12のMathTestとStringTestなどをVMEmulatorで実行し、1命令ずつ実行したときと、
+--compile-afterで基本ブロックをPythonの関数にコンパイルしたときの1秒あたりの命令数を比べる。
+どれも実行した命令数と、スタック以外のRAMが1命令ずつ実行したときと一致することを確かめる
+
+    python bench_blocks.py [実行する命令数の上限]
+"""
+import sys
+import time
+from pathlib import Path
+import bench_vm
+from bench_emulator import PROGRAMS, files
+from SignatureIndex import OS_SOURCES, SignatureIndex
+from VMEmulator import HEAP, STACK, VMEmulator
+
+PROJECTS = Path(__file__).resolve().parents[2]
+BUDGET = 50_000_000
+NAMES = ("12/MathTest", "12/StringTest", "12/MemoryTest", "12/OutputTest",
+         "12/ScreenTest", "09/Fraction")
+THRESHOLDS = (1, 20, 200)
+
+
+def run(classes: dict, text: str, budget: int,
+        compile_after: int = None) -> (VMEmulator, float):
+    emulator = VMEmulator(classes, compile_after=compile_after)
+    emulator.press(text)
+    start = time.perf_counter()
+    emulator.run(budget)
+    return emulator, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else BUDGET
+    os_sources = sorted(OS_SOURCES.glob("*.jack"))
+    os_index = SignatureIndex(None)
+    os_index.update(os_sources)
+    signatures = os_index.signatures(os_sources)
+    print(f"{'program':<17}{'instructions':>14}{'M/s':>8}" +
+          "".join(f"{f'after {n}':>27}" for n in THRESHOLDS))
+    for name in NAMES:
+        text = PROGRAMS[name]
+        classes = files(bench_vm.compile_program(PROJECTS / name, signatures))
+        plain, seconds = run(classes, text, budget)
+        if not plain.halted:
+            raise AssertionError(f"{name}: {budget}命令で止まりません")
+        row = f"{name:<17}{plain.steps:>14}{plain.steps / seconds / 1e6:>8.2f}"
+        for compile_after in THRESHOLDS:
+            emulator, block_seconds = run(classes, text, budget, compile_after)
+            if not emulator.halted or emulator.steps != plain.steps or \
+                    emulator.ram[:STACK] != plain.ram[:STACK] or \
+                    emulator.ram[HEAP:] != plain.ram[HEAP:]:
+                raise AssertionError(
+                    f"{name}: compile_after={compile_after}で実行結果が一致しません"
+                )
+            functions = sum(heat <= 0 for heat in emulator.heat)
+            row += (f"{seconds / block_seconds:>6.1f}x"
+                    f"{len(emulator.blocks):>6} blocks{functions:>4} fn")
+        print(row)
@@ -0,0 +1,118 @@
+"""
+projects/12のテストプログラムなどを、通常の分岐と--branchesの分岐でコンパイルし、
+tools/OSの.vmと合わせて実行したときのVMコマンドの実行回数を比べる。
+どちらも実行後のstaticとヒープ・画面のRAMが一致することを確かめる
+(キーボードの入力を待つプログラムは除く)。
+OSはコンパイル済みの.vmなので、変わるのはプログラム自身のクラスの実行回数だけになる。
+boolean型の変数やbooleanを返す関数に-1と0以外の値が入るプログラムも、
+両方の分岐で同じ結果になることを先に確かめる
+
+    python bench_branches.py [実行するVMコマンド数の上限]
+"""
+import sys
+from collections import Counter
+from pathlib import Path
+from bench_vm import compile_program, parse_vm, run
+from CompilePipeline import compile_batch
+from Linker import OS_DIR, read_vm
+from SignatureIndex import OS_SOURCES, SignatureIndex
+
+PROJECTS = Path(__file__).resolve().parents[2]
+PROGRAMS = (
+    "12/ArrayTest", "12/MathTest", "12/MemoryTest", "12/OutputTest",
+    "12/ScreenTest", "12/StringTest",
+    "09/Fraction", "09/HelloWorld", "09/List",
+    "11/ComplexArrays", "11/ConvertToBin", "11/Seven",
+)
+BUDGET = 50_000_000
+# 5 & 1 は1なので、どの条件も0以外(真)になる。while文はnot 1が0以外なので1回も回らない
+NON_CANONICAL = """
+class Main {
+    function void main() {
+        var boolean b;
+        var int n;
+        let b = 5 & 1;
+        if (b) { let n = n + 1; }
+        if (~b) { let n = n + 10; }
+        if (Main.isOdd(3)) { let n = n + 100; }
+        while (b) { let n = n + 1000; let b = false; }
+        do Memory.poke(8000, n);
+        return;
+    }
+
+    function boolean isOdd(int n) {
+        return n & 1;
+    }
+}
+"""
+NON_CANONICAL_RESULT = 111
+COMPARISONS = ("lt", "gt", "eq")
+JUMPS = ("goto", "if-goto")
+
+
+def summary(counts: Counter, program_classes: set) -> dict:
+    own = Counter()
+    for (class_name, op), count in counts.items():
+        if class_name in program_classes:
+            own[op] += count
+    return {
+        "total": sum(counts.values()),
+        "program": sum(own.values()),
+        "jumps": sum(own[op] for op in JUMPS),
+        "not": own["not"],
+        "compare": sum(own[op] for op in COMPARISONS),
+    }
+
+
+def check_non_canonical(signatures: dict, budget: int) -> None:
+    """
+    NON_CANONICALを両方の分岐でコンパイルして実行し、RAM[8000]を確かめる
+    """
+    for branches in (False, True):
+        results, errors = compile_batch(
+            {"Main": NON_CANONICAL}, signatures, branches=branches,
+        )
+        if errors:
+            raise ValueError(errors)
+        functions = {}
+        for path in sorted(OS_DIR.glob("*.vm")):
+            functions.update(read_vm(path))
+        functions.update(parse_vm(results["Main"][0]))
+        value = run(functions, budget).ram[8000]
+        if value != NON_CANONICAL_RESULT:
+            raise AssertionError(
+                f"branches={branches}: RAM[8000]が{value}です"
+                f"({NON_CANONICAL_RESULT}になるはずです)"
+            )
+
+
+if __name__ == "__main__":
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else BUDGET
+    os_sources = sorted(OS_SOURCES.glob("*.jack"))
+    os_index = SignatureIndex(None)
+    os_index.update(os_sources)
+    signatures = os_index.signatures(os_sources)
+    check_non_canonical(signatures, budget)
+    columns = ("total", "program", "jumps", "not", "compare")
+    print(f"{'program':<17}{'':>9}" + "".join(f"{c:>10}" for c in columns))
+    for name in PROGRAMS:
+        directory = PROJECTS / name
+        classes = {path.stem for path in directory.glob("*.jack")}
+        rows = []
+        rams = []
+        for branches in (False, True):
+            functions = compile_program(
+                directory, signatures, branches=branches,
+            )
+            result = run(functions, budget)
+            rows.append(summary(result.counts, classes))
+            rams.append(result.ram[16:256] + result.ram[2048:])
+        if rams[0] != rams[1]:
+            raise AssertionError(f"{name}: 実行結果が一致しません")
+        for label, row in zip(("before", "branches"), rows):
+            print(f"{name if label == 'before' else '':<17}{label:>9}" +
+                  "".join(f"{row[c]:>10}" for c in columns))
+        saved = rows[0]["program"] - rows[1]["program"]
+        print(f"{'':<17}{'saved':>9}{rows[0]['total'] - rows[1]['total']:>10}"
+              f"{saved:>10}  "
+              f"({saved / max(rows[0]['program'], 1):.1%} of program)")
@@ -0,0 +1,46 @@
+"""
+ベンチマーク用の合成Jackソースを生成する
+"""
+
+SUBROUTINE = """
+    /** 合成サブルーチン {i} */
+    method int calc{i}(int x, int y) {{
+        var int i, sum;
+        var Array buf;
+        let buf = Array.new(16);
+        let i = 0;
+        let sum = 0;
+        // ループ内で配列・算術・比較・呼び出しを行う
+        while (i < 16) {{
+            let buf[i] = (x * i) + (y / 2) - field{m};
+            if ((sum > 100) & ~(i = 3)) {{
+                let sum = sum - buf[i];
+            }} else {{
+                let sum = sum + buf[i] + static{m};
+            }}
+            let i = i + 1;
+        }}
+        do Output.printString("calc{i}");
+        do Output.printInt(sum);
+        do buf.dispose();
+        return sum;
+    }}
+"""
+
+
+def synthetic_class(name: str = "Main", n_subroutines: int = 100) -> str:
+    """
+    n_subroutines個のメソッドを持つ、構文的に正しいJackクラスを返す
+    """
+    n_vars = 8
+    lines = [f"class {name} {{"]
+    lines.append("    field int " + ", ".join(
+        f"field{m}" for m in range(n_vars)
+    ) + ";")
+    lines.append("    static int " + ", ".join(
+        f"static{m}" for m in range(n_vars)
+    ) + ";")
+    for i in range(n_subroutines):
+        lines.append(SUBROUTINE.format(i=i, m=i % n_vars))
+    lines.append("}")
+    return "\n".join(lines)
@@ -0,0 +1,96 @@
+"""
+projects/09とprojects/12のプログラムをコンパイルし、VMEmulatorで実行したときの
+1秒あたりの命令数を測る。bench_vm.pyの文字列のまま実行するインタプリタとも比べ、
+実行した命令数とスタック以外のRAMが一致することを確かめる。
+入力を待つプログラムには、キー入力を与える
+
+    python bench_emulator.py [実行する命令数の上限]
+"""
+import sys
+import time
+from pathlib import Path
+import bench_vm
+from SignatureIndex import OS_SOURCES, SignatureIndex
+from VMEmulator import VMEmulator
+
+PROJECTS = Path(__file__).resolve().parents[2]
+BUDGET = 5_000_000
+STACK, HEAP = 256, 2048
+UP, LEFT, RIGHT, DOWN, PAGE_DOWN = "\x83", "\x82", "\x84", "\x85", "\x89"
+# プログラム → Keyboard.keyPressedで1文字ずつ押して離すキー
+PROGRAMS = {
+    "09/Average": "3\n10\n20\n30\n",
+    "09/FizzBuzz": " " * 100,
+    "09/Fraction": "",
+    "09/HelloWorld": "",
+    "09/List": "",
+    "09/Square": f"x{UP}{RIGHT}{DOWN}{LEFT}zQ",
+    "09/Typing": "JACK\nJAVA\nJAVASCRIPT\nPHP\nC++\nC\nPYTHON\n"
+                 "OBJECTIVE C\nFORTRAN\nKOTLIN\n",
+    "12/ArrayTest": "",
+    "12/KeyboardTest": f"{PAGE_DOWN}3JACK\n-32123\n",
+    "12/MathTest": "",
+    "12/MemoryTest": "",
+    "12/OutputTest": "",
+    "12/ScreenTest": "",
+    "12/StringTest": "",
+    "12/SysTest": "a",
+}
+
+
+def files(functions: dict) -> dict:
+    """
+    関数名 → コマンドの辞書を、クラス名 → (関数名 → コマンド)の辞書にする
+    """
+    classes = {}
+    for name, commands in functions.items():
+        classes.setdefault(name.split(".")[0], {})[name] = commands
+    return classes
+
+
+def keys(text: str) -> list:
+    return [128 if c == "\n" else ord(c) for c in text]
+
+
+if __name__ == "__main__":
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else BUDGET
+    os_sources = sorted(OS_SOURCES.glob("*.jack"))
+    os_index = SignatureIndex(None)
+    os_index.update(os_sources)
+    signatures = os_index.signatures(os_sources)
+    print(f"{'program':<17}{'status':>8}{'instructions':>14}"
+          f"{'M/s':>8}{'strings M/s':>13}{'speedup':>9}")
+    total_steps = total_seconds = 0
+    for name, text in PROGRAMS.items():
+        functions = bench_vm.compile_program(PROJECTS / name, signatures)
+        emulator = VMEmulator(files(functions))
+        emulator.press(text)
+        start = time.perf_counter()
+        steps = emulator.run(budget)
+        seconds = time.perf_counter() - start
+        total_steps += steps
+        total_seconds += seconds
+        start = time.perf_counter()
+        try:
+            reference = bench_vm.run(functions, budget, keys(text))
+        except RuntimeError:
+            # 上限まで実行した
+            reference = None
+        reference_seconds = time.perf_counter() - start
+        if emulator.halted != (reference is not None):
+            raise AssertionError(f"{name}: 止まった位置が一致しません")
+        if reference is not None:
+            # bench_vmはSys.haltの呼び出しも1命令と数える
+            reference_steps = sum(reference.counts.values()) - 1
+            # スタックに積んだ戻り先の番地は、命令の並べ方で変わるので比べない
+            if reference_steps != steps or \
+                    reference.ram[:STACK] != emulator.ram[:STACK] or \
+                    reference.ram[HEAP:] != emulator.ram[HEAP:]:
+                raise AssertionError(f"{name}: 実行結果が一致しません")
+        status = "halted" if emulator.halted else "budget"
+        print(f"{name:<17}{status:>8}{steps:>14}"
+              f"{steps / seconds / 1e6:>8.2f}"
+              f"{steps / reference_seconds / 1e6:>13.2f}"
+              f"{reference_seconds / seconds:>8.1f}x")
+    print(f"{'total':<17}{'':>8}{total_steps:>14}"
+          f"{total_steps / total_seconds / 1e6:>8.2f}")
@@ -0,0 +1,229 @@
+"""
+明示的なスタックで構文解析するcompileExpressionと、以前の再帰するcompileExpressionを、
+深く入れ子になった式と長い演算子の連鎖で比べる。
+projects/のすべての.jackで、2つの構文解析器のASTが一致することも確かめる。
+最後に、DEPTH段の入れ子の式をJackCompiler.pyの各オプションで.vmまでコンパイルできることを確かめる
+
+    python bench_expression.py
+"""
+import contextlib
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+from CompilationEngine import CompilationEngine
+from JackCompiler import main
+from JackTokenizer import JackTokenizer
+import JackAST as ast
+
+REPEAT = 5
+KEYWORD_CONSTANTS = ("true", "false", "null", "this")
+PROJECTS = Path(__file__).resolve().parents[2]
+# 入れ子の1段: 括弧・単項演算子・配列の添字・呼び出しの引数を順に使う
+NESTINGS = ("({})", "-{}", "a[{}]", "Math.max({}, 1)", "~({} + 1)")
+DEPTH = 3000
+# .vmまでコンパイルするときのJackCompiler.pyのオプション
+OPTIONS = ([], ["--xml"], ["-O", "--inline"], ["--branches"], ["--peephole"])
+
+
+class RecursiveCompilationEngine(CompilationEngine):
+    """
+    compileExpression → compileTerm → compileExpression と再帰する以前の構文解析器
+    """
+    OPS = ("+", "-", "*", "/", "&", "|", "<", ">", "=")
+
+    def compileExpression(self) -> ast.Expression:
+        tokenizer = self.tokenizer
+        terms = [self.compileTerm()]
+        ops = []
+        while tokenizer.look_ahead() in self.OPS:
+            tokenizer.advance()
+            ops.append(tokenizer.token)
+            terms.append(self.compileTerm())
+        return ast.Expression(terms, ops)
+
+    def compileTerm(self) -> ast.Node:
+        tokenizer = self.tokenizer
+        mark = tokenizer.mark()
+        tokenizer.advance()
+        token_type = tokenizer.tokenType()
+        if token_type == "identifier":
+            name = tokenizer.token
+            if tokenizer.look_ahead() == "[":
+                self.expect("[")
+                index = self.compileExpression()
+                self.expect("]")
+                return ast.ArrayRef(name, index)
+            elif tokenizer.look_ahead() in ("(", "."):
+                tokenizer.reset(mark)
+                return self.compileSubroutineCall()
+            else:
+                return ast.VarRef(name)
+        elif token_type == "integerConstant":
+            return ast.IntegerConstant(tokenizer.intVal())
+        elif token_type == "stringConstant":
+            return ast.StringConstant(tokenizer.stringVal())
+        elif tokenizer.token in KEYWORD_CONSTANTS:
+            return ast.KeywordConstant(tokenizer.token)
+        elif tokenizer.token in ("-", "~"):
+            op = tokenizer.token
+            return ast.UnaryOp(op, self.compileTerm())
+        elif tokenizer.token == "(":
+            expression = self.compileExpression()
+            self.expect(")")
+            return ast.ParenExpression(expression)
+        else:
+            self.error("項(term)が必要です")
+
+
+def expression_class(expression: str) -> str:
+    return (
+        "class Deep {\n"
+        "    function int f(int x) {\n"
+        "        var Array a;\n"
+        f"        return {expression};\n"
+        "    }\n"
+        "}\n"
+    )
+
+
+def nested(depth: int) -> str:
+    expression = "x"
+    for i in range(depth):
+        expression = NESTINGS[i % len(NESTINGS)].format(expression)
+    return expression
+
+
+def deep_class(depth: int) -> str:
+    """
+    depth段の入れ子の式を、return文・if文の条件・展開できるファンクションに使うクラス
+    """
+    expression = nested(depth)
+    inlined = "x"
+    for i in range(depth):
+        inlined = ("({})", "-{}")[i % 2].format(inlined)
+    return (
+        "class Main {\n"
+        "    function void main() {\n"
+        "        var Array a;\n"
+        "        var int x;\n"
+        "        let a = Array.new(1);\n"
+        "        let a[0] = 0;\n"
+        f"        if (({expression}) = 0) {{ do Main.f(1); }}\n"
+        "        return;\n"
+        "    }\n"
+        f"    function int f(int x) {{ return {inlined}; }}\n"
+        "    function int g() { return Main.f(2); }\n"
+        "}\n"
+    )
+
+
+def check_deep(depth: int) -> None:
+    """
+    deep_class(depth)をOPTIONSのそれぞれで.vmまでコンパイルする
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "Main.jack"
+        path.write_text(deep_class(depth))
+        for options in OPTIONS:
+            output = io.StringIO()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(output):
+                status = main([str(path), "--force", *options])
+            elapsed = time.perf_counter() - start
+            if status != 0 or not path.with_suffix(".vm").exists():
+                raise AssertionError(
+                    f"nested {depth} {options}: {output.getvalue()}"
+                )
+            path.with_suffix(".vm").unlink()
+            label = " ".join(options) or "default"
+            print(f"nested {depth} to .vm {label:>14}: {elapsed:6.3f} s")
+
+
+def chain(length: int) -> str:
+    ops = ("+", "*", "-", "&", "|", "<", ">", "=", "/")
+    return " ".join(
+        f"{ops[i % len(ops)]} x" if i else "x" for i in range(length)
+    )
+
+
+def same_tree(a, b) -> bool:
+    """
+    2つのASTが同じかどうか。reprと違い、深い木でも再帰せずにたどる
+    """
+    pairs = [(a, b)]
+    while pairs:
+        a, b = pairs.pop()
+        if type(a) is not type(b):
+            return False
+        if isinstance(a, (list, tuple)):
+            if len(a) != len(b):
+                return False
+            pairs.extend(zip(a, b))
+        elif isinstance(a, ast.Node):
+            pairs.extend(
+                (getattr(a, name), getattr(b, name)) for name in a.__slots__
+            )
+        elif a != b:
+            return False
+    return True
+
+
+def parse_time(engine_class, tokenizer: JackTokenizer) -> (float, object):
+    """
+    REPEAT回構文解析し、最も速かった時間とASTを返す。
+    再帰が深すぎて構文解析できなければ、時間の代わりにNoneを返す
+    """
+    best = float("inf")
+    for _ in range(REPEAT):
+        tokenizer.reset(0)
+        start = time.perf_counter()
+        try:
+            tree = engine_class(tokenizer).compileClass()
+        except RecursionError:
+            return None, None
+        best = min(best, time.perf_counter() - start)
+    return best, tree
+
+
+def report(label: str, source: str) -> None:
+    tokenizer = JackTokenizer(source, "Deep.jack")
+    n_tokens = len(tokenizer.tokens)
+    recursive_time, recursive_tree = parse_time(
+        RecursiveCompilationEngine, tokenizer,
+    )
+    stack_time, stack_tree = parse_time(CompilationEngine, tokenizer)
+    if recursive_tree is not None and \
+            not same_tree(recursive_tree, stack_tree):
+        raise AssertionError(f"{label}: ASTが一致しません")
+    columns = []
+    for name, t in (("recursive", recursive_time), ("stack", stack_time)):
+        if t is None:
+            columns.append(f"{name} RecursionError")
+        else:
+            columns.append(f"{name} {t / n_tokens * 1e6:5.2f} us/token")
+    print(f"{label:>16}: {n_tokens:7d} tokens  " + "  ".join(columns))
+
+
+def check_projects() -> None:
+    paths = sorted(PROJECTS.glob("*/**/*.jack"))
+    for path in paths:
+        tokenizer = JackTokenizer(path.read_text(), path.name)
+        trees = []
+        for engine_class in (RecursiveCompilationEngine, CompilationEngine):
+            tokenizer.reset(0)
+            trees.append(engine_class(tokenizer).compileClass())
+        if not same_tree(*trees):
+            raise AssertionError(f"{path}: ASTが一致しません")
+    print(f"projects: {len(paths)} files, ASTs match")
+
+
+if __name__ == "__main__":
+    print(f"recursion limit: {sys.getrecursionlimit()}")
+    for depth in (50, 150, 300, 1000, 5000):
+        report(f"nested {depth}", expression_class(nested(depth)))
+    for length in (1000, 10000, 40000):
+        report(f"chain {length}", expression_class(chain(length)))
+    check_projects()
+    check_deep(DEPTH)
@@ -0,0 +1,43 @@
+"""
+合成コーパスで、全体ビルド・変更なしの再ビルド・1ファイルだけ変更した再ビルドの時間を測る
+
+    python bench_incremental.py [クラス数]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+from bench_corpus import synthetic_class
+from BuildManifest import BuildManifest
+from CompilePipeline import CompilePipeline
+
+
+def timed_build(directory: Path) -> (float, int):
+    start = time.perf_counter()
+    pipeline = CompilePipeline()
+    paths = sorted(directory.glob("*.jack"))
+    statuses = BuildManifest(directory, pipeline.options()).build(
+        pipeline, paths,
+    )
+    return time.perf_counter() - start, len(statuses)
+
+
+if __name__ == "__main__":
+    n_classes = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        for i in range(n_classes):
+            (directory / f"Class{i}.jack").write_text(
+                synthetic_class(f"Class{i}", 4)
+            )
+        for label, change in (
+            ("full build", None),
+            ("no change", None),
+            ("one body edited", "// edited\n"),
+        ):
+            if change:
+                with (directory / "Class0.jack").open("a") as f:
+                    f.write(change)
+            elapsed, n_compiled = timed_build(directory)
+            print(f"{label:<16}: {elapsed * 1000:9.1f} ms  "
+                  f"{n_compiled} of {n_classes} compiled")
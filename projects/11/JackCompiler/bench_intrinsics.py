@@ -0,0 +1,70 @@
+"""
+projects/12のテストプログラムとprojects/09のプログラムをVMEmulatorで実行し、
+VMIntrinsicsの組み込み関数をクラスごとに使ったときと、すべて使ったときの速さを比べる。
+どれもスタック・temp以外のRAMが組み込み関数なしの実行と一致することと、
+--checkと同じ照合で組み込み関数の呼び出しがVMのコードと一致することを確かめる
+
+    python bench_intrinsics.py [実行する命令数の上限]
+"""
+import sys
+import time
+from pathlib import Path
+import bench_vm
+from bench_emulator import PROGRAMS, files
+from SignatureIndex import OS_SOURCES, SignatureIndex
+from VMEmulator import HEAP, STACK, STATIC, VMEmulator
+from VMIntrinsics import INTRINSICS
+
+PROJECTS = Path(__file__).resolve().parents[2]
+BUDGET = 50_000_000
+GROUPS = ("Math", "Memory", "String", "Screen", "Output")
+
+
+def run(classes: dict, text: str, budget: int, intrinsics: list = (),
+        check: bool = False) -> (VMEmulator, float):
+    emulator = VMEmulator(classes, intrinsics, check)
+    emulator.press(text)
+    start = time.perf_counter()
+    emulator.run(budget)
+    return emulator, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else BUDGET
+    os_sources = sorted(OS_SOURCES.glob("*.jack"))
+    os_index = SignatureIndex(None)
+    os_index.update(os_sources)
+    signatures = os_index.signatures(os_sources)
+    groups = {
+        group: [name for name in INTRINSICS if name.startswith(group + ".")]
+        for group in GROUPS
+    }
+    groups["Memory"] += [name for name in INTRINSICS
+                         if name.startswith("Array.")]
+    groups["all"] = list(INTRINSICS)
+    print(f"{'program':<17}{'seconds':>8}" +
+          "".join(f"{group:>8}" for group in groups) +
+          f"{'checked':>9}{'mismatch':>9}")
+    total = dict.fromkeys(("none",) + tuple(groups), 0.0)
+    for name, text in PROGRAMS.items():
+        classes = files(bench_vm.compile_program(PROJECTS / name, signatures))
+        plain, seconds = run(classes, text, budget)
+        if not plain.halted:
+            raise AssertionError(f"{name}: {budget}命令で止まりません")
+        total["none"] += seconds
+        row = f"{name:<17}{seconds:>8.3f}"
+        for group, intrinsics in groups.items():
+            emulator, group_seconds = run(classes, text, budget, intrinsics)
+            if not emulator.halted or \
+                    emulator.ram[STATIC:STACK] != plain.ram[STATIC:STACK] or \
+                    emulator.ram[HEAP:] != plain.ram[HEAP:]:
+                raise AssertionError(f"{name}: {group}で実行結果が一致しません")
+            total[group] += group_seconds
+            row += f"{seconds / group_seconds:>7.1f}x"
+        checked, _ = run(classes, text, budget, groups["all"], check=True)
+        print(row + f"{checked.checks:>9}{len(checked.mismatches):>9}")
+        for mismatch in checked.mismatches:
+            print(f"  {mismatch}")
+    print(f"{'total':<17}{total['none']:>8.3f}" +
+          "".join(f"{total['none'] / total[group]:>7.1f}x"
+                  for group in groups))
@@ -0,0 +1,45 @@
+"""
+数千クラスの合成コーパスを --jobs 1 から N までで並列コンパイルし、スケーリングを測る
+
+    python bench_jobs.py [クラス数] [最大プロセス数]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from bench_corpus import synthetic_class
+from CompilePipeline import CompilePipeline
+
+
+def write_corpus(directory: Path, n_classes: int) -> list:
+    paths = []
+    for i in range(n_classes):
+        path = directory / f"Class{i}.jack"
+        path.write_text(synthetic_class(f"Class{i}", 4))
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    n_classes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_jobs = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_corpus(Path(tmp), n_classes)
+        print(f"{n_classes} classes, {os.cpu_count()} cpus")
+        base = None
+        steps = {max_jobs}
+        jobs = 1
+        while jobs < max_jobs:
+            steps.add(jobs)
+            jobs *= 2
+        for jobs in sorted(steps):
+            start = time.perf_counter()
+            statuses = CompilePipeline().run_all(paths, jobs)
+            elapsed = time.perf_counter() - start
+            if any(error for _, error in statuses):
+                raise AssertionError("コンパイルに失敗したファイルがあります")
+            base = base or elapsed
+            print(f"--jobs {jobs:>3}: {elapsed:7.2f} s  "
+                  f"{n_classes / elapsed:8.1f} classes/s  "
+                  f"speedup {base / elapsed:.2f}x")
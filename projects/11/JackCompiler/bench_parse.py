@@ -0,0 +1,29 @@
+"""
+合成クラスの大きさを変えながらCompilationEngineのコンパイル時間を測り、
+トークン数に対して線形に伸びることを確かめる
+
+    python bench_parse.py [最大サブルーチン数]
+"""
+import sys
+import time
+from bench_corpus import synthetic_class
+from CompilationEngine import CompilationEngine
+from JackTokenizer import JackTokenizer
+
+
+def compile_time(source: str) -> (float, int):
+    start = time.perf_counter()
+    c = CompilationEngine(JackTokenizer(source, "Bench.jack"))
+    c.compileClass()
+    elapsed = time.perf_counter() - start
+    return elapsed, len(c.tokenizer.tokens)
+
+
+if __name__ == "__main__":
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 800
+    n = largest // 8
+    while n <= largest:
+        elapsed, n_tokens = compile_time(synthetic_class("Bench", n))
+        print(f"{n_tokens:>8} tokens: {elapsed * 1000:9.1f} ms  "
+              f"{elapsed / n_tokens * 1e6:6.2f} us/token")
+        n *= 2
@@ -0,0 +1,113 @@
+"""
+projects/09・11・12のプログラムを、PeepholeOptimizerあり/なしでコンパイルしてVMEmulatorで実行し、
+実行した命令数を比べる(どれもスタック以外のRAMが一致することを確かめる)。
+VMBackendの出力は--branchesで変わるので、--branchesなしとありの両方で測る。
+規則ごとに、コンパイルで適用した回数と、その規則だけを外したときに増える実行命令数
+(その規則が減らした命令数)を出力する
+
+    python bench_peephole.py [実行する命令数の上限]
+"""
+import io
+import sys
+from collections import Counter
+from pathlib import Path
+import bench_vm
+from bench_emulator import PROGRAMS as EMULATOR_PROGRAMS, files
+from CompilationEngine import CompilationEngine
+from CompilePipeline import CompilePipeline
+from JackTokenizer import JackTokenizer
+from PeepholeOptimizer import RULES
+from SignatureIndex import OS_SOURCES, SignatureIndex, tree_headers
+from VMEmulator import HEAP, STACK, VMEmulator
+
+PROJECTS = Path(__file__).resolve().parents[2]
+BUDGET = 50_000_000
+# プログラム → Keyboard.keyPressedで1文字ずつ押して離すキー
+PROGRAMS = dict(EMULATOR_PROGRAMS, **{
+    "11/Average": EMULATOR_PROGRAMS["09/Average"],
+    "11/ComplexArrays": "",
+    "11/ConvertToBin": "",
+    "11/Pong": "",
+    "11/Seven": "",
+    "11/Square": EMULATOR_PROGRAMS["09/Square"],
+})
+CONFIGS = {"default": {}, "--branches": {"branches": True}}
+
+
+def count_hits(directory: Path, signatures: dict, options: dict) -> Counter:
+    """
+    directoryの.jackをすべての規則でコンパイルし、規則ごとの適用回数を返す
+    """
+    trees = [
+        CompilationEngine(JackTokenizer(path.read_text(), path.name))
+        .compileClass()
+        for path in sorted(directory.glob("*.jack"))
+    ]
+    pipeline = CompilePipeline(peephole=list(RULES), **options)
+    pipeline.signatures = dict(signatures)
+    for tree in trees:
+        pipeline.signatures.update(tree_headers(tree))
+    hits = Counter()
+    for tree in trees:
+        backend = pipeline.backend(io.StringIO())
+        pipeline.emit(tree, tree, backend, None)
+        hits.update(backend.vm_writer.hits)
+    return hits
+
+
+def execute(directory: Path, signatures: dict, text: str, budget: int,
+            options: dict, rules: list) -> (int, list):
+    """
+    rulesの規則でコンパイルして実行し、(実行した命令数, RAM)を返す
+    """
+    functions = bench_vm.compile_program(
+        directory, signatures, peephole=rules, **options,
+    )
+    emulator = VMEmulator(files(functions))
+    emulator.press(text)
+    emulator.run(budget)
+    if not emulator.halted:
+        raise AssertionError(f"{directory.name}: {budget}命令で止まりません")
+    return emulator.steps, emulator.ram
+
+
+if __name__ == "__main__":
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else BUDGET
+    os_sources = sorted(OS_SOURCES.glob("*.jack"))
+    os_index = SignatureIndex(None)
+    os_index.update(os_sources)
+    signatures = os_index.signatures(os_sources)
+    for config, options in CONFIGS.items():
+        total_hits = Counter()
+        saved = Counter()
+        total_before = total_after = 0
+        print(f"{config}")
+        print(f"{'program':<18}{'before':>10}{'after':>10}{'saved':>8}")
+        for name, text in PROGRAMS.items():
+            directory = PROJECTS / name
+            before, ram = execute(directory, signatures, text, budget,
+                                  options, [])
+            after, optimized = execute(directory, signatures, text, budget,
+                                       options, list(RULES))
+            # スタックに積んだ戻り先の番地は、命令の並べ方で変わるので比べない
+            if ram[:STACK] != optimized[:STACK] or \
+                    ram[HEAP:] != optimized[HEAP:]:
+                raise AssertionError(f"{name}: 実行結果が一致しません")
+            hits = count_hits(directory, signatures, options)
+            for rule in hits:
+                without, _ = execute(
+                    directory, signatures, text, budget, options,
+                    [other for other in RULES if other != rule],
+                )
+                saved[rule] += without - after
+            total_hits.update(hits)
+            total_before += before
+            total_after += after
+            print(f"{name:<18}{before:>10}{after:>10}"
+                  f"{(before - after) / before:>8.2%}")
+        print(f"{'total':<18}{total_before:>10}{total_after:>10}"
+              f"{(total_before - total_after) / total_before:>8.2%}")
+        print(f"{'rule':<18}{'hits':>10}{'saved':>10}")
+        for rule in RULES:
+            print(f"{rule:<18}{total_hits[rule]:>10}{saved[rule]:>10}")
+        print()
@@ -0,0 +1,71 @@
+"""
+トークン列とASTのバイト列(JackBinary)の大きさと読み込み時間を、
+ソースからトークン化・構文解析し直す時間と比較する。
+ASTはサブルーチンの本体を参照されるまで組み立てないので、読み込みだけの時間と、
+すべてのサブルーチンの本体まで組み立てた時間の両方を出力する
+
+    python bench_serialize.py [サブルーチン数]
+"""
+import sys
+import time
+from bench_corpus import synthetic_class
+from CompilationEngine import CompilationEngine
+from JackTokenizer import JackTokenizer
+
+REPEAT = 5
+
+
+def best_time(func) -> float:
+    """
+    func()をREPEAT回実行し、最も速かった時間を返す
+    """
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def parse(source: str):
+    tokenizer = JackTokenizer(source, "Bench.jack")
+    return CompilationEngine(tokenizer).compileClass()
+
+
+def load_bodies(data: bytes):
+    tree = CompilationEngine.load(data)
+    for subroutine in tree.subroutines:
+        subroutine.statements
+    return tree
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    source = synthetic_class("Bench", n)
+    tokenizer = JackTokenizer(source, "Bench.jack")
+    tree = CompilationEngine(tokenizer).compileClass()
+    tokens_data = tokenizer.dump()
+    tree_data = CompilationEngine.dump(tree)
+    loaded = JackTokenizer.load(tokens_data, "Bench.jack")
+    if [repr((t, t.value)) for t in loaded.tokens] != \
+            [repr((t, t.value)) for t in tokenizer.tokens]:
+        raise AssertionError("読み戻したトークン列が一致しません")
+    if repr(CompilationEngine.load(tree_data)) != repr(tree):
+        raise AssertionError("読み戻したASTが一致しません")
+
+    tokenize = best_time(lambda: JackTokenizer(source, "Bench.jack"))
+    load_tokens = best_time(lambda: JackTokenizer.load(tokens_data))
+    compile_source = best_time(lambda: parse(source))
+    load_tree = best_time(lambda: CompilationEngine.load(tree_data))
+    load_all = best_time(lambda: load_bodies(tree_data))
+    print(f"source: {len(source)} bytes, {len(tokenizer.tokens)} tokens")
+    print(f"tokens: {len(tokens_data):>8} bytes  "
+          f"tokenize {tokenize * 1000:8.1f} ms  "
+          f"load {load_tokens * 1000:8.1f} ms  "
+          f"{tokenize / load_tokens:5.1f}x")
+    print(f"AST   : {len(tree_data):>8} bytes  "
+          f"tokenize+parse {compile_source * 1000:8.1f} ms  "
+          f"load {load_tree * 1000:8.1f} ms  "
+          f"{compile_source / load_tree:5.1f}x")
+    print(f"{'':>50}bodies {load_all * 1000:8.1f} ms  "
+          f"{compile_source / load_all:5.1f}x")
@@ -0,0 +1,90 @@
+"""
+JackCompiler.pyを毎回起動する場合(cold)と、JackCompiler.py --serve のサーバへ
+JackClient.pyから送る場合・ソケットへ直接リクエストを送る場合(warm)の1回あたりの時間を比べる。
+途中で終わっているクラスを含む"sources"のリクエストで、そのクラスだけが位置付きのエラーになり、
+ほかのクラスはコンパイルされることも確かめる
+
+    python bench_serve.py [回数] [プログラムのフォルダ]
+"""
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from JackClient import request
+
+HERE = Path(__file__).resolve().parent
+PROGRAM = HERE.parent / "Pong"
+# Brokenだけが入力の途中で終わっている
+SOURCES = {
+    "Main": "class Main { function void main() { do Broken.f(); return; } }",
+    "Broken": "class Broken { function void f() {",
+}
+
+
+def latency(func, repeat: int) -> float:
+    """
+    func()をrepeat回実行し、1回あたりの時間の中央値を返す
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def run(command: list, env: dict = None) -> None:
+    subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    program = Path(sys.argv[2]) if len(sys.argv) > 2 else PROGRAM
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp) / program.name
+        shutil.copytree(program, directory)
+        socket_path = Path(tmp) / "bench.sock"
+        env = dict(os.environ, JACK_COMPILER_SOCKET=str(socket_path))
+        # --forceで毎回すべてのファイルをコンパイルさせる
+        argv = [str(directory), "--force"]
+        python = sys.executable
+        cold = latency(
+            lambda: run([python, str(HERE / "JackCompiler.py"), *argv]),
+            repeat,
+        )
+        server = subprocess.Popen(
+            [python, str(HERE / "JackCompiler.py"), "--serve", "--socket",
+             str(socket_path)],
+            stdout=subprocess.PIPE,
+        )
+        try:
+            server.stdout.readline()
+            # 1回目のリクエストでキャッシュを温める
+            request({"argv": argv, "cwd": tmp}, socket_path)
+            response = request({"sources": SOURCES}, socket_path)
+            if "Main" not in response.get("vm", {}) or \
+                    "Broken 1:35" not in response["errors"].get("Broken", ""):
+                raise AssertionError(f"クラスごとのエラーになりません: {response}")
+            client = latency(
+                lambda: run([python, str(HERE / "JackClient.py"), *argv],
+                            env),
+                repeat,
+            )
+            direct = latency(
+                lambda: request({"argv": argv, "cwd": tmp}, socket_path),
+                repeat,
+            )
+        finally:
+            server.terminate()
+            server.wait()
+    n_files = len(list(program.glob("*.jack")))
+    print(f"{program.name}: {n_files} files, median of {repeat} runs")
+    print(f"cold JackCompiler.py : {cold * 1000:8.1f} ms")
+    print(f"warm JackClient.py   : {client * 1000:8.1f} ms  "
+          f"{cold / client:5.1f}x")
+    print(f"warm socket request  : {direct * 1000:8.1f} ms  "
+          f"{cold / direct:5.1f}x")
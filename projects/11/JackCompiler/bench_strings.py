@@ -0,0 +1,54 @@
+"""
+projects/09のHelloWorldとTyping、projects/11のAverageとComplexArraysを、
+通常の文字列定数と--pool-stringsでコンパイルし、
+tools/OSの.vmと合わせて実行したときのVMコマンドの実行回数とヒープの使用量を比べる。
+Typingには出題される10語を正しく入力したとして実行し、どれも画面が一致することを確かめる。
+まとめるのは2回以上書かれているかwhileの中にある文字列だけなので、
+文字列を1回ずつしか評価しないHelloWorldとComplexArraysは同じコードになる
+(whileの中の文字列でも、ループが1回しか回らなければ確かめる分だけ命令が増える)
+
+    python bench_strings.py
+"""
+from pathlib import Path
+from bench_vm import compile_program, run
+from SignatureIndex import OS_SOURCES, SignatureIndex
+
+PROJECTS = Path(__file__).resolve().parents[2]
+BUDGET = 50_000_000
+NEWLINE = 128
+WORDS = ("JACK", "JAVA", "JAVASCRIPT", "PHP", "C++", "C", "PYTHON",
+         "OBJECTIVE C", "FORTRAN", "KOTLIN")
+PROGRAMS = {
+    "09/HelloWorld": [],
+    "09/Typing": [ord(c) for word in WORDS for c in word + chr(NEWLINE)],
+    "11/Average": [NEWLINE if c == "\n" else ord(c)
+                   for c in "3\n10\n20\n30\n"],
+    "11/ComplexArrays": [],
+}
+SCREEN = slice(16384, 24576)
+
+
+if __name__ == "__main__":
+    os_sources = sorted(OS_SOURCES.glob("*.jack"))
+    os_index = SignatureIndex(None)
+    os_index.update(os_sources)
+    signatures = os_index.signatures(os_sources)
+    columns = ("commands", "String.new", "alloc", "peak heap", "heap")
+    print(f"{'program':<18}{'':>8}" + "".join(f"{c:>11}" for c in columns))
+    for name, keys in PROGRAMS.items():
+        screens = []
+        for pool_strings in (False, True):
+            functions = compile_program(
+                PROJECTS / name, signatures, pool_strings=pool_strings,
+            )
+            result = run(functions, BUDGET, keys)
+            screens.append(result.ram[SCREEN])
+            row = (
+                sum(result.counts.values()), result.calls["String.new"],
+                result.calls["Memory.alloc"], result.peak_heap, result.heap,
+            )
+            label = "pooled" if pool_strings else "before"
+            print(f"{name if not pool_strings else '':<18}{label:>8}" +
+                  "".join(f"{value:>11}" for value in row))
+        if screens[0] != screens[1]:
+            raise AssertionError(f"{name}: 画面が一致しません")
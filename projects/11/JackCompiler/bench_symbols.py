@@ -0,0 +1,169 @@
+"""
+識別子1つあたりのシンボルテーブルの検索時間を、以前の入れ子の辞書の実装と比較する。
+以前はkindOf・typeOf・indexOfを別々に呼んでいたのを、resolveの1回で済ませる
+
+    python bench_symbols.py [サブルーチン数]
+"""
+import sys
+import time
+from SymbolTable import SymbolTable
+
+
+class LegacySymbolTable():
+    """
+    平らな辞書にする前のシンボルテーブル
+    """
+
+    def __init__(self):
+        """
+        空のシンボルテーブルを生成する
+        """
+        self.tbl_for_class = {}
+        self.tbl_for_class["static"] = {}
+        self.tbl_for_class["field"] = {}
+
+    def startSubroutine(self) -> None:
+        """
+        新しいサブルーチンのスコープを開始する
+        (つまり、サブルーチンのシンボルテーブルをリセットする)
+        """
+        self.tbl_for_subr = {}
+        self.tbl_for_subr["argument"] = {}
+        self.tbl_for_subr["var"] = {}
+
+    def define(self, name: str, type: str,
+               kind: "static" or "field" or "argument" or "var") -> None:
+        """
+        引数の名前、型、属性で指定された新しい識別子を定義し、それに実行インデックスを
+        割り当てる。staticとfield属性の識別子はクラスのスコープを持ち、argとvar属性の識別子は
+        サブルーチンのスコープを持つ
+        """
+        if kind in ("argument", "var"):
+            self.tbl_for_subr[kind][name] = {
+                "idx": len(self.tbl_for_subr[kind]),
+                "type": type,
+            }
+        elif kind in ("static", "field"):
+            self.tbl_for_class[kind][name] = {
+                "idx": len(self.tbl_for_class[kind]),
+                "type": type,
+            }
+
+    def varCount(
+        self, kind: "static" or "field" or "argument" or "var"
+    ) -> int:
+        """
+        引数で与えられた属性について、それが現在のスコープで定義されている数を返す
+        """
+        if kind in ("argument", "var"):
+            return len(self.tbl_for_subr[kind])
+        elif kind in ("static", "field"):
+            return len(self.tbl_for_class[kind])
+
+    def kindOf(
+        self,
+        name: str
+    ) -> "static" or "field" or "argument" or "var" or "NONE":
+        """
+        引数で与えられた名前の識別子を現在のスコープで探し、その属性を返す。
+        その識別子が現在のスコープで見つからなければ、NONEを返す
+        """
+        if hasattr(self, "tbl_for_subr"):
+            if name in self.tbl_for_subr["argument"]:
+                return "argument"
+            elif name in self.tbl_for_subr["var"]:
+                return "var"
+        if name in self.tbl_for_class["static"]:
+            return "static"
+        elif name in self.tbl_for_class["field"]:
+            return "field"
+        else:
+            return "NONE"
+
+    def typeOf(self, name: str) -> str:
+        """
+        引数で与えられた名前の識別子を現在のスコープで探し、その型を返す
+        """
+        if hasattr(self, "tbl_for_subr"):
+            if name in self.tbl_for_subr["argument"]:
+                return self.tbl_for_subr["argument"][name]["type"]
+            elif name in self.tbl_for_subr["var"]:
+                return self.tbl_for_subr["var"][name]["type"]
+        if name in self.tbl_for_class["static"]:
+            return self.tbl_for_class["static"][name]["type"]
+        elif name in self.tbl_for_class["field"]:
+            return self.tbl_for_class["field"][name]["type"]
+        else:
+            raise ValueError(f"typeが見つかりません: {name}")
+
+    def indexOf(self, name: str) -> int:
+        """
+        引数で与えられた名前の識別子を現在のスコープで探し、そのインデックスを返す
+        """
+        if hasattr(self, "tbl_for_subr"):
+            if name in self.tbl_for_subr["argument"]:
+                return self.tbl_for_subr["argument"][name]["idx"]
+            elif name in self.tbl_for_subr["var"]:
+                return self.tbl_for_subr["var"][name]["idx"]
+        if name in self.tbl_for_class["static"]:
+            return self.tbl_for_class["static"][name]["idx"]
+        elif name in self.tbl_for_class["field"]:
+            return self.tbl_for_class["field"][name]["idx"]
+        else:
+            raise ValueError(f"idxが見つかりません: {name}")
+
+
+FIELDS = [f"field{i}" for i in range(8)] + [f"static{i}" for i in range(8)]
+ARGUMENTS = [f"arg{i}" for i in range(4)]
+LOCALS = [f"local{i}" for i in range(8)]
+# サブルーチンの中で参照する識別子(ループの中の式で何度も参照される)
+REFERENCES = (LOCALS + ARGUMENTS + FIELDS) * 8
+
+
+def define_class(table) -> None:
+    for name in FIELDS:
+        table.define(name, "int", name.rstrip("0123456789"))
+
+
+def legacy_subroutine(table: LegacySymbolTable) -> None:
+    table.startSubroutine()
+    for name in ARGUMENTS:
+        table.define(name, "int", "argument")
+    for name in LOCALS:
+        table.define(name, "Array", "var")
+    for name in REFERENCES:
+        table.kindOf(name)
+        table.typeOf(name)
+        table.indexOf(name)
+
+
+def flat_subroutine(table: SymbolTable) -> None:
+    table.startSubroutine()
+    for name in ARGUMENTS:
+        table.define(name, "int", "argument")
+    for name in LOCALS:
+        table.define(name, "Array", "var")
+    resolve = table.resolve
+    for name in REFERENCES:
+        resolve(name)
+
+
+def measure(table, subroutine, n: int) -> float:
+    """
+    識別子1つあたりの時間(ns)を返す
+    """
+    define_class(table)
+    start = time.perf_counter()
+    for _ in range(n):
+        subroutine(table)
+    return (time.perf_counter() - start) / (n * len(REFERENCES)) * 1e9
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    legacy = measure(LegacySymbolTable(), legacy_subroutine, n)
+    flat = measure(SymbolTable(), flat_subroutine, n)
+    print(f"{n} subroutines, {len(REFERENCES)} references each")
+    print(f"legacy (kindOf + typeOf + indexOf): {legacy:7.1f} ns/identifier")
+    print(f"flat   (resolve)                  : {flat:7.1f} ns/identifier")
+    print(f"speedup: {legacy / flat:.1f}x")
@@ -0,0 +1,78 @@
+"""
+JackTokenizer.tokenizeのスループットを、以前の1文字ずつ走査するループと比較する
+
+    python bench_tokenizer.py [サブルーチン数]
+"""
+import re
+import sys
+import time
+from bench_corpus import synthetic_class
+from JackTokenizer import JackTokenizer, SYMBOLS
+
+
+def legacy_tokenize(file: str) -> list:
+    """
+    正規表現スキャナ導入前のtokenize(1文字ずつ走査する)
+    """
+    tokens = []
+    symbols = SYMBOLS
+    tmp_str = ""
+    i = 0
+    while i < len(file):
+        if file[i] == '"':
+            tmp_str = '"'
+            i += 1
+            while file[i] != '"':
+                tmp_str += file[i]
+                i += 1
+            tmp_str += '"'
+            tokens.append(tmp_str)
+            tmp_str = ""
+        elif file[i] == "/" and file[i+1] == "/":
+            while file[i] != "\n":
+                i += 1
+        elif file[i] == "/" and file[i+1] == "*":
+            i += 2
+            while not (file[i] == "*" and file[i+1] == "/"):
+                i += 1
+            i += 1
+        elif file[i] in symbols:
+            tokens.append(file[i])
+        elif re.match(r"\s", file[i]):
+            pass
+        else:
+            while ((file[i] not in symbols) and
+                   (not re.match(r"\s", file[i]))):
+                tmp_str += file[i]
+                i += 1
+            tokens.append(tmp_str)
+            tmp_str = ""
+            i -= 1
+        i += 1
+    return tokens
+
+
+def new_tokenize(source: str) -> list:
+    tokenizer = JackTokenizer(source, "Bench.jack")
+    return [token.text for token in tokenizer.tokens]
+
+
+def measure(func, source: str) -> (float, list):
+    start = time.perf_counter()
+    tokens = func(source)
+    return time.perf_counter() - start, tokens
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    source = synthetic_class("Bench", n)
+    mb = len(source) / 1e6
+    legacy_time, legacy_tokens = measure(legacy_tokenize, source)
+    new_time, new_tokens = measure(new_tokenize, source)
+    if legacy_tokens != new_tokens:
+        raise AssertionError("トークン列が一致しません")
+    print(f"source: {len(source)} chars, {len(new_tokens)} tokens")
+    for label, t in (("legacy", legacy_time), ("regex", new_time)):
+        print(f"{label:>7}: {t * 1000:9.1f} ms  {mb / t:7.2f} MB/s  "
+              f"{len(new_tokens) / t / 1e6:6.2f} Mtok/s")
+    print(f"speedup: {legacy_time / new_time:.1f}x")
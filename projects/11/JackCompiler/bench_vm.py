@@ -0,0 +1,194 @@
+"""
+ベンチマーク用の、VMコマンドを数えながら実行する小さなVMインタプリタ。
+コンパイルしたプログラムをtools/OSの.vmと合わせてSys.initから実行する
+"""
+from collections import Counter
+from pathlib import Path
+from CompilePipeline import compile_batch
+from Linker import OS_DIR, read_vm
+
+SP, LCL, ARG, THIS, THAT = range(5)
+SEGMENT_BASES = {"local": LCL, "argument": ARG, "this": THIS, "that": THAT}
+COMPARISONS = ("lt", "gt", "eq")
+KEYBOARD = 24576
+
+
+class VMRun():
+    """
+    1回の実行の結果。
+    countsは(関数のクラス, コマンド)ごとの実行回数、callsは呼び出した関数ごとの回数、
+    heapはMemory.allocで確保してMemory.deAllocで解放していない語数(peak_heapはその最大値)
+    """
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.calls: Counter = Counter()
+        self.heap = 0
+        self.peak_heap = 0
+        self.ram: list = [0] * 32768
+
+
+def wrap(value: int) -> int:
+    return (value + 0x8000 & 0xFFFF) - 0x8000
+
+
+def run(functions: dict, budget: int, keys: list = ()) -> VMRun:
+    """
+    関数名 → コマンドの辞書をSys.initから実行する。
+    Sys.haltを呼ぶか、budget個のコマンドを実行したら止める。
+    keysの文字コードは、Keyboard.keyPressedを呼ぶたびに押して離したように1つずつ与える
+    """
+    program = []
+    addresses = {}
+    labels = {}
+    statics = {}
+    for name, commands in functions.items():
+        class_name = name.split(".")[0]
+        addresses[name] = len(program)
+        for command in commands:
+            op, *args = command.split()
+            if op == "label":
+                labels[name, args[0]] = len(program)
+                continue
+            if op in ("push", "pop") and args[0] == "static":
+                statics[class_name] = max(
+                    statics.get(class_name, 0), int(args[1]) + 1,
+                )
+            program.append((class_name, name, op, args))
+    static_bases = {}
+    base = 16
+    for class_name, size in statics.items():
+        static_bases[class_name] = base
+        base += size
+    key_presses = iter([value for key in keys for value in (key, 0)])
+    result = VMRun()
+    counts, calls, ram = result.counts, result.calls, result.ram
+    allocated = {}
+    # call Sys.init 0 を実行した状態から始める(戻り先の-1で止まる)
+    ram[256] = -1
+    ram[ARG] = 256
+    ram[LCL] = ram[SP] = 261
+    pc = addresses["Sys.init"]
+    for _ in range(budget):
+        class_name, function, op, args = program[pc]
+        counts[class_name, op] += 1
+        pc += 1
+        sp = ram[SP]
+        if op == "push":
+            segment, index = args[0], int(args[1])
+            if segment == "constant":
+                value = index
+            else:
+                value = ram[address(ram, segment, index, class_name,
+                                    static_bases)]
+            ram[sp] = value
+            ram[SP] = sp + 1
+        elif op == "pop":
+            segment, index = args[0], int(args[1])
+            ram[SP] = sp - 1
+            ram[address(ram, segment, index, class_name, static_bases)] = \
+                ram[sp - 1]
+        elif op in ("add", "sub", "and", "or") + COMPARISONS:
+            x, y = ram[sp - 2], ram[sp - 1]
+            if op == "add":
+                value = wrap(x + y)
+            elif op == "sub":
+                value = wrap(x - y)
+            elif op == "and":
+                value = x & y
+            elif op == "or":
+                value = x | y
+            elif op == "lt":
+                value = -(x < y)
+            elif op == "gt":
+                value = -(x > y)
+            else:
+                value = -(x == y)
+            ram[sp - 2] = value
+            ram[SP] = sp - 1
+        elif op == "neg":
+            ram[sp - 1] = wrap(-ram[sp - 1])
+        elif op == "not":
+            ram[sp - 1] = ~ram[sp - 1]
+        elif op == "goto":
+            pc = labels[function, args[0]]
+        elif op == "if-goto":
+            ram[SP] = sp - 1
+            if ram[sp - 1]:
+                pc = labels[function, args[0]]
+        elif op == "function":
+            for i in range(int(args[1])):
+                ram[sp + i] = 0
+            ram[SP] = sp + int(args[1])
+        elif op == "call":
+            callee = args[0]
+            calls[callee] += 1
+            if callee == "Sys.halt":
+                break
+            if callee == "Keyboard.keyPressed":
+                ram[KEYBOARD] = next(key_presses, 0)
+            elif callee == "Memory.deAlloc":
+                result.heap -= allocated.pop(ram[sp - 1], 0)
+            n_args = int(args[1])
+            ram[sp:sp + 5] = [pc, ram[LCL], ram[ARG], ram[THIS], ram[THAT]]
+            ram[ARG] = sp - n_args
+            ram[LCL] = ram[SP] = sp + 5
+            pc = addresses[callee]
+        elif op == "return":
+            if function == "Memory.alloc":
+                allocated[ram[sp - 1]] = ram[ram[ARG]]
+                result.heap += ram[ram[ARG]]
+                result.peak_heap = max(result.peak_heap, result.heap)
+            frame = ram[LCL]
+            pc = ram[frame - 5]
+            ram[ram[ARG]] = ram[sp - 1]
+            ram[SP] = ram[ARG] + 1
+            ram[LCL], ram[ARG], ram[THIS], ram[THAT] = ram[frame - 4:frame]
+            if pc < 0:
+                break
+        else:
+            raise ValueError(f"未知のコマンドです: {op}")
+    else:
+        raise RuntimeError(f"{budget}個のコマンドで止まりませんでした")
+    return result
+
+
+def address(ram: list, segment: str, index: int, class_name: str,
+            static_bases: dict) -> int:
+    if segment in SEGMENT_BASES:
+        return ram[SEGMENT_BASES[segment]] + index
+    if segment == "pointer":
+        return THIS + index
+    if segment == "temp":
+        return 5 + index
+    if segment == "static":
+        return static_bases[class_name] + index
+    raise ValueError(f"未知のセグメントです: {segment}")
+
+
+def compile_program(directory: Path, signatures: dict, **options) -> dict:
+    """
+    directoryの.jackをCompilePipelineの引数optionsでコンパイルし、
+    tools/OSの.vmと合わせた関数名 → コマンドの辞書を返す
+    """
+    sources = {
+        path.stem: path.read_text() for path in directory.glob("*.jack")
+    }
+    results, errors = compile_batch(sources, signatures, **options)
+    if errors:
+        raise ValueError(errors)
+    functions = {}
+    for path in sorted(OS_DIR.glob("*.vm")):
+        functions.update(read_vm(path))
+    for vm, _ in results.values():
+        functions.update(parse_vm(vm))
+    return functions
+
+
+def parse_vm(vm: str) -> dict:
+    functions = {}
+    for line in vm.splitlines():
+        if line.startswith("function "):
+            commands = functions[line.split()[1]] = []
+        commands.append(line)
+    return functions
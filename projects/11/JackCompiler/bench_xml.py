@@ -0,0 +1,77 @@
+"""
+XMLを行のリストへ溜めてから書き出す場合と、ファイルへ逐次書き出す場合とで、
+ピークメモリと時間を比較する。出力なし(--no-output相当)の時間も測る。
+逐次書き出しはCompilePipelineと同じく一時ファイルへ書いてから置き換える。
+時間は計測ごとのばらつきが大きいので、交互にrepeat回測った最小値を表示する
+(時間はほぼ同じで、逐次書き出しで減るのはピークメモリ)
+
+    python bench_xml.py [サブルーチン数] [repeat]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+from bench_corpus import synthetic_class
+from CompilationEngine import CompilationEngine
+from CompilePipeline import temporary_path
+from JackTokenizer import JackTokenizer
+from XMLBackend import XMLBackend
+
+
+def buffered(tree, path: str) -> None:
+    """
+    以前の方式: 全行をリストに溜め、最後にjoinして書き出す
+    """
+    lines = []
+    XMLBackend(SimpleNamespace(write=lines.append), indent="  ").visit(tree)
+    with open(path, "w") as f:
+        f.write("".join(lines))
+
+
+def streaming(tree, path: str) -> None:
+    temp = temporary_path(Path(path))
+    with temp.open("w") as f:
+        XMLBackend(f, indent="  ").visit(tree)
+    os.replace(temp, path)
+
+
+def discarded(tree, path: str) -> None:
+    XMLBackend(None).visit(tree)
+
+
+def measure(func, tree, path: str) -> (float, int):
+    """
+    func(tree, path)の実行時間(秒)と、実行中に増えたピークメモリ(バイト)を返す
+    """
+    start = time.perf_counter()
+    func(tree, path)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func(tree, path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    tokenizer = JackTokenizer(synthetic_class("Bench", n), "Bench.jack")
+    tree = CompilationEngine(tokenizer).compileClass()
+    print(f"tokens: {len(tokenizer.tokens)}")
+    funcs = (("buffered", buffered), ("streaming", streaming),
+             ("no output", discarded))
+    results = {name: [] for name, _ in funcs}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "Bench.xml")
+        for _ in range(repeat):
+            for name, func in funcs:
+                results[name].append(measure(func, tree, path))
+    for name, _ in funcs:
+        elapsed = min(seconds for seconds, _ in results[name])
+        peak = max(peak for _, peak in results[name])
+        print(f"{name:10}: {elapsed * 1000:8.1f} ms  "
+              f"peak {peak / 1024:10.1f} KiB")
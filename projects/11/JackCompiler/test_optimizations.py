@@ -0,0 +1,131 @@
+"""
+projects/11のプログラムを最適化のオプションごとにコンパイルしてVMEmulatorで実行し、
+最適化しないときと同じ結果(static・ヒープ・画面のRAM)になることを確かめる。
+VMEmulatorの組み込み関数と基本ブロックのコンパイルも、1命令ずつ実行したときと比べる
+
+    python -m pytest -q test_optimizations.py
+"""
+import unittest
+from pathlib import Path
+import bench_vm
+from bench_emulator import PROGRAMS as EMULATOR_PROGRAMS, files
+from PeepholeOptimizer import RULES
+from SignatureIndex import OS_SOURCES, SignatureIndex
+from VMEmulator import HEAP, KEYBOARD, STACK, STATIC, VMEmulator
+from VMIntrinsics import INTRINSICS
+
+PROJECTS = Path(__file__).resolve().parents[2]
+BUDGET = 50_000_000
+SCREEN = 16384
+# プログラム → Keyboard.keyPressedで1文字ずつ押して離すキー
+PROGRAMS = {
+    "11/Average": EMULATOR_PROGRAMS["09/Average"],
+    "11/ComplexArrays": "",
+    "11/ConvertToBin": "",
+    "11/Pong": "",
+    "11/Seven": "",
+    "11/Square": EMULATOR_PROGRAMS["09/Square"],
+}
+# JackCompiler.pyのオプション → CompilePipelineの引数
+OPTIONS = {
+    "-O": {"optimize": True},
+    "--peephole": {"peephole": list(RULES)},
+    "--inline": {"inline": 8},
+    "--branches": {"branches": True},
+}
+# --pool-stringsはstaticと文字列の確保の順が変わるので、画面だけを比べる
+POOL_STRINGS = {"pool_strings": True}
+ALL_OPTIONS = dict(POOL_STRINGS, **{
+    name: value for options in OPTIONS.values()
+    for name, value in options.items()
+})
+
+
+def execute(classes: dict, text: str, **emulator_options) -> VMEmulator:
+    emulator = VMEmulator(classes, **emulator_options)
+    emulator.press(text)
+    emulator.run(BUDGET)
+    if not emulator.halted:
+        raise AssertionError(f"{BUDGET}命令で止まりません")
+    return emulator
+
+
+def memory(emulator: VMEmulator) -> (list, list):
+    """
+    staticとヒープ以降(画面・キーボードを含む)のRAMを返す。
+    スタックとtempは、命令の並べ方と一時変数の使い方で変わるので含めない
+    """
+    return emulator.ram[STATIC:STACK], emulator.ram[HEAP:]
+
+
+def screen(emulator: VMEmulator) -> list:
+    return emulator.ram[SCREEN:KEYBOARD]
+
+
+class OptimizationTest(unittest.TestCase):
+    """
+    最適化しないでコンパイルしたプログラムの実行結果を基準にして比べる
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        os_sources = sorted(OS_SOURCES.glob("*.jack"))
+        os_index = SignatureIndex(None)
+        os_index.update(os_sources)
+        cls.signatures = os_index.signatures(os_sources)
+        cls.classes = {}
+        cls.baselines = {}
+        for name, text in PROGRAMS.items():
+            cls.classes[name] = cls.compile(name)
+            cls.baselines[name] = execute(cls.classes[name], text)
+
+    @classmethod
+    def compile(cls, name: str, **options) -> dict:
+        return files(bench_vm.compile_program(
+            PROJECTS / name, cls.signatures, **options,
+        ))
+
+    def test_options(self):
+        for option, options in OPTIONS.items():
+            for name, text in PROGRAMS.items():
+                with self.subTest(option=option, program=name):
+                    emulator = execute(self.compile(name, **options), text)
+                    self.assertEqual(memory(emulator),
+                                     memory(self.baselines[name]))
+                    self.assertLessEqual(emulator.steps,
+                                         self.baselines[name].steps)
+
+    def test_pool_strings(self):
+        for name, text in PROGRAMS.items():
+            with self.subTest(program=name):
+                emulator = execute(self.compile(name, **POOL_STRINGS), text)
+                self.assertEqual(screen(emulator),
+                                 screen(self.baselines[name]))
+
+    def test_all_options(self):
+        for name, text in PROGRAMS.items():
+            with self.subTest(program=name):
+                emulator = execute(self.compile(name, **ALL_OPTIONS), text)
+                self.assertEqual(screen(emulator),
+                                 screen(self.baselines[name]))
+
+    def test_compile_after(self):
+        for name, text in PROGRAMS.items():
+            with self.subTest(program=name):
+                emulator = execute(self.classes[name], text, compile_after=20)
+                self.assertEqual(emulator.steps, self.baselines[name].steps)
+                self.assertEqual(memory(emulator),
+                                 memory(self.baselines[name]))
+
+    def test_intrinsics(self):
+        for name, text in PROGRAMS.items():
+            with self.subTest(program=name):
+                emulator = execute(self.classes[name], text,
+                                   intrinsics=list(INTRINSICS), check=True)
+                self.assertEqual(emulator.mismatches, [])
+                self.assertEqual(memory(emulator),
+                                 memory(self.baselines[name]))
+
+
+if __name__ == "__main__":
+    unittest.main()